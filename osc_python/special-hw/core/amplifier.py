@@ -3,26 +3,25 @@ from core.device import Device
 
 class Amplifier(Device):
     def __init__(self, uid: str, device_info: dict, credentials: dict):
-        super().__init__(uid, device_info)
-
-        self._driver = self._driver_class(**credentials)
-
-    @property
-    def driver(self):
-        return self._driver
+        # the driver logs in on first use, see `Device.connect`
+        super().__init__(uid, device_info, credentials)
 
     @property
     def constants(self):
-        return self._driver.constants
+        return self.driver.constants
 
     def get(self, *args):
-        return self._driver.get(*args)
+        return self.driver.get(*args)
+
+    def get_snapshot(self):
+        """ It returns the `core.snapshot.Snapshot` of the amplifier, with the same fields for every vendor."""
+        return self.driver.get_snapshot(self.uid)
 
     def get_config(self):
         return
 
     def set(self, **kwargs):
-        return self._driver.set(**kwargs)
+        return self.driver.set(**kwargs)
 
     def configure_operational(self, operational: dict):
         if 'pout_target' in operational and 'gain_target' in operational:
@@ -3,6 +3,7 @@ from pathlib import Path
 ROOT = Path(__file__).parents[1]
 RESOURCES = ROOT / "resources"
 TEMPLATES = RESOURCES / "templates"
+CONFIGURATION = RESOURCES / "configuration" / "default"
 EXAMPLES = ROOT / "examples"
 
 STATE_GAIN = "STATE_GAIN"
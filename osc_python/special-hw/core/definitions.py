@@ -1,26 +1,189 @@
-from drivers.juniper.driver import JuniperIla
-from drivers.yokogawa.osa import YokogawaOsa
-from drivers.jds.switch import JDSSwitch
-from drivers.hp.voa import HPVoa
-from drivers.cisco.driver import CiscoEDFA17, CiscoEDFA35
+"""
+Registry of the drivers, resolved from `device/type/variety` on first use.
 
-DRIVER_DICT = {
+The driver modules are imported only when one of their classes is requested, so that importing `core.device` does
+not pull in the whole stack of vendor dependencies. Further drivers can be plugged in through the
+`osc_python.drivers` entry point group, the name of each entry point being its `device/type/variety`, e.g.:
+
+    [project.entry-points."osc_python.drivers"]
+    "amplifier/edfa/acme" = "acme_driver.edfa:AcmeEdfa"
+"""
+import logging
+from collections.abc import Mapping
+from importlib import import_module
+from threading import Lock
+
+ENTRY_POINT_GROUP = "osc_python.drivers"
+
+DRIVER_PATHS = {
     "amplifier": {
         "edfa": {
-            "juniper": JuniperIla,
-            "cisco35": CiscoEDFA35,
-            "cisco17": CiscoEDFA17
+            "juniper": "drivers.juniper.driver:JuniperIla",
+            "cisco35": "drivers.cisco.driver:CiscoEDFA35",
+            "cisco17": "drivers.cisco.driver:CiscoEDFA17",
+            "simulated": "drivers.simulated.driver:SimulatedEdfa"
         }
     },
     "instrument": {
         "osa": {
-            "yokogawa": YokogawaOsa
+            "yokogawa": "drivers.yokogawa.osa:YokogawaOsa"
         },
         "switch": {
-            "jds": JDSSwitch
+            "jds": "drivers.jds.switch:JDSSwitch"
         },
         "voa": {
-            "hp": HPVoa
+            "hp": "drivers.hp.voa:HPVoa"
         }
     }
 }
+
+
+def import_driver(path: str):
+    """ It imports the class of a `module:Class` path."""
+    module_name, _, class_name = path.partition(":")
+    return getattr(import_module(module_name), class_name)
+
+
+class DriverRegistry:
+    """ Lazy registry of the driver classes.
+
+        Args:
+            paths: nested dict device -> type -> variety -> `module:Class` path (or class)
+            entry_point_group: (str) group of the entry points providing further drivers, None to disable them
+
+        Methods:
+            register;
+            resolve;
+            known;
+            varieties.
+    """
+
+    def __init__(self, paths: dict = None, entry_point_group: str = ENTRY_POINT_GROUP):
+        self._drivers = {}
+        for device, types in (DRIVER_PATHS if paths is None else paths).items():
+            for device_type, varieties in types.items():
+                for variety, driver in varieties.items():
+                    self._drivers[device, device_type, variety] = driver
+        self._entry_point_group = entry_point_group
+        self._entry_points_loaded = entry_point_group is None
+        self._cache = {}
+        self._lock = Lock()
+
+    def __contains__(self, key):
+        key = tuple(key)
+        if key in self._drivers:
+            return True
+        self._load_entry_points()
+        return key in self._drivers
+
+    def _load_entry_points(self):
+        """ It adds the drivers of the entry points, without importing them.
+
+        The entry points are only scanned when a driver is not found among the registered ones, so that the built-in
+        drivers neither pay for the scan nor depend on the installed plugins.
+        """
+        if self._entry_points_loaded:
+            return
+        with self._lock:
+            if self._entry_points_loaded:
+                return
+            # importlib.metadata is slow to import, it is only needed once the entry points are looked up
+            from importlib.metadata import entry_points
+
+            try:
+                selected = entry_points()
+                if hasattr(selected, "select"):
+                    selected = selected.select(group=self._entry_point_group)
+                else:
+                    selected = selected.get(self._entry_point_group, [])
+            except Exception as e:
+                logging.error(f'Driver entry points of {self._entry_point_group} not available: {e!r}')
+                selected = []
+            for entry_point in selected:
+                key = tuple(entry_point.name.split("/"))
+                if len(key) != 3:
+                    logging.warning(f'Driver entry point {entry_point.name} is not named device/type/variety')
+                    continue
+                self._drivers.setdefault(key, entry_point)
+            self._entry_points_loaded = True
+
+    def register(self, device: str, device_type: str, variety: str, driver):
+        """ It registers `driver`, a class or a `module:Class` path, replacing any previous one."""
+        with self._lock:
+            self._drivers[device, device_type, variety] = driver
+            self._cache.pop((device, device_type, variety), None)
+
+    def resolve(self, device: str, device_type: str, variety: str):
+        """ It returns the driver class of `device/type/variety`, importing its module on first use.
+
+        :raise KeyError: no driver is registered for `device/type/variety`
+        """
+        key = device, device_type, variety
+        driver = self._cache.get(key)
+        if driver is not None:
+            return driver
+
+        if key not in self._drivers:
+            self._load_entry_points()
+        with self._lock:
+            if key not in self._drivers:
+                raise KeyError(f'No driver for {device}/{device_type}/{variety}')
+            driver = self._drivers[key]
+            if isinstance(driver, str):
+                driver = import_driver(driver)
+            elif hasattr(driver, "load"):
+                driver = driver.load()
+            self._cache[key] = driver
+        return driver
+
+    def known(self, *prefix: str) -> bool:
+        """ It returns True if a driver is registered under `prefix`, e.g. ("amplifier", "edfa"), the entry points
+        being scanned only if no registered driver matches.
+        """
+        if any(key[:len(prefix)] == prefix for key in self._drivers):
+            return True
+        self._load_entry_points()
+        return any(key[:len(prefix)] == prefix for key in self._drivers)
+
+    def varieties(self, device: str = None, device_type: str = None):
+        """ It returns the registered (device, type, variety), optionally filtered, without importing any driver."""
+        self._load_entry_points()
+        return [key for key in self._drivers
+                if (device is None or key[0] == device) and (device_type is None or key[1] == device_type)]
+
+
+class DriverDict(Mapping):
+    """ Read-only nested dict device -> type -> variety -> driver class of a `DriverRegistry`, as the former
+        `DRIVER_DICT`, the driver classes being imported when looked up.
+
+        Args:
+            registry: `DriverRegistry`
+            prefix: (tuple) device, or device and type, of the nested dicts
+    """
+
+    def __init__(self, registry: DriverRegistry, prefix: tuple = ()):
+        self._registry = registry
+        self._prefix = prefix
+
+    def __getitem__(self, name):
+        key = self._prefix + (name,)
+        if len(key) == 3:
+            return self._registry.resolve(*key)
+        if not self._registry.known(*key):
+            raise KeyError(name)
+        return DriverDict(self._registry, key)
+
+    def __iter__(self):
+        depth = len(self._prefix)
+        return iter(dict.fromkeys(key[depth] for key in self._registry.varieties(*self._prefix)))
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f'{type(self).__name__}({"/".join(self._prefix) or "*"})'
+
+
+DRIVER_REGISTRY = DriverRegistry()
+# kept for the callers of the former dict of driver classes, see `DriverDict`
+DRIVER_DICT = DriverDict(DRIVER_REGISTRY)
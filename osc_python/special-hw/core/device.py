@@ -1,30 +1,49 @@
-from core.definitions import DRIVER_DICT
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from core.definitions import DRIVER_REGISTRY
 
+CONNECT_WORKERS = 16
 
-def access_driver(**kwargs):
-    try:
-        device_type = kwargs.get("device")
-        _ = DRIVER_DICT[device_type]
-    except KeyError as e:
-        raise e
 
-    device_dict = DRIVER_DICT
-    for value in kwargs.values():
-        device_dict = device_dict[value]
-    return device_dict
+def access_driver(**kwargs):
+    """ It returns the driver class of the `device`, `type` and `variety` in `kwargs`, importing it on first use."""
+    return DRIVER_REGISTRY.resolve(kwargs.get("device"), kwargs.get("type"), kwargs.get("variety"))
 
 
 class Device:
-    def __init__(self, uid: str, device_info: dict):
+    """ Device of the network, whose driver is resolved and connected on first use.
+
+        Building a device neither imports its driver nor opens any session: the driver is instantiated, hence logged
+        in, by `connect` or by the first access to `driver`.
+
+        Args:
+            uid: (str) identifier of the device
+            device_info: (dict) with the `device`, `type` and `variety` of the driver
+            driver_kwargs: (dict) arguments of the driver, e.g. the credentials
+
+        Properties:
+            driver_kwargs: returns the arguments of the driver
+            driver_class: returns the driver class, importing it on first use
+            driver: returns the driver, connecting it on first use
+            connected: returns True if the driver has been instantiated
+
+        Methods:
+            connect;
+            close.
+    """
+
+    def __init__(self, uid: str, device_info: dict, driver_kwargs: dict = None):
         self._uid = uid
         self._device = device_info.get("device")
         self._device_type = device_info.get("type")
         self._variety = device_info.get("variety")
-        self._driver_class = access_driver(
-            device=self._device,
-            type=self._device_type,
-            variety=self._variety
-        )
+        if (self._device, self._device_type, self._variety) not in DRIVER_REGISTRY:
+            raise KeyError(f'No driver for {self._device}/{self._device_type}/{self._variety}')
+        self._driver_class = None
+        self._driver_kwargs = {} if driver_kwargs is None else driver_kwargs
+        self._driver = None
+        self._lock = Lock()
 
     @property
     def uid(self):
@@ -42,6 +61,30 @@ class Device:
     def variety(self):
         return self._variety
 
+    @property
+    def driver_kwargs(self):
+        return self._driver_kwargs
+
+    @property
+    def driver_class(self):
+        if self._driver_class is None:
+            self._driver_class = access_driver(
+                device=self._device,
+                type=self._device_type,
+                variety=self._variety
+            )
+        return self._driver_class
+
+    @property
+    def driver(self):
+        if self._driver is None:
+            self.connect()
+        return self._driver
+
+    @property
+    def connected(self):
+        return self._driver is not None
+
     def get(self, *args):
         pass
 
@@ -52,7 +95,34 @@ class Device:
         pass
 
     def connect(self):
-        pass
+        """ It instantiates the driver, which logs in, unless it has been done already."""
+        with self._lock:
+            if self._driver is None:
+                self._driver = self.driver_class(**self._driver_kwargs)
 
     def close(self):
-        pass
+        with self._lock:
+            driver, self._driver = self._driver, None
+        if driver is not None and hasattr(driver, "close"):
+            driver.close()
+
+
+def connect_all(devices, max_workers: int = CONNECT_WORKERS) -> dict:
+    """ It connects the `devices` concurrently.
+
+    :param devices: iterable of Device
+    :param max_workers: (int) maximum number of logins in progress at the same time
+    :return: (dict) uid -> exception of the devices that could not be connected
+    """
+    devices = [device for device in devices if not device.connected]
+    errors = {}
+    if not devices:
+        return errors
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(devices))) as executor:
+        futures = {device.uid: executor.submit(device.connect) for device in devices}
+    for uid, future in futures.items():
+        error = future.exception()
+        if error is not None:
+            logging.error(f'Connection to {uid} failed: {error!r}')
+            errors[uid] = error
+    return errors
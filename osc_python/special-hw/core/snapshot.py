@@ -0,0 +1,142 @@
+"""
+Fixed-schema telemetry snapshot of an amplifier, shared by all the vendor drivers, and its columnar fleet table.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from time import monotonic, time
+from typing import NamedTuple, Optional
+from numpy import array, nan
+
+SNAPSHOT_WORKERS = 16
+
+# control modes of `Snapshot.mode`, whatever the vocabulary of the vendor
+MODE_GAIN = "gain"
+MODE_POWER = "power"
+MODE_CURRENT = "current"
+MODE_ALIASES = {
+    "gain": MODE_GAIN,
+    "constant_gain": MODE_GAIN,
+    "agc": MODE_GAIN,
+    "power": MODE_POWER,
+    "constant_power": MODE_POWER,
+    "apc": MODE_POWER,
+    "current": MODE_CURRENT,
+    "constant_current": MODE_CURRENT,
+    "acc": MODE_CURRENT
+}
+
+
+class Snapshot(NamedTuple):
+    """ Telemetry of an amplifier at a given time.
+
+        Attributes:
+            uid: (str) identifier of the amplifier
+            timestamp: (float) POSIX time at which the read was started (s)
+            latency: (float) duration of the read (s)
+            gain: (float) gain (dB), NaN if not available
+            tilt: (float) tilt (dB), NaN if not available
+            input_power: (float) total input power (dBm), NaN if not available
+            output_power: (float) total output power (dBm), NaN if not available
+            mode: (str) control mode, MODE_GAIN, MODE_POWER or MODE_CURRENT, None if not available
+    """
+    uid: str
+    timestamp: float
+    latency: float
+    gain: float = nan
+    tilt: float = nan
+    input_power: float = nan
+    output_power: float = nan
+    mode: Optional[str] = None
+
+
+class SnapshotTimer:
+    """ Context manager measuring the `timestamp` and the `latency` of a snapshot.
+
+        Example:
+            with SnapshotTimer() as timer:
+                values = read()
+            snapshot = timer.snapshot(uid, **values)
+    """
+
+    def __init__(self):
+        self._timestamp = None
+        self._start = None
+        self._latency = None
+
+    def __enter__(self):
+        self._timestamp = time()
+        self._start = monotonic()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._latency = monotonic() - self._start
+
+    def snapshot(self, uid: str, **values) -> Snapshot:
+        """ It returns the snapshot of `values`, the mode being named as in `normalize_mode`."""
+        if "mode" in values:
+            values["mode"] = normalize_mode(values["mode"])
+        return Snapshot(uid, self._timestamp, self._latency, **values)
+
+
+def normalize_mode(mode) -> Optional[str]:
+    """ It returns the MODE_* of a control mode as named by a driver, e.g. "constant_gain" (Cisco) or "gain"
+    (Juniper), None if missing or unknown.
+    """
+    if mode is None:
+        return None
+    normalized = MODE_ALIASES.get(str(mode).strip().lower().replace(" ", "_"))
+    if normalized is None:
+        logging.warning(f'Unknown amplifier mode {mode!r}')
+    return normalized
+
+
+def value_of(value) -> float:
+    """ It returns the number of a value that may come with its unit, e.g. `(15.2, 'dB')`, NaN if missing."""
+    if isinstance(value, tuple):
+        value = value[0]
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return nan
+
+
+def snapshot_frame(snapshots):
+    """ It returns the snapshots as a columnar table, one row per snapshot and one column per field.
+
+    :return: (DataFrame) with the columns of `Snapshot`
+    """
+    # pandas is imported here, so that the drivers importing this module do not pay for it
+    from pandas import DataFrame
+
+    snapshots = list(snapshots)
+    columns = list(zip(*snapshots)) if snapshots else [()] * len(Snapshot._fields)
+    data = {}
+    for field, column in zip(Snapshot._fields, columns):
+        data[field] = array(column, dtype=object if field in ("uid", "mode") else float)
+    return DataFrame(data, columns=list(Snapshot._fields))
+
+
+def gather_snapshots(amplifiers, max_workers: int = SNAPSHOT_WORKERS):
+    """ It reads the snapshot of the `amplifiers` concurrently.
+
+    The amplifiers whose read fails are kept in the table, with NaN values, so that its shape does not depend on the
+    failures.
+
+    :param amplifiers: iterable of `core.amplifier.Amplifier`
+    :param max_workers: (int) maximum number of reads in progress at the same time
+    :return: (DataFrame) one row per amplifier, see `snapshot_frame`
+    """
+    amplifiers = list(amplifiers)
+    if not amplifiers:
+        return snapshot_frame([])
+
+    def read(amplifier):
+        with SnapshotTimer() as timer:
+            try:
+                return amplifier.get_snapshot()
+            except Exception as e:
+                logging.error(f'Snapshot of {amplifier.uid} failed: {e!r}')
+        return timer.snapshot(amplifier.uid)
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(amplifiers))) as executor:
+        return snapshot_frame(executor.map(read, amplifiers))
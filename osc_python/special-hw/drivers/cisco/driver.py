@@ -1,17 +1,228 @@
+import asyncio
 import time
 
-from drivers.cisco.omi_interfaces import AmplifierOmiInterface
+from drivers.cisco.omi_interfaces import AmplifierOmiInterface, AsyncAmplifierOmiInterface, EDFA17OmiInterface, TO, \
+    OMI_WINDOW
 from drivers.cisco.params import AmplifierInterfaceParams
 from drivers.cisco.user import AmplifierInterface
+from drivers.cisco.ocm import ChannelGrid
 from core.constants import *
 from socket import socket, MSG_DONTWAIT, MSG_PEEK
-from drivers.cisco.utils import get_string_between
+from drivers.cisco.utils import get_string_between, parse_i32, is_socket_closed
+from core.snapshot import SnapshotTimer
 import logging
 from numpy import int32
 from telnetlib import Telnet
 
 
 
+OMI_MODES = {0: "constant_current", 1: "constant_power", 2: "constant_gain"}
+MODE_READ = (21, 1, 1, 1, 0)
+# gain, tilt, input and output power registers of the EDFA17, see `EDFA17OmiInterface`
+EDFA17_SNAPSHOT_READS = [(30, 1, 0), (33, 1, 0), (41, 1, 0), (42, 1, 0)]
+
+# WXC channel registers of the demultiplexer and multiplexer switches
+WXC_REGISTERS = {
+    "DMX": {"state": 80, "freq": 28, "bw": 29, "port": 27, "voa_mode": 26, "att": 30},
+    "MUX": {"state": 82, "freq": 34, "bw": 35, "port": 33, "voa_mode": 32, "att": 36},
+}
+# central frequencies accepted by the WXC, in 6.25 GHz slots (191.325 to 196.125 THz)
+WXC_FIRST_SLOT = 30612
+WXC_LAST_SLOT = 31380
+WXC_WRITE_PAUSE = 0.1  # s, between the register writes of a single channel
+WXC_SETTLE_TIME = 1.0  # s, after the VOA mode writes and before switching the channels on, as in `set_ch_on`
+
+
+class ChannelRangeError(ValueError):
+    pass
+
+
+def edfa35_telemetry_reads(direction):
+    """ It returns the labels and the `omi_read` fields of the EDFA35 telemetry registers of `direction`."""
+    input_register = 41 if direction == 1 else 43
+    output_register = 42 if direction == 1 else 44
+    labels = ['gain', 'tilt', 'input_power', 'output_power', 'voa', 'current1', 'current2']
+    f_lists = [(27, direction, 0), (28, direction, 0), (input_register, 1, 0), (output_register, 1, 0),
+               (29, 1, 0), (24, 1, 0), (24, 2, 0)]
+    return labels, f_lists
+
+
+def edfa35_snapshot(replies, direction):
+    """ It returns the values of a `Snapshot` from the replies to the telemetry reads followed by the mode read."""
+    labels, _ = edfa35_telemetry_reads(direction)
+    values = {label: parse_i32(reply) / 10 for label, reply in zip(labels, replies)}
+    return {"gain": values["gain"], "tilt": values["tilt"], "input_power": values["input_power"],
+            "output_power": values["output_power"], "mode": OMI_MODES.get(parse_i32(replies[-1]))}
+
+
+def edfa17_snapshot(replies):
+    """ It returns the values of a `Snapshot` from the replies to `EDFA17_SNAPSHOT_READS` followed by the mode read."""
+    gain, tilt, input_power, output_power = (parse_i32(reply) / 10 for reply in replies[:4])
+    return {"gain": gain, "tilt": tilt, "input_power": input_power, "output_power": output_power,
+            "mode": OMI_MODES.get(parse_i32(replies[-1]))}
+
+
+def channel_grid(grid=None):
+    """ It returns `grid` as a ChannelGrid, loading the default WXC channel plan when it is None."""
+    if grid is None:
+        grid = ChannelGrid.from_file(CONFIGURATION / "wxc.json")
+    elif isinstance(grid, dict):
+        grid = ChannelGrid.from_config(grid)
+    return grid
+
+
+def frequency_slot(freq):
+    """ It converts a central frequency into the number of 6.25 GHz slots, the unit being inferred from its magnitude."""
+    if 1 < freq < 1000:
+        return int(freq * 1e3 / 6.25)
+    elif 1 < freq / 1e3 < 1000:
+        return int(freq / 6.25)
+    elif 1 < freq / 1e6 < 1000:
+        return int(freq / 1e3 / 6.25)
+    elif 1 < freq / 1e9 < 1000:
+        return int(freq / 1e6 / 6.25)
+    elif 1 < freq / 1e12 < 1000:
+        return int(freq / 1e9 / 6.25)
+    raise ValueError("Invalid frequency value")
+
+
+def bandwidth_slots(bw):
+    """ It converts a channel bandwidth into the number of 12.5 GHz slots, the unit being inferred from its magnitude."""
+    if 1 < bw < 1000:
+        return int(bw / 12.5)
+    elif 1 < bw / 1e3 < 1000:
+        return int(bw / 1e3 / 12.5)
+    elif 1 < bw / 1e6 < 1000:
+        return int(bw / 1e6 / 12.5)
+    elif 1 < bw / 1e9 < 1000:
+        return int(bw / 1e9 / 12.5)
+    elif 1 < bw / 1e12 < 1000:
+        return int(bw / 1e12 / 12.5)
+    raise ValueError("Invalid bandwidth value")
+
+
+def channel_slots(freq, bw):
+    """ It converts and range-checks the central frequency and the bandwidth of a WXC channel.
+
+    :return: tuple (f_c, bw_c) with the frequency in 6.25 GHz slots and the bandwidth in 12.5 GHz slots
+    """
+    f_c = frequency_slot(freq)
+    if f_c < WXC_FIRST_SLOT or f_c > WXC_LAST_SLOT:
+        raise ChannelRangeError(f"Channel frequency ({f_c * 6.25 / 1e3:.3f} THz) out of range! "
+                                "Please select a frequency between 191.325 and 196.125 THz")
+
+    bw_c = bandwidth_slots(bw)
+    if bw_c < 4 or bw_c > 40:
+        raise ChannelRangeError(f"Channel bandwidth ({bw_c * 12.5:.1f} GHz) out of range! "
+                                "Please select a bandwidth between 50 and 500 GHz")
+    return f_c, bw_c
+
+
+def wxc_registers(switch):
+    if switch not in WXC_REGISTERS:
+        raise ValueError("Invalid MUX_DMX value")
+    return WXC_REGISTERS[switch]
+
+
+def channel_plan(config: dict, exp_port=17):
+    """ It builds the channel plan of a channel configuration such as `resources/configuration/default/wxc.json`,
+    with one channel per `freq_step` slot starting from `first_freq` and the attenuations of `attenuation`.
+
+    The plan stops at the last of the `n_ch` channels whose frequency is at most `last_freq` (if given) and within the
+    WXC range: e.g. the 96 channels of wxc.json from 191.4 THz would end at 196.15 THz, beyond 196.125 THz, hence
+    only 95 of them (up to its `last_freq` of 196.1 THz) are provisioned. The channels left out are logged.
+
+    :return: (list of dict) the plan, as accepted by `CiscoWSS.provision_channels`
+    """
+    attenuation = config.get("attenuation", [0.0] * config["n_ch"])
+    last_freq = config.get("last_freq")
+    plan = []
+    for i in range(config["n_ch"]):
+        freq = config["first_freq"] + i * config["freq_step"] / 1e3
+        if (last_freq is not None and round(freq, 6) > last_freq) \
+                or not WXC_FIRST_SLOT <= frequency_slot(freq) <= WXC_LAST_SLOT:
+            logging.warning(f'Channels {i + 1} to {config["n_ch"]} (from {freq:.3f} THz) beyond the last '
+                            'frequency or the WXC range, left out of the plan')
+            break
+        plan.append({"channel": i + 1, "freq": freq, "bw": config["freq_step"], "att": attenuation[i],
+                     "exp_port": exp_port})
+    return plan
+
+
+def plan_writes(plan, switch="MUX"):
+    """ It validates and converts a whole channel plan, then orders its `omi_write`s so that all the channels are
+    switched off first, then configured register by register and finally switched on together: the last
+    `len(expected)` writes are the ones switching the channels on.
+
+    :param plan: (list of dict) `channel`, `freq`, `bw`, `att` and optionally `exp_port` of each channel
+    :param switch: (str) "MUX" or "DMX"
+    :return: tuple (writes, expected) with the ordered writes and the (f_c, att register value) of each channel
+    """
+    wxc_registers(switch)
+    errors = []
+    per_channel = []
+    expected = {}
+    for ch in plan:
+        try:
+            f_c, bw_c = channel_slots(ch["freq"], ch["bw"])
+        except ValueError as e:
+            errors.append(f'channel {ch["channel"]}: {e}')
+            continue
+        per_channel.append(channel_writes(ch["channel"], f_c, bw_c, ch["att"], ch.get("exp_port", 17), switch))
+        expected[ch["channel"]] = (f_c, int(ch["att"] * 10))
+    if errors:
+        raise ChannelRangeError('Invalid channel plan:\n' + '\n'.join(errors))
+    # the i-th write of every channel goes out before the (i+1)-th one of any channel
+    return [write for step in zip(*per_channel) for write in step], expected
+
+
+def plan_reads(expected, switch="MUX"):
+    reg = wxc_registers(switch)
+    return [f_list for channel in expected for f_list in [(reg["freq"], channel, 0), (reg["att"], channel, 0)]]
+
+
+def plan_check(expected, replies, switch="MUX"):
+    """ It compares the read-back of `CiscoWSS.provision_channels` with the expected registers.
+
+    :return: (dict) channel -> {"freq": (expected, read), "att": (expected, read)} of the mismatching registers
+    """
+    mismatches = {}
+    values = iter(replies)
+    for channel, (f_c, att) in expected.items():
+        read = {"freq": (f_c, parse_i32(next(values))), "att": (att, parse_i32(next(values)))}
+        wrong = {name: pair for name, pair in read.items() if pair[0] != pair[1]}
+        if wrong:
+            logging.warning(f'{switch} channel {channel} not provisioned as requested: {wrong}')
+            mismatches[channel] = wrong
+    return mismatches
+
+
+def attenuation_writes(attenuations: dict, switch="MUX"):
+    """ It returns the `omi_write` fields that change the attenuation (dB) of each channel of `attenuations`,
+    grouped register by register as in `channel_writes`.
+    """
+    reg = wxc_registers(switch)
+    voa_mode = [(reg["voa_mode"], channel, 1, 1, 1) for channel in attenuations]
+    att = [(reg["att"], channel, 1, 1, int(round(value * 10))) for channel, value in attenuations.items()]
+    return voa_mode + att + voa_mode
+
+
+def channel_writes(channel, f_c, bw_c, att, exp_port=17, switch="MUX"):
+    """ It returns the `omi_write` fields that configure a WXC channel, in the order the card expects them:
+    channel off, central frequency, bandwidth, optical port, VOA mode (so that the attenuation is set instead of
+    the power), attenuation, VOA mode again and channel on.
+    """
+    reg = wxc_registers(switch)
+    return [(reg["state"], channel, 1, 1, 0),
+            (reg["freq"], channel, 1, 1, f_c),
+            (reg["bw"], channel, 1, 1, bw_c),
+            (reg["port"], channel, 1, 1, exp_port),
+            (reg["voa_mode"], channel, 1, 1, 1),
+            (reg["att"], channel, 1, 1, int(att * 10)),
+            (reg["voa_mode"], channel, 1, 1, 1),
+            (reg["state"], channel, 1, 1, 1)]
+
+
 class CiscoEDFA17:
     def __init__(self, **kwargs):
         # todo la connessione viene instanziata nel costruttore
@@ -25,7 +236,7 @@ class CiscoEDFA17:
         )
         amp_int = AmplifierInterface(amp_params)
         amp_int.login()
-        self._omi_interface = AmplifierOmiInterface(amp_int.socket)
+        self._omi_interface = EDFA17OmiInterface(amp_int.socket, kwargs.get("timeout", TO))
 
 
 
@@ -35,16 +246,22 @@ class CiscoEDFA17:
             if arg == STATE_GAIN:
                 data[arg] = self._omi_interface.get_gain()
             if arg == STATE_TILT:
-                self._omi_interface.get_tilt()
+                data[arg] = self._omi_interface.get_tilt()
             if arg == STATE_INPUT_POWER:
-                self._omi_interface.get_input_power()
+                data[arg] = self._omi_interface.get_input_power()
             if arg == STATE_OUTPUT_POWER:
-                self._omi_interface.get_output_power()
+                data[arg] = self._omi_interface.get_output_power()
             if arg == STATE_SERVICE:
                 # todo
                 pass
         return data
 
+    def get_snapshot(self, uid: str = ""):
+        """ It returns the `core.snapshot.Snapshot` of the amplifier, read in a single pipelined burst."""
+        with SnapshotTimer() as timer:
+            replies = self._omi_interface.omi_read_many(EDFA17_SNAPSHOT_READS + [MODE_READ])
+        return timer.snapshot(uid, **edfa17_snapshot(replies))
+
     def set(self, **kwargs):
         for k, v in kwargs:
             if k == CONFIG_GAIN:
@@ -90,7 +307,7 @@ class CiscoEDFA35(AmplifierOmiInterface):
         )
         self._amp_int = AmplifierInterface(amp_params)
         self._amp_int.login()
-        super().__init__(self._amp_int.socket)
+        super().__init__(self._amp_int.socket, kwargs.get("timeout", TO))
         self._direction = kwargs.get("direction")
 
     # def __del__(self):
@@ -116,20 +333,7 @@ class CiscoEDFA35(AmplifierOmiInterface):
 
 
     def is_socket_closed(self) -> bool:
-        sock = self._socket
-        try:
-            # this will try to read bytes without blocking and also without removing them from buffer (peek only)
-            data = sock.recv(16, MSG_DONTWAIT | MSG_PEEK)
-            if len(data) == 0:
-                return True
-        except BlockingIOError:
-            return False  # socket is open and reading from it would block
-        except ConnectionResetError:
-            return True  # socket was closed for some other reason
-        except Exception as e:
-            print("unexpected exception when checking if a socket is closed")
-            return False
-        return False
+        return is_socket_closed(self._socket)
 
     def get(self, *args):
         data = {}
@@ -137,16 +341,23 @@ class CiscoEDFA35(AmplifierOmiInterface):
             if arg == STATE_GAIN:
                 data[arg] = self.get_gain()
             if arg == STATE_TILT:
-                self.get_tilt()
+                data[arg] = self.get_tilt()
             if arg == STATE_INPUT_POWER:
-                self.get_input_power()
+                data[arg] = self.get_input_power()
             if arg == STATE_OUTPUT_POWER:
-                self.get_output_power()
+                data[arg] = self.get_output_power()
             if arg == STATE_SERVICE:
                 # todo
                 pass
         return data
 
+    def get_snapshot(self, uid: str = ""):
+        """ It returns the `core.snapshot.Snapshot` of the amplifier, read in a single pipelined burst."""
+        _, f_lists = edfa35_telemetry_reads(self._direction)
+        with SnapshotTimer() as timer:
+            replies = self.omi_read_many(f_lists + [MODE_READ])
+        return timer.snapshot(uid, **edfa35_snapshot(replies, self._direction))
+
     def set(self, **kwargs):
         for k, v in kwargs:
             if k == CONFIG_GAIN:
@@ -251,6 +462,17 @@ class CiscoEDFA35(AmplifierOmiInterface):
         attenuation = attenuation_value / 10
         return attenuation
 
+    def get_telemetry(self):
+        """ It reads gain, tilt, input and output power, VOA attenuation and both pump currents in a single
+        pipelined burst.
+
+        :return: (dict) values in dB, dBm and mA
+        """
+        labels, f_lists = edfa35_telemetry_reads(self._direction)
+        replies = self.omi_read_many(f_lists)
+        # all the values are stored by the card with the first decimal digit, hence divided by 10
+        return {label: parse_i32(reply) / 10 for label, reply in zip(labels, replies)}
+
     def set_mode(self, mode):
         if mode.lower() == "constant_current":
             mode_field = 0
@@ -306,156 +528,52 @@ class CiscoWSS(AmplifierOmiInterface):
         amp_int = AmplifierInterface(amp_params)
         amp_int.login()
         self._switch = kwargs.get("switch")
-        super().__init__(amp_int.socket)
-
-    def get_ocm(self, port="COM", switch="MUX"):
+        super().__init__(amp_int.socket, kwargs.get("timeout", TO))
 
+    @staticmethod
+    def _ocm_register(port="COM", switch="MUX"):
         reg_dmx = range(0, 35, 2)
         reg_mux = range(1, 36, 2)
 
+        registers = reg_mux if switch == "MUX" else reg_dmx
+        if port == "COM":
+            return registers[-1]
+        return registers[port - 1]
 
-        if switch == "MUX":
-            if port == "COM":
-                ocm_bin = self._ocm_raw_read(4096, *[reg_mux[-1]])
-            else:
-                ocm_bin = self._ocm_raw_read(4096, *[reg_mux[port-1]])
-        else:
-            if port == "COM":
-                ocm_bin = self._ocm_raw_read(4096, *[reg_dmx[-1]])
-            else:
-                ocm_bin = self._ocm_raw_read(4096, *[reg_dmx[port-1]])
-
-        chs = ocm_bin.split("ch")
+    def get_ocm(self, port="COM", switch="MUX"):
+        """ It returns the OCM spectrum of `port` of the `switch` ("MUX" or "DMX") section.
 
-        slices = []
-        powers = []
+        :return: tuple (frequencies, powers) of NumPy arrays with the 768 slices (THz, dBm)
+        """
+        return self._ocm_raw_read(4096, *[self._ocm_register(port, switch)])
 
-        for ch in chs[1:]:
-            values = ch.split(",")
-            slices.append(int(values[0]))
-            powers.append(float(values[1].split("power")[1])/10)
+    def get_channel_powers(self, grid=None, port="COM", switch="MUX"):
+        """ It returns the power of each channel of `grid`, integrated over the OCM slices.
 
-        f_slices = [(191.35 + i*float(0.00625)) for i in slices]
-        return f_slices, powers
+        :param grid: (ChannelGrid or dict) channel plan, by default the one of `CONFIGURATION / "wxc.json"`
+        :return: tuple (frequencies, powers) of NumPy arrays with the centre frequency (THz) and the power (dBm) of
+            each channel
+        """
+        grid = channel_grid(grid)
+        _, powers = self.get_ocm(port, switch)
+        return grid.frequencies, grid.channel_powers(powers)
 
     def init_channel_WXC(self, channel, freq, bw, att, exp_port=17, switch = "MUX"):
-        
-        if 1 < freq < 1000:
-            f_c = int(freq * 1e3 / 6.25)
-        elif 1 < freq / 1e3 < 1000:
-            f_c = int(freq / 6.25)
-        elif 1 < freq / 1e6 < 1000:
-            f_c = int(freq / 1e3 / 6.25)
-        elif 1 < freq / 1e9 < 1000:
-            f_c = int(freq / 1e6 / 6.25)
-        elif 1 < freq / 1e12 < 1000:
-            f_c = int(freq / 1e9 / 6.25)
-        else:
-            raise ValueError("Invalid frequency value")
-
-        print("freq conf:", freq)
-
-
-        if f_c < 30612 or f_c > 31380:
-            print(f"Channel frequency ({f_c * 6.25 / 1e3:.3f} THz) out of range! "
-                  "Please select a frequency between 191.325 and 196.125 THz")
-            return
-
-        if 1 < bw < 1000:
-            bw_c = int(bw / 12.5)
-        elif 1 < bw / 1e3 < 1000:
-            bw_c = int(bw / 1e3 / 12.5)
-        elif 1 < bw / 1e6 < 1000:
-            bw_c = int(bw / 1e6 / 12.5)
-        elif 1 < bw / 1e9 < 1000:
-            bw_c = int(bw / 1e9 / 12.5)
-        elif 1 < bw / 1e12 < 1000:
-            bw_c = int(bw / 1e12 / 12.5)
-        else:
-            raise ValueError("Invalid bandwidth value")
-
-        if bw_c < 4 or bw_c > 40:
-            print(f"Channel bandwidth ({bw_c * 12.5:.1f} GHz) out of range! "
-                  "Please select a bandwidth between 50 and 500 GHz")
+        try:
+            f_c, bw_c = channel_slots(freq, bw)
+        except ChannelRangeError as e:
+            print(e)
             return
-        
-        # set channel off
-        if switch == 'DMX':
-            self._omi_write(80, channel, 1, 1, 0)
-        elif switch == 'MUX':
-            self._omi_write(82, channel, 1, 1, 0)
-        else:
-            raise ValueError("Invalid MUX_DMX value")
-        
-
-        # WXC.write(command.encode())
-        # status = poll(WXC, b':', 5)
-        # # time.sleep(0.1)
-
-        # assegna frequenza centrale
-        if switch == 'DMX':
-            self._omi_write(28, channel, 1, 1, f_c)
-        elif switch == 'MUX':
-            self._omi_write(34, channel, 1, 1, f_c)
-
-
-        # WXC.write(command.encode())
-        # status = poll(WXC, b':', 5)
-        time.sleep(0.1)
-
-        # banda intorno al canale centrale (in numero di slot da 12.5)
-        if switch == 'DMX':
-            self._omi_write(29, channel, 1, 1, bw_c)
-        elif switch == 'MUX':
-            self._omi_write(35, channel, 1, 1, bw_c)
-        # WXC.write(command.encode())
-        # status = poll(WXC, b':', 5)
-        time.sleep(0.1)
-        #
-
-        # init optical port
-        if switch == 'DMX':
-            self._omi_write(27, channel, 1, 1, exp_port)
-        elif switch == 'MUX':
-            self._omi_write(33, channel, 1, 1, exp_port)
-        # WXC.write(command.encode())
-        # status = poll(WXC, b':', 5)
-        time.sleep(0.1)
-
-        # voa mode in modo che posso passare att e non potenzaq
-        if switch == 'DMX':
-            self._omi_write(26, channel, 1, 1, 1)
-        elif switch == 'MUX':
-            self._omi_write(32, channel, 1, 1, 1)
-        # WXC.write(command.encode())
-        # status = poll(WXC, b':', 5)
-        time.sleep(0.1)
-
-        # set att
-        if switch == 'DMX':
-            self._omi_write(30, channel, 1, 1, int(att * 10))
-        elif switch == 'MUX':
-            self._omi_write(36, channel, 1, 1, int(att * 10))
-        # WXC.write(command.encode())
-        # status = poll(WXC, b':', 5)
-        time.sleep(0.1)
 
-        # again
-        if switch == 'DMX':
-            self._omi_write(26, channel, 1, 1, 1)
-        elif switch == 'MUX':
-            self._omi_write(32, channel, 1, 1, 1)
-        # WXC.write(command.encode())
-        # status = poll(WXC, b':', 5)
-        time.sleep(0.1)
+        print("freq conf:", freq)
 
-        # on
-        if switch == 'DMX':
-            self._omi_write(80, channel, 1, 1, 1)
-        elif switch == 'MUX':
-            self._omi_write(82, channel, 1, 1, 1)
-        # WXC.write(command.encode())
-        # status = poll(WXC, b':', 5)
+        # each write is acknowledged by the card before the next one is sent, and the registers are given time to
+        # settle, except after switching the channel off and once it is back on
+        writes = channel_writes(channel, f_c, bw_c, att, exp_port, switch)
+        for i, write in enumerate(writes):
+            self._omi_write(*write)
+            if 0 < i < len(writes) - 1:
+                time.sleep(WXC_WRITE_PAUSE)
 
         print("Channel set")
 
@@ -473,6 +591,39 @@ class CiscoWSS(AmplifierOmiInterface):
     # Assuming you have a function "poll" for communication, similar to MATLAB's "poll" function.
     # Make sure to implement it accordingly using the communication method of your choice.
 
+    def provision_channels(self, plan, switch="MUX", verify=True, window=OMI_WINDOW):
+        """ It configures a whole channel plan at once: the plan is validated and converted up front, then its
+        writes are streamed in pipelined bursts (all channels off, all the channel registers, all channels on) and
+        finally read back in a single pass. The channels are switched on `WXC_SETTLE_TIME` after the last VOA mode
+        write, once for the whole plan.
+
+        :param plan: (list of dict) `channel`, `freq`, `bw`, `att` and optionally `exp_port` of each channel, see
+            `channel_plan`
+        :param switch: (str) "MUX" or "DMX"
+        :param verify: (bool) read back frequency and attenuation of every channel
+        :param window: (int) maximum number of pipelined commands waiting for their reply
+        :return: (dict) the mismatching registers per channel (empty if none), None without `verify`
+        """
+        writes, expected = plan_writes(plan, switch)
+        switch_on = len(writes) - len(expected)
+        self.omi_write_many(writes[:switch_on], window)
+        time.sleep(WXC_SETTLE_TIME)
+        self.omi_write_many(writes[switch_on:], window)
+        if not verify:
+            return None
+        f_lists = plan_reads(expected, switch)
+        replies = []
+        for first in range(0, len(f_lists), window):
+            replies += self.omi_read_many(f_lists[first:first + window])
+        return plan_check(expected, replies, switch)
+
+    def set_attenuations(self, attenuations: dict, switch="MUX", window=OMI_WINDOW):
+        """ It changes the attenuation of several channels in pipelined bursts.
+
+        :param attenuations: (dict) channel -> attenuation (dB), only the first decimal digit is considered
+        """
+        self.omi_write_many(attenuation_writes(attenuations, switch), window)
+
     def set_ch_on(self, ch,switch="MUX"):
         if switch == 'DMX':
             self._omi_write(26, ch, 1, 1, 1)
@@ -494,4 +645,210 @@ class CiscoWSS(AmplifierOmiInterface):
             value = 80
         else:
             value = 82
-        self._omi_write(value, ch, 1, 1, 0)
\ No newline at end of file
+        self._omi_write(value, ch, 1, 1, 0)
+
+
+def _amplifier_params(kwargs):
+    return AmplifierInterfaceParams(
+        ip_address=kwargs.get("ip_address"),
+        port=kwargs.get("port"),
+        username=kwargs.get("username"),
+        password=kwargs.get("password"),
+        protocol=kwargs.get("protocol")
+    )
+
+
+class AsyncCiscoEDFA35(AsyncAmplifierOmiInterface):
+    """ asyncio counterpart of `CiscoEDFA35`, with the same methods as coroutines.
+
+        Unlike `CiscoEDFA35`, the constructor does not connect: either await `connect()` or use the object as an
+        async context manager.
+
+        Args:
+            **kwargs: same keyword arguments as `CiscoEDFA35`
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(_amplifier_params(kwargs), kwargs.get("timeout", TO))
+        self._direction = kwargs.get("direction")
+
+    @property
+    def direction(self):
+        return self._direction
+
+    @direction.setter
+    def direction(self, direction):
+        self._direction = direction
+
+    async def _read_value(self, *f_list: int):
+        # the values are stored by the card with the first decimal digit, hence divided by 10
+        return parse_i32(await self._omi_read(4096, *f_list)) / 10
+
+    async def get(self, *args):
+        data = {}
+        for arg in args:
+            if arg == STATE_GAIN:
+                data[arg] = await self.get_gain()
+            if arg == STATE_TILT:
+                data[arg] = await self.get_tilt()
+            if arg == STATE_INPUT_POWER:
+                data[arg] = await self.get_input_power()
+            if arg == STATE_OUTPUT_POWER:
+                data[arg] = await self.get_output_power()
+            if arg == STATE_SERVICE:
+                # todo
+                pass
+        return data
+
+    async def set(self, **kwargs):
+        for k, v in kwargs.items():
+            if k == CONFIG_GAIN:
+                await self.set_gain(v)
+            if k == CONFIG_TILT:
+                await self.set_tilt(v)
+            if k == CONFIG_OUTPUT_ENABLED:
+                print("not supported")
+            if k == CONFIG_MODE:
+                await self.set_mode(v)
+            if k == CONFIG_POWER:
+                await self.set_output_power(v)
+
+    async def get_mode(self):
+        mode_value = parse_i32(await self._omi_read(4096, *[21, 1, 1, 1, 0]))
+        if mode_value not in OMI_MODES:
+            logging.exception(f'Unrecognized mode code {mode_value}.')
+            return 'null'
+        return OMI_MODES[mode_value]
+
+    async def get_current(self):
+        current1 = await self._read_value(24, 1, 0)
+        current2 = await self._read_value(24, 2, 0)
+        return current1, current2
+
+    async def get_gain(self):
+        return await self._read_value(27, self._direction, 0)
+
+    async def get_tilt(self):
+        return await self._read_value(28, self._direction, 0)
+
+    async def get_input_power(self):
+        return await self._read_value(41 if self._direction == 1 else 43, 1, 0)
+
+    async def get_output_power(self):
+        return await self._read_value(42 if self._direction == 1 else 44, 1, 0)
+
+    async def get_tot_signal_out_power(self):
+        return await self._read_value(42, 2, 0)
+
+    async def get_noise_figure(self):
+        return
+
+    async def get_voa(self):
+        return await self._read_value(29, 1, 0)
+
+    async def get_snapshot(self, uid: str = ""):
+        """ See `CiscoEDFA35.get_snapshot`."""
+        _, f_lists = edfa35_telemetry_reads(self._direction)
+        with SnapshotTimer() as timer:
+            replies = await self.omi_read_many(f_lists + [MODE_READ])
+        return timer.snapshot(uid, **edfa35_snapshot(replies, self._direction))
+
+    async def get_telemetry(self):
+        """ See `CiscoEDFA35.get_telemetry`."""
+        labels, f_lists = edfa35_telemetry_reads(self._direction)
+        replies = await self.omi_read_many(f_lists)
+        return {label: parse_i32(reply) / 10 for label, reply in zip(labels, replies)}
+
+    async def set_mode(self, mode):
+        mode_codes = {v: k for k, v in OMI_MODES.items()}
+        if mode.lower() not in mode_codes:
+            logging.exception(f'Wrong mode code {mode}.')
+            return
+        await self._omi_write(21, 1, 1, 1, mode_codes[mode.lower()])
+
+    async def set_gain(self, gain):
+        await self._omi_write(27, self._direction, 1, 1, int32(gain * 10))
+
+    async def set_security(self, security):
+        await self._omi_write(55, self._direction, 1, 1, security)
+
+    async def set_current(self, current1, current2):
+        await self._omi_write(24, 1, 1, 1, int32(current1 * 10))
+        await self._omi_write(24, 2, 1, 1, int32(current2 * 10))
+
+    async def set_tilt(self, tilt):
+        await self._omi_write(28, self._direction, 1, 1, int32(tilt * 10))
+
+    async def set_output_power(self, power):
+        await self._omi_write(42, 2, 1, 1, int32(power * 10))
+
+    async def set_voa(self, attenuation):
+        await self._omi_write(29, 1, 1, 1, int32(attenuation * 10))
+
+
+class AsyncCiscoWSS(AsyncAmplifierOmiInterface):
+    """ asyncio counterpart of `CiscoWSS`, with the same methods as coroutines.
+
+        Unlike `CiscoWSS`, the constructor does not connect: either await `connect()` or use the object as an
+        async context manager.
+
+        Args:
+            **kwargs: same keyword arguments as `CiscoWSS`
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(_amplifier_params(kwargs), kwargs.get("timeout", TO))
+        self._switch = kwargs.get("switch")
+
+    async def get_ocm(self, port="COM", switch="MUX"):
+        return await self._ocm_raw_read(4096, *[CiscoWSS._ocm_register(port, switch)])
+
+    async def get_channel_powers(self, grid=None, port="COM", switch="MUX"):
+        grid = channel_grid(grid)
+        _, powers = await self.get_ocm(port, switch)
+        return grid.frequencies, grid.channel_powers(powers)
+
+    async def init_channel_WXC(self, channel, freq, bw, att, exp_port=17, switch="MUX"):
+        try:
+            f_c, bw_c = channel_slots(freq, bw)
+        except ChannelRangeError as e:
+            print(e)
+            return
+
+        writes = channel_writes(channel, f_c, bw_c, att, exp_port, switch)
+        for i, write in enumerate(writes):
+            await self._omi_write(*write)
+            if 0 < i < len(writes) - 1:
+                await asyncio.sleep(WXC_WRITE_PAUSE)
+
+    async def provision_channels(self, plan, switch="MUX", verify=True, window=OMI_WINDOW):
+        """ See `CiscoWSS.provision_channels`."""
+        writes, expected = plan_writes(plan, switch)
+        switch_on = len(writes) - len(expected)
+        await self.omi_write_many(writes[:switch_on], window)
+        await asyncio.sleep(WXC_SETTLE_TIME)
+        await self.omi_write_many(writes[switch_on:], window)
+        if not verify:
+            return None
+        f_lists = plan_reads(expected, switch)
+        replies = []
+        for first in range(0, len(f_lists), window):
+            replies += await self.omi_read_many(f_lists[first:first + window])
+        return plan_check(expected, replies, switch)
+
+    async def set_attenuations(self, attenuations: dict, switch="MUX", window=OMI_WINDOW):
+        await self.omi_write_many(attenuation_writes(attenuations, switch), window)
+
+    async def set_ch_on(self, ch, switch="MUX"):
+        if switch in WXC_REGISTERS:
+            await self._omi_write(WXC_REGISTERS[switch]["voa_mode"], ch, 1, 1, 1)
+
+        await asyncio.sleep(1)
+
+        value = 80 if switch == "DMX" else 82
+        await self._omi_write(value, ch, 1, 1, 1)
+
+    async def set_ch_off(self, ch, switch="MUX"):
+        print("setting channel ", ch, "to off")
+        value = 80 if switch == "DMX" else 82
+        await self._omi_write(value, ch, 1, 1, 0)
@@ -0,0 +1,178 @@
+from re import compile
+from json import load
+from functools import lru_cache
+from numpy import arange, asarray, broadcast_to, errstate, full, log10, nan, nan_to_num, zeros
+
+OCM_SLICES = 768
+OCM_FIRST_SLICE = 191.35  # THz
+OCM_SLICE_WIDTH = 0.00625  # THz
+
+# each slice is printed on its own line as `ch <slice>, power <power in 0.1 dBm>`
+OCM_LINE = compile(rb'ch\s*(\d+)\s*,\s*power\s*(-?\d+(?:\.\d+)?)')
+
+OCM_FREQUENCIES = OCM_FIRST_SLICE + OCM_SLICE_WIDTH * arange(OCM_SLICES)
+OCM_FREQUENCIES.flags.writeable = False
+
+
+class OcmParser:
+    """ Incremental parser of the `ocm_raw_read` output.
+
+        The chunks are fed as they are received from the card: the complete lines are parsed straight into a
+        preallocated array of powers, while an incomplete trailing line is kept until the next chunk.
+
+        Properties:
+            frequencies: returns the (read-only) frequencies of the slices (THz)
+            powers: returns the power of each slice (dBm), NaN for the slices not received
+            complete: returns True once the last slice has been parsed
+
+        Methods:
+            feed.
+    """
+
+    def __init__(self):
+        self._powers = full(OCM_SLICES, nan)
+        self._buffer = bytearray()
+        self._complete = False
+
+    @property
+    def frequencies(self):
+        return OCM_FREQUENCIES
+
+    @property
+    def powers(self):
+        return self._powers
+
+    @property
+    def complete(self):
+        return self._complete
+
+    def feed(self, chunk: bytes) -> bool:
+        """ It parses the complete lines received so far.
+
+        :param chunk: (bytes) data received from the card
+        :return: (bool) True once the last slice has been parsed
+        """
+        buffer = self._buffer
+        buffer += chunk
+        end = buffer.rfind(b'\n') + 1
+        if end == 0:
+            return self._complete
+        powers = self._powers
+        for match in OCM_LINE.finditer(buffer, 0, end):
+            slice_index = int(match.group(1))
+            if slice_index < OCM_SLICES:
+                powers[slice_index] = float(match.group(2)) / 10
+            if slice_index == OCM_SLICES - 1:
+                self._complete = True
+        del buffer[:end]
+        return self._complete
+
+
+def dbm_to_lin(power):
+    """ dBm to mW"""
+    return 10 ** (asarray(power) / 10)
+
+
+def lin_to_dbm(power):
+    """ mW to dBm, -inf for a null power"""
+    with errstate(divide='ignore'):
+        return 10 * log10(power)
+
+
+@lru_cache(maxsize=32)
+def _slice_weights(frequencies: tuple, bandwidths: tuple):
+    """ It returns the (n_ch, 768) matrix selecting the OCM slices whose centre falls in each channel."""
+    weights = zeros((len(frequencies), OCM_SLICES))
+    slices = arange(OCM_SLICES)
+    # channel edges expressed in slice units, rounded to absorb the floating point error of the frequencies
+    first = (asarray(frequencies) - asarray(bandwidths) / 2e3 - OCM_FIRST_SLICE) / OCM_SLICE_WIDTH
+    last = (asarray(frequencies) + asarray(bandwidths) / 2e3 - OCM_FIRST_SLICE) / OCM_SLICE_WIDTH
+    first = first.round(6)
+    last = last.round(6)
+    weights[(slices >= first[:, None]) & (slices < last[:, None])] = 1.0
+    weights.flags.writeable = False
+    return weights
+
+
+class ChannelGrid:
+    """ Channel plan used to integrate the OCM slices into per-channel powers.
+
+        Each channel has its own centre frequency and bandwidth, so that both fixed grids and flexgrid plans with
+        channels of any width can be described.
+
+        A slice is assigned to the channel whose band contains its centre frequency. On the default 50 GHz grid of
+        wxc.json (first channel at 191.4 THz) channel i integrates the slices 8i+4 to 8i+11, and the last channel
+        only the 4 slices left in the OCM range: this is half a channel off the former `reshape(96, 8)`, which
+        summed the slices 8i to 8i+7 whatever the channel frequencies, so the per-channel powers differ from the
+        values computed before.
+
+        Args:
+            frequencies: centre frequency of each channel (THz)
+            bandwidths: bandwidth of each channel, or a single bandwidth for all of them (GHz)
+
+        Properties:
+            frequencies: returns the centre frequencies (THz)
+            bandwidths: returns the bandwidths (GHz)
+            n_ch: returns the number of channels
+
+        Methods:
+            from_config;
+            from_file;
+            channel_powers.
+    """
+
+    def __init__(self, frequencies, bandwidths):
+        frequencies = asarray(frequencies, dtype=float)
+        bandwidths = broadcast_to(asarray(bandwidths, dtype=float), frequencies.shape)
+        self._frequencies = tuple(frequencies.tolist())
+        self._bandwidths = tuple(bandwidths.tolist())
+
+    def __eq__(self, other):
+        return isinstance(other, ChannelGrid) and self._key() == other._key()
+
+    def __hash__(self):
+        return hash(self._key())
+
+    def __repr__(self):
+        return f'{type(self).__name__}(n_ch={self.n_ch})'
+
+    def _key(self):
+        return self._frequencies, self._bandwidths
+
+    @classmethod
+    def from_config(cls, config: dict, signal_band: bool = False):
+        """ It builds the fixed grid described by a channel configuration such as
+        `resources/configuration/default/wxc.json`.
+
+        :param config: (dict) with `n_ch`, `first_freq` (THz), `freq_step` (GHz) and `Rs_GHz`
+        :param signal_band: (bool) integrate over the symbol rate `Rs_GHz` instead of the whole `freq_step` slot
+        """
+        frequencies = config["first_freq"] + config["freq_step"] / 1e3 * arange(config["n_ch"])
+        bandwidth = config["Rs_GHz"] if signal_band else config["freq_step"]
+        return cls(frequencies, bandwidth)
+
+    @classmethod
+    def from_file(cls, file_name, signal_band: bool = False):
+        with open(file_name, "r") as config_file:
+            return cls.from_config(load(config_file), signal_band)
+
+    @property
+    def frequencies(self):
+        return asarray(self._frequencies)
+
+    @property
+    def bandwidths(self):
+        return asarray(self._bandwidths)
+
+    @property
+    def n_ch(self):
+        return len(self._frequencies)
+
+    def channel_powers(self, powers):
+        """ It integrates the OCM slice powers over each channel.
+
+        :param powers: the 768 slice powers (dBm), NaN for the slices not measured
+        :return: (ndarray) the power of each channel (dBm), -inf for a channel without any measured slice
+        """
+        weights = _slice_weights(*self._key())
+        return lin_to_dbm(weights @ nan_to_num(dbm_to_lin(powers), nan=0.0))
@@ -1,64 +1,337 @@
+import asyncio
 import time
 import logging
 
 import math
 from numpy import int32
 import sys
+from re import compile
 from socket import socket
-from osi.interface.omi.utils import get_string_between
-from osi.interface.omi.utils import clear_buffer
+from time import monotonic
+from drivers.cisco.utils import get_string_between
+from drivers.cisco.utils import drain, recv_chunk, recv_until, split_replies, DRAIN_BUFFER_SIZE, TERMINATOR_OVERLAP
+from drivers.cisco.ocm import OcmParser
 from telnetlib import Telnet
 
 TO = 5
 
+# every OMI command is acknowledged by the card with a line starting with `Completed`
+OMI_TERMINATOR = compile(rb'Completed')
+# maximum number of pipelined commands waiting for their reply
+OMI_WINDOW = 16
+# the OCM dump is over once the last slice has been parsed, the trailer following it is dropped after this quiet time
+OCM_QUIET_TIME = 0.05
+
 
 class AmplifierOmiInterface:
-    def __init__(self, socky: socket):
+    """ Framed OMI transport: each command returns as soon as its reply is complete.
+
+        Args:
+            socky: (socket.socket) object containing the TCP/IP socket
+            timeout: (float) deadline for a reply to be completed (s)
+
+        Properties:
+            socket: returns the TCP/IP socket
+            timeout: returns/sets the reply deadline
+            discarded_bytes: returns the number of unexpected bytes dropped after the replies
+    """
+
+    def __init__(self, socky: socket, timeout: float = TO):
         self._socket = socky
+        self._timeout = timeout
+        self._discarded_bytes = 0
 
     @property
     def socket(self):
         return self._socket
 
+    @property
+    def timeout(self):
+        return self._timeout
+
+    @timeout.setter
+    def timeout(self, timeout: float):
+        self._timeout = timeout
+
+    @property
+    def discarded_bytes(self):
+        return self._discarded_bytes
+
+    def _drain(self, quiet_time: float = 0.0):
+        """ It drops whatever is left on the socket after a reply and accounts for it in `discarded_bytes`."""
+        discarded = drain(self._socket, quiet_time)
+        if discarded:
+            self._discarded_bytes += discarded
+            logging.debug(f'Discarded {discarded} bytes left on the socket')
+        return discarded
+
     # OMI Commands
     def _omi_read(self, buffer_size: int, *f_list: int):
         fields = get_string_between(str([f for f in f_list]), '[', ']')
         socky = self.socket
         command = f'omi_read({fields})\r'
         command_bytes = command.encode('utf8')
-        socky.send(command_bytes)
-        time.sleep(0.3)
-        value = socky.recv(buffer_size)
-        clear_buffer(socky)
+        socky.sendall(command_bytes)
+        value = recv_until(socky, OMI_TERMINATOR, self._timeout, buffer_size)
+        self._drain()
         return value
 
     def _omi_write(self, f0: int, f1: int, f2: int, f3: int, value):
         socky = self._socket
         command = f'omi_write({f0},{f1},{f2},{f3},{value})\r'
         command_bytes = command.encode('utf8')
-        socky.send(command_bytes)
-        time.sleep(0.3)
-        clear_buffer(socky)
+        socky.sendall(command_bytes)
+        recv_until(socky, OMI_TERMINATOR, self._timeout)
+        self._drain()
+
+    def omi_read_many(self, f_lists: list, buffer_size: int = 4096):
+        """ It sends all the `omi_read` commands back to back and waits for all the replies at once, so that N
+        registers cost a single round trip.
+
+        :param f_lists: (list of tuples) the fields of each read, e.g. [(27, 1, 0), (28, 1, 0)]
+        :param buffer_size: (int) size of each recv call
+        :return: (list of bytes) one reply per read, in the same order as `f_lists`
+        """
+        headers = [f"omi_read({get_string_between(str([f for f in f_list]), '[', ']')})" for f_list in f_lists]
+        socky = self.socket
+        command = ''.join(f'{header}\r' for header in headers)
+        command_bytes = command.encode('utf8')
+        socky.sendall(command_bytes)
+        value = recv_until(socky, OMI_TERMINATOR, self._timeout, buffer_size, count=len(headers))
+        self._drain()
+        return split_replies(value, headers)
+
+    def omi_write_many(self, writes: list, window: int = OMI_WINDOW):
+        """ It streams the `omi_write` commands in bursts of `window` commands, each burst waiting for all its
+        acknowledgements at once.
+
+        :param writes: (list of tuples) the fields and the value of each write, e.g. [(82, 1, 1, 1, 0)]
+        :param window: (int) maximum number of writes waiting for their acknowledgement
+        """
+        socky = self.socket
+        for first in range(0, len(writes), window):
+            burst = writes[first:first + window]
+            command = ''.join(f'omi_write({f0},{f1},{f2},{f3},{value})\r' for f0, f1, f2, f3, value in burst)
+            socky.sendall(command.encode('utf8'))
+            recv_until(socky, OMI_TERMINATOR, self._timeout, count=len(burst))
+            self._drain()
 
     def _ocm_raw_read(self, buffer_size: int, *f_list: int):
+        """ It reads an OCM spectrum, parsing it while it is received.
+
+        :return: tuple (frequencies, powers) of NumPy arrays with the 768 slices (THz, dBm)
+        """
         fields = get_string_between(str([f for f in f_list]), '[', ']')
         socky = self.socket
         command = f'ocm_raw_read {fields}\r'
         command_bytes = command.encode('utf8')
-        socky.send(command_bytes)
-        time.sleep(0.3)
-        str_buf = ""
-        while not "ch 767" in str_buf:
-            value = socky.recv(buffer_size)
-            str_buf += str(value).replace("b", "").replace("'",'').replace('"','')
-        clear_buffer(socky)
-        return str_buf
+        socky.sendall(command_bytes)
+        parser = OcmParser()
+        deadline = monotonic() + self._timeout
+        while not parser.feed(recv_chunk(socky, deadline, buffer_size)):
+            pass
+        self._drain(OCM_QUIET_TIME)
+        return parser.frequencies, parser.powers
 
 
     def _omi_write_and_check(self):
         pass
 
 
+class AsyncAmplifierOmiInterface:
+    """ asyncio counterpart of `AmplifierOmiInterface`, built on `asyncio.open_connection`.
+
+        Commands sent on the same card are serialized, while any number of cards can be driven concurrently by
+        the same event loop.
+
+        Args:
+            params: (AmplifierInterfaceParams) address and credentials of the card
+            timeout: (float) deadline for a reply to be completed (s)
+
+        Properties:
+            params: returns the parameters of the interface
+            timeout: returns/sets the reply deadline
+            discarded_bytes: returns the number of unexpected bytes dropped after the replies
+
+        Methods:
+            connect;
+            close.
+    """
+
+    def __init__(self, params, timeout: float = TO):
+        self._params = params
+        self._timeout = timeout
+        self._reader = None
+        self._writer = None
+        self._lock = asyncio.Lock()
+        # bytes received after the last terminator, dropped before the next command
+        self._pending = b''
+        self._discarded_bytes = 0
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    @property
+    def params(self):
+        return self._params
+
+    @property
+    def timeout(self):
+        return self._timeout
+
+    @timeout.setter
+    def timeout(self, timeout: float):
+        self._timeout = timeout
+
+    @property
+    def discarded_bytes(self):
+        return self._discarded_bytes
+
+    async def connect(self):
+        """ It opens the TCP/IP connection and logs in with `self.params.username` and `self.params.password`."""
+        host = self.params.ip_address
+        port = self.params.port
+        logging.debug(f"Connecting to {host}:{port}")
+        self._reader, self._writer = await asyncio.wait_for(asyncio.open_connection(host, port), self._timeout)
+        logging.debug(f"Connected recv: {await self._read_some(1024)}")
+        self._writer.write(self.params.username + b'\r' + self.params.password + b'\r')
+        await self._writer.drain()
+        logging.debug('\n' + str(await self._read_some(1024)))
+        self._pending = b''
+
+    async def close(self):
+        if self._writer is None:
+            return
+        self._writer.close()
+        try:
+            await self._writer.wait_closed()
+        except ConnectionError:
+            pass
+        self._reader = self._writer = None
+
+    def is_socket_closed(self) -> bool:
+        return self._writer is None or self._writer.is_closing() or self._reader.at_eof()
+
+    async def _read_some(self, buffer_size: int):
+        return await asyncio.wait_for(self._reader.read(buffer_size), self._timeout)
+
+    async def _drain(self, buffer_size: int = DRAIN_BUFFER_SIZE):
+        """ It drops the bytes left after the last reply, those already received included, without waiting for more,
+        and accounts for them in `discarded_bytes`, as `AmplifierOmiInterface._drain`.
+        """
+        discarded = len(self._pending)
+        self._pending = b''
+        while True:
+            read = asyncio.ensure_future(self._reader.read(buffer_size))
+            # a single pass of the event loop: the read completes only if the data is already there
+            await asyncio.sleep(0)
+            if not read.done():
+                read.cancel()
+                await asyncio.gather(read, return_exceptions=True)
+                break
+            chunk = read.result()
+            if not chunk:
+                break
+            discarded += len(chunk)
+        if discarded:
+            self._discarded_bytes += discarded
+            logging.debug(f'Discarded {discarded} bytes left on the connection')
+        return discarded
+
+    async def _send(self, command: str):
+        # a trailer received after the terminator of the previous reply would be taken for the next reply
+        await self._drain()
+        self._writer.write(command.encode('utf8'))
+        await self._writer.drain()
+
+    async def _recv_until(self, terminator, buffer_size: int = 4096, count: int = 1):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self._timeout
+        buffer = bytearray()
+        position = 0
+        found = 0
+        while True:
+            match = terminator.search(buffer, position)
+            while match is not None:
+                found += 1
+                position = match.end()
+                if found >= count:
+                    self._pending = bytes(buffer[position:])
+                    return bytes(buffer[:position])
+                match = terminator.search(buffer, position)
+            # a terminator split between two chunks must still be found on the next pass
+            position = max(position, len(buffer) - TERMINATOR_OVERLAP)
+            remaining = deadline - loop.time()
+            try:
+                if remaining <= 0:
+                    raise asyncio.TimeoutError
+                chunk = await asyncio.wait_for(self._reader.read(buffer_size), remaining)
+            except asyncio.TimeoutError:
+                raise TimeoutError(f'{count - found} replies not completed within {self._timeout} s, '
+                                   f'received: {bytes(buffer)!r}')
+            if not chunk:
+                raise ConnectionError(f'Connection closed by peer, received: {bytes(buffer)!r}')
+            buffer += chunk
+
+    # OMI Commands
+    async def _omi_read(self, buffer_size: int, *f_list: int):
+        fields = get_string_between(str([f for f in f_list]), '[', ']')
+        async with self._lock:
+            await self._send(f'omi_read({fields})\r')
+            return await self._recv_until(OMI_TERMINATOR, buffer_size)
+
+    async def _omi_write(self, f0: int, f1: int, f2: int, f3: int, value):
+        async with self._lock:
+            await self._send(f'omi_write({f0},{f1},{f2},{f3},{value})\r')
+            await self._recv_until(OMI_TERMINATOR)
+
+    async def omi_read_many(self, f_lists: list, buffer_size: int = 4096):
+        """ See `AmplifierOmiInterface.omi_read_many`."""
+        headers = [f"omi_read({get_string_between(str([f for f in f_list]), '[', ']')})" for f_list in f_lists]
+        async with self._lock:
+            await self._send(''.join(f'{header}\r' for header in headers))
+            value = await self._recv_until(OMI_TERMINATOR, buffer_size, count=len(headers))
+        return split_replies(value, headers)
+
+    async def omi_write_many(self, writes: list, window: int = OMI_WINDOW):
+        """ See `AmplifierOmiInterface.omi_write_many`."""
+        for first in range(0, len(writes), window):
+            burst = writes[first:first + window]
+            async with self._lock:
+                await self._send(''.join(f'omi_write({f0},{f1},{f2},{f3},{value})\r'
+                                         for f0, f1, f2, f3, value in burst))
+                await self._recv_until(OMI_TERMINATOR, count=len(burst))
+
+    async def _ocm_raw_read(self, buffer_size: int, *f_list: int):
+        """ See `AmplifierOmiInterface._ocm_raw_read`."""
+        fields = get_string_between(str([f for f in f_list]), '[', ']')
+        parser = OcmParser()
+        async with self._lock:
+            await self._send(f'ocm_raw_read {fields}\r')
+            try:
+                while not parser.complete:
+                    chunk = await asyncio.wait_for(self._reader.read(buffer_size), self._timeout)
+                    if not chunk:
+                        raise ConnectionError('Connection closed by peer')
+                    parser.feed(chunk)
+            except asyncio.TimeoutError:
+                raise TimeoutError(f'OCM reply not completed within {self._timeout} s')
+            # drop the trailer of the reply
+            try:
+                while True:
+                    chunk = await asyncio.wait_for(self._reader.read(buffer_size), OCM_QUIET_TIME)
+                    if not chunk:
+                        break
+                    self._discarded_bytes += len(chunk)
+            except asyncio.TimeoutError:
+                pass
+        return parser.frequencies, parser.powers
+
+
 class EDFA17OmiInterface(AmplifierOmiInterface):
     """ Interface to the CISCO EDFA card.
 
@@ -208,8 +481,8 @@ class EDFA35OmiInterface(AmplifierOmiInterface):
             .
     """
 
-    def __init__(self, socky: socket, direction: int):
-        super().__init__(socky)
+    def __init__(self, socky: socket, direction: int, timeout: float = TO):
+        super().__init__(socky, timeout)
         self._direction = direction
 
     def get_mode(self):
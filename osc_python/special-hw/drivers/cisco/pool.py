@@ -0,0 +1,136 @@
+import logging
+from contextlib import contextmanager
+from threading import Condition
+from time import monotonic
+from drivers.cisco.utils import is_socket_closed
+
+TCC2_PORT = 23
+IDLE_TIMEOUT = 300.0
+
+
+def session_key(interface):
+    """ It returns the (ip_address, port) identifying the session of an `AmplifierInterface` or `ChassisInterface`.
+    """
+    params = interface.params
+    return params.ip_address, getattr(params, 'port', TCC2_PORT)
+
+
+class SessionPool:
+    """ Pool of logged-in sessions to the chassis and to the amplifiers, keyed by (ip_address, port).
+
+        A session is handed out to one user at a time and kept open when released, so that the next `acquire` costs
+        neither the TCP connection nor the credential exchange (nor the `setTelnetRelay` handshake of a TCC2).
+        Sessions idle for longer than `idle_timeout` or whose socket has been closed by the peer are transparently
+        logged in again.
+
+        Args:
+            idle_timeout: (float) time after which an unused session is not trusted anymore (s)
+
+        Properties:
+            idle_timeout: returns the idle timeout
+
+        Methods:
+            acquire;
+            release;
+            session;
+            close_idle;
+            close_all.
+    """
+
+    def __init__(self, idle_timeout: float = IDLE_TIMEOUT):
+        self._idle_timeout = idle_timeout
+        self._sessions = {}
+        self._last_used = {}
+        self._in_use = set()
+        self._condition = Condition()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    @property
+    def idle_timeout(self):
+        return self._idle_timeout
+
+    def _is_healthy(self, key, session):
+        if monotonic() - self._last_used.get(key, 0.0) > self._idle_timeout:
+            return False
+        return not is_socket_closed(session.socket)
+
+    def _discard(self, key):
+        session = self._sessions.pop(key, None)
+        self._last_used.pop(key, None)
+        if session is None:
+            return
+        try:
+            session.close()
+        except OSError as e:
+            logging.debug(f'Closing stale session {key} failed: {e!r}')
+
+    def acquire(self, interface):
+        """ It returns a logged-in session for the (ip_address, port) of `interface`, waiting if another thread is
+        using it. `interface` itself is logged in and pooled when no healthy session is available.
+        """
+        key = session_key(interface)
+        with self._condition:
+            while key in self._in_use:
+                self._condition.wait()
+            self._in_use.add(key)
+            session = self._sessions.get(key)
+
+        try:
+            if session is not None and not self._is_healthy(key, session):
+                logging.info(f'Session {key} is stale, logging in again')
+                with self._condition:
+                    self._discard(key)
+                session = None
+            if session is None:
+                interface.login()
+                session = interface
+                with self._condition:
+                    self._sessions[key] = session
+        except Exception:
+            with self._condition:
+                self._in_use.discard(key)
+                self._condition.notify_all()
+            raise
+        return session
+
+    def release(self, session, broken: bool = False):
+        """ It gives `session` back to the pool. A `broken` session is closed and dropped."""
+        key = session_key(session)
+        with self._condition:
+            if broken:
+                self._discard(key)
+            else:
+                self._last_used[key] = monotonic()
+            self._in_use.discard(key)
+            self._condition.notify_all()
+
+    @contextmanager
+    def session(self, interface):
+        """ Context manager around `acquire` and `release`. The session is dropped if the body raises an OSError."""
+        session = self.acquire(interface)
+        try:
+            yield session
+        except OSError:
+            self.release(session, broken=True)
+            raise
+        except BaseException:
+            self.release(session)
+            raise
+        self.release(session)
+
+    def close_idle(self):
+        """ It closes the sessions not used for longer than `idle_timeout`."""
+        now = monotonic()
+        with self._condition:
+            for key in list(self._sessions):
+                if key not in self._in_use and now - self._last_used.get(key, now) > self._idle_timeout:
+                    self._discard(key)
+
+    def close_all(self):
+        with self._condition:
+            for key in list(self._sessions):
+                self._discard(key)
+            self._in_use.clear()
+            self._condition.notify_all()
@@ -1,8 +1,8 @@
 import logging
 from socket import socket, AF_INET, SOCK_STREAM
-from osi.interface.omi.params import Tcc2InterfaceParams, AmplifierInterfaceParams, \
+from drivers.cisco.params import Tcc2InterfaceParams, AmplifierInterfaceParams, \
     ChassisInterfaceParams, WxcInterfaceParams
-from osi.interface.omi.omi_interfaces import AmplifierOmiInterface, WxcOmiInterface
+from drivers.cisco.omi_interfaces import AmplifierOmiInterface, WxcOmiInterface
 from telnetlib import Telnet
 
 
@@ -306,6 +306,10 @@ class ChassisInterface:
     def tcc2interface(self):
         return self._tcc2interface
 
+    @property
+    def socket(self):
+        return self._tcc2interface.socket
+
     def login(self):
         self.tcc2interface.login()
 
@@ -364,9 +368,9 @@ class WxcInterface(EquipmentInterface):
 
 import logging
 from socket import socket, AF_INET, SOCK_STREAM
-from osi.interface.omi.params import Tcc2InterfaceParams, AmplifierInterfaceParams, \
+from drivers.cisco.params import Tcc2InterfaceParams, AmplifierInterfaceParams, \
     ChassisInterfaceParams, WxcInterfaceParams
-from osi.interface.omi.omi_interfaces import AmplifierOmiInterface, WxcOmiInterface
+from drivers.cisco.omi_interfaces import AmplifierOmiInterface, WxcOmiInterface
 from telnetlib import Telnet
 
 
@@ -670,6 +674,10 @@ class ChassisInterface:
     def tcc2interface(self):
         return self._tcc2interface
 
+    @property
+    def socket(self):
+        return self._tcc2interface.socket
+
     def login(self):
         self.tcc2interface.login()
 
@@ -1,6 +1,11 @@
-from socket import socket
+from socket import socket, MSG_DONTWAIT, MSG_PEEK
+from re import Pattern, compile
 import select
-from time import sleep
+from time import sleep, monotonic
+
+TERMINATOR_OVERLAP = 64
+DRAIN_BUFFER_SIZE = 65536
+I32_VALUE = compile(rb'I32-Value is:\s*(-?\d+)')
 
 
 # def clear_buffer(socky: socket):
@@ -9,14 +14,48 @@ from time import sleep
 #     while data:
 #         data = socky.recv(1024)
 #         sleep(0.1)
-def clear_buffer(sock: socket):
-    """remove the data present on the socket"""
-    while 1:
-        inputready, o, e = select.select([sock], [], [], 0.0)
-        if len(inputready) == 0:
+def drain(sock: socket, quiet_time: float = 0.0, buffer_size: int = DRAIN_BUFFER_SIZE):
+    """ It empties the socket with large non-blocking reads, until no data arrives for `quiet_time` seconds.
+
+    :param sock: (socket.socket) connected socket
+    :param quiet_time: (float) time without incoming data after which the socket is considered empty (s)
+    :param buffer_size: (int) size of each recv call
+    :return: (int) number of discarded bytes
+    """
+    discarded = 0
+    while select.select([sock], [], [], quiet_time)[0]:
+        try:
+            chunk = sock.recv(buffer_size, MSG_DONTWAIT)
+        except BlockingIOError:
             break
-        for s in inputready:
-            s.recv(1)
+        if not chunk:
+            break
+        discarded += len(chunk)
+    return discarded
+
+
+def clear_buffer(sock: socket):
+    """remove the data present on the socket and return the number of discarded bytes"""
+    return drain(sock)
+
+
+def is_socket_closed(sock: socket) -> bool:
+    """ It checks whether the peer has closed `sock`, without consuming any pending data."""
+    if sock is None or sock.fileno() == -1:
+        return True
+    try:
+        # this will try to read bytes without blocking and also without removing them from buffer (peek only)
+        data = sock.recv(16, MSG_DONTWAIT | MSG_PEEK)
+        if len(data) == 0:
+            return True
+    except BlockingIOError:
+        return False  # socket is open and reading from it would block
+    except ConnectionResetError:
+        return True  # socket was closed for some other reason
+    except Exception as e:
+        print("unexpected exception when checking if a socket is closed")
+        return False
+    return False
 
 
 def get_string_between(string: str, start_string: str, end_string: str):
@@ -29,3 +68,88 @@ def get_string_between(string: str, start_string: str, end_string: str):
     """
     partial = string.split(start_string)[1]
     return partial.split(end_string)[0]
+
+
+def recv_until(sock: socket, terminator: Pattern, timeout: float, buffer_size: int = 4096, count: int = 1):
+    """ It reads from `sock` until `terminator` has been found `count` times in the received data or `timeout`
+    expires.
+
+    :param sock: (socket.socket) connected socket
+    :param terminator: (re.Pattern) compiled bytes pattern closing each reply
+    :param timeout: (float) deadline for the whole reply (s)
+    :param buffer_size: (int) size of each recv call
+    :param count: (int) number of replies to wait for
+    :return: (bytes) the received data, terminators included
+    """
+    deadline = monotonic() + timeout
+    buffer = bytearray()
+    position = 0
+    found = 0
+    while True:
+        match = terminator.search(buffer, position)
+        while match is not None:
+            found += 1
+            position = match.end()
+            if found >= count:
+                return bytes(buffer)
+            match = terminator.search(buffer, position)
+        # a terminator split between two chunks must still be found on the next pass
+        position = max(position, len(buffer) - TERMINATOR_OVERLAP)
+        remaining = deadline - monotonic()
+        ready = select.select([sock], [], [], remaining)[0] if remaining > 0 else []
+        if not ready:
+            raise TimeoutError(f'{count - found} replies not completed within {timeout} s, '
+                               f'received: {bytes(buffer)!r}')
+        chunk = sock.recv(buffer_size)
+        if not chunk:
+            raise ConnectionError(f'Connection closed by peer, received: {bytes(buffer)!r}')
+        buffer += chunk
+
+
+def recv_chunk(sock: socket, deadline: float, buffer_size: int = 4096):
+    """ It returns the next chunk of data received on `sock`, waiting at most until `deadline`.
+
+    :param sock: (socket.socket) connected socket
+    :param deadline: (float) `time.monotonic()` value after which the wait is over
+    :param buffer_size: (int) size of the recv call
+    :return: (bytes) the received data
+    """
+    remaining = deadline - monotonic()
+    ready = select.select([sock], [], [], remaining)[0] if remaining > 0 else []
+    if not ready:
+        raise TimeoutError('Reply not completed in time')
+    chunk = sock.recv(buffer_size)
+    if not chunk:
+        raise ConnectionError('Connection closed by peer')
+    return chunk
+
+
+def split_replies(data: bytes, headers: list):
+    """ It splits a burst of pipelined replies by their echoed command `headers`.
+
+    :param data: (bytes) the replies received back to back
+    :param headers: (list of str) the echoed commands, in the order they were sent
+    :return: (list of bytes) one reply per header, starting with the header itself
+    """
+    starts = []
+    position = 0
+    for header in headers:
+        start = data.find(header.encode('utf8'), position)
+        if start < 0:
+            raise ValueError(f'Missing reply to {header} in {data!r}')
+        starts.append(start)
+        position = start + len(header)
+    ends = starts[1:] + [len(data)]
+    return [data[start:end] for start, end in zip(starts, ends)]
+
+
+def parse_i32(reply: bytes):
+    """ It extracts the integer value from an `omi_read` reply.
+
+    :param reply: (bytes) the reply of the card
+    :return: (int) the value following `I32-Value is:`
+    """
+    match = I32_VALUE.search(reply)
+    if match is None:
+        raise ValueError(f'No I32 value in {reply!r}')
+    return int(match.group(1))
@@ -1,19 +1,37 @@
 from pandas import DataFrame
 from pathlib import Path
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from itertools import zip_longest
+from time import monotonic
 import logging
 import json
-from osi.interface.omi.params import ChassisInterfaceParams, AmplifierInterfaceParams
-from osi.interface.omi.user import ChassisInterface
+from drivers.cisco.params import ChassisInterfaceParams, AmplifierInterfaceParams
+from drivers.cisco.user import ChassisInterface
+from drivers.cisco.pool import SessionPool
 
 
 # TODO: to replace in params.py?
 class ControllerParams:
-
-    def __init__(self, ip_port_edfa: DataFrame, credentials: DataFrame, protocol: str):
+    """ Parameters of the object Controller.
+
+    Args:
+        ip_port_edfa (DataFrame): chassis IP address, port number and uid of each amplifier
+        credentials (DataFrame): username and password of each chassis
+        protocol (str): protocol adopted to communicate with the amplifiers
+        max_workers (int): amplifiers handled at the same time over the whole line (1 means one at a time)
+        max_workers_per_chassis (int): amplifiers handled at the same time on the same chassis
+    """
+
+    def __init__(self, ip_port_edfa: DataFrame, credentials: DataFrame, protocol: str, max_workers: int = 1,
+                 max_workers_per_chassis: int = 1):
         self._ip_port_edfa = ip_port_edfa
         self._credentials = credentials
         # TODO: restructure protocol capture
         self._protocol = protocol
+        self._max_workers = max_workers
+        self._max_workers_per_chassis = max_workers_per_chassis
 
     @property
     def ip_port_edfa(self):
@@ -27,14 +45,52 @@ class ControllerParams:
     def protocol(self):
         return self._protocol
 
+    @property
+    def max_workers(self):
+        return self._max_workers
+
+    @property
+    def max_workers_per_chassis(self):
+        return self._max_workers_per_chassis
+
+
+class AmplifierReport:
+    """ Outcome of an operation on a single amplifier.
+
+    Attributes:
+        uid (str): uid of the amplifier
+        ip_address (str): IP address of its chassis
+        result: value returned by the operation, None if it failed
+        error (Exception): exception raised by the operation, None if it succeeded
+        elapsed (float): duration of the operation (s)
+    """
+
+    def __init__(self, uid: str, ip_address: str, result=None, error: Exception = None, elapsed: float = 0.0):
+        self.uid = uid
+        self.ip_address = ip_address
+        self.result = result
+        self.error = error
+        self.elapsed = elapsed
+
+    def __repr__(self):
+        return (f'{type(self).__name__}(uid={self.uid!r}, ip_address={self.ip_address!r}, '
+                f'result={self.result!r}, error={self.error!r}, elapsed={self.elapsed:.3f})')
+
+    @property
+    def ok(self):
+        return self.error is None
+
 
 class Controller:
 
-    def __init__(self, params: ControllerParams, network_description=None):
+    def __init__(self, params: ControllerParams, network_description=None, session_pool: SessionPool = None):
         self._params = params
         self._chassis = {}
         self._configure_chassis()
         self._network_description = network_description
+        self._report = {}
+        # without a pool, every operation logs in and closes chassis and amplifiers
+        self._session_pool = session_pool
 
     @property
     def params(self):
@@ -44,6 +100,15 @@ class Controller:
     def chassis(self):
         return self._chassis
 
+    @property
+    def session_pool(self):
+        return self._session_pool
+
+    @property
+    def report(self):
+        """ Per-amplifier outcome (uid -> AmplifierReport) of the last configure/read/get_configuration."""
+        return self._report
+
     @property
     def network_description(self):
         return self._network_description
@@ -78,79 +143,157 @@ class Controller:
             self._chassis[ip_addr] = chassis_interface
         return
 
-    def configure_amplifiers(self, network_description: dict):
+    def _open(self, interface):
+        if self._session_pool is None:
+            interface.login()
+            return interface
+        return self._session_pool.acquire(interface)
+
+    def _close(self, interface, broken=False):
+        if self._session_pool is None:
+            interface.close()
+        else:
+            self._session_pool.release(interface, broken)
+
+    @contextmanager
+    def _session(self, interface):
+        if self._session_pool is not None:
+            with self._session_pool.session(interface) as session:
+                yield session
+            return
+        interface.login()
+        try:
+            yield interface
+        finally:
+            interface.close()
+
+    def close(self):
+        """ It closes the pooled sessions, if any."""
+        if self._session_pool is not None:
+            self._session_pool.close_all()
+
+    def _run_on_amplifiers(self, task):
+        """ It runs `task(amp)` on every amplifier of every chassis and collects a report per amplifier.
+
+        Chassis are logged in concurrently, then amplifiers are handled by a pool of `params.max_workers` threads,
+        with at most `params.max_workers_per_chassis` of them on the same chassis. A failing amplifier is reported
+        and does not stop the others.
+
+        Each chassis is served by `params.max_workers_per_chassis` lanes taking its amplifiers one after the other,
+        and the lanes are submitted round-robin over the chassis: no thread of the pool ever waits for a chassis
+        slot while the amplifiers of another chassis are pending.
+        """
         chassis = self.chassis
-        elements = network_description['elements']
-        for ip_address, cha in chassis.items():
-            cha.login()
-            for edfa_uid, amp in cha.amplifiers.items():
-
-                filtered_elem = list(filter(lambda elem: elem['uid'] == edfa_uid, elements))
+        max_workers = max(1, self.params.max_workers)
+        per_chassis = max(1, self.params.max_workers_per_chassis)
+
+        def run(ip_address, edfa_uid, amp):
+            start = monotonic()
+            try:
+                with self._session(amp) as session:
+                    result = task(edfa_uid, session)
+            except Exception as e:
+                logging.error(f'{edfa_uid} on {ip_address} failed: {e!r}')
+                return AmplifierReport(edfa_uid, ip_address, error=e, elapsed=monotonic() - start)
+            return AmplifierReport(edfa_uid, ip_address, result=result, elapsed=monotonic() - start)
+
+        def lane(ip_address, pending):
+            lane_reports = []
+            while True:
+                try:
+                    edfa_uid, amp = pending.popleft()
+                except IndexError:
+                    return lane_reports
+                lane_reports.append(run(ip_address, edfa_uid, amp))
+
+        reports = {}
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            logins = {ip_address: pool.submit(self._open, cha) for ip_address, cha in chassis.items()}
+            lanes = []
+            for ip_address, cha in chassis.items():
+                try:
+                    logins[ip_address].result()
+                except Exception as e:
+                    logging.error(f'Login to chassis {ip_address} failed: {e!r}')
+                    for edfa_uid in cha.amplifiers:
+                        reports[edfa_uid] = AmplifierReport(edfa_uid, ip_address, error=e)
+                    continue
+                # deque.popleft is atomic, the lanes of a chassis share its queue without a lock
+                pending = deque(cha.amplifiers.items())
+                lanes.append([(ip_address, pending)] * min(per_chassis, len(pending)))
+            futures = [pool.submit(lane, *args) for round_robin in zip_longest(*lanes) for args in round_robin
+                       if args is not None]
+            for future in futures:
+                for report in future.result():
+                    reports[report.uid] = report
+
+        for ip_address, login in logins.items():
+            if login.exception() is None:
+                self._close(login.result())
+
+        self._report = reports
+        return reports
+
+    @staticmethod
+    def _find_element(elements, edfa_uid):
+        filtered_elem = [elem for elem in elements if elem['uid'] == edfa_uid]
+
+        # Check if EDFA is missing or multiple in `ip_port_edfa`
+        if len(filtered_elem) == 0:
+            raise KeyError(f'{edfa_uid} is not present in the network description')
+        elif len(filtered_elem) > 1:
+            raise KeyError(f'{edfa_uid} defined multiple times in the network description')
+        return filtered_elem[0]
 
-                if len(filtered_elem) == 0:
-                    logging.exception(f'{edfa_uid} is not present in the network description')
-                elif len(filtered_elem) > 1:
-                    logging.exception(f'{edfa_uid} defined multiple times in the network description')
+    def configure_amplifiers(self, network_description: dict):
+        elements = network_description['elements']
 
-                el = filtered_elem[0]
+        def configure(edfa_uid, amp):
+            el = self._find_element(elements, edfa_uid)
 
-                operational = el['operational']
-                amp.login()
-                amp.configure_operational(operational)
+            operational = el['operational']
+            amp.configure_operational(operational)
 
-                mode = amp.get_mode()
-                if mode == 'constant_gain':
-                    logging.info(f'Gain target = {operational["gain_target"]:.1f}; actual gain {amp.get_gain()}')
-                    logging.info(f'Tilt target = {operational["tilt_target"]:.1f}; actual tilt {amp.get_tilt()}')
-                elif mode == 'constant_power':
-                    logging.info(f'Pout target = {operational["pout_target"]:.1f}; actual power {amp.get_output_power()}')
-                    logging.info(f'Tilt target = {operational["tilt_target"]:.1f}; actual tilt {amp.get_tilt()}')
+            mode = amp.get_mode()
+            if mode == 'constant_gain':
+                logging.info(f'Gain target = {operational["gain_target"]:.1f}; actual gain {amp.get_gain()}')
+                logging.info(f'Tilt target = {operational["tilt_target"]:.1f}; actual tilt {amp.get_tilt()}')
+            elif mode == 'constant_power':
+                logging.info(f'Pout target = {operational["pout_target"]:.1f}; actual power {amp.get_output_power()}')
+                logging.info(f'Tilt target = {operational["tilt_target"]:.1f}; actual tilt {amp.get_tilt()}')
+            return mode
 
-                amp.close()
-            cha.close()
+        reports = self._run_on_amplifiers(configure)
 
         self.network_description = network_description
-        return
+        return reports
 
     def read_amplifiers(self):
-        chassis = self.chassis
-        amp_all = ''
-        for _, cha in chassis.items():
+        for _, cha in self.chassis.items():
             print(cha)
-            for _, amp in cha.amplifiers.items():
-                amp.login()
-                amp_string = str(amp)
-                amp_all += amp_string + '\n'
-                print(amp_string)
-                amp.close()
-        return amp_all
+
+        reports = self._run_on_amplifiers(lambda edfa_uid, amp: str(amp))
+
+        amp_strings = [report.result for report in reports.values() if report.ok]
+        for amp_string in amp_strings:
+            print(amp_string)
+        return ''.join(amp_string + '\n' for amp_string in amp_strings)
 
     def get_configuration(self):
         network_description = self.network_description
-        chassis = self.chassis
         elements = network_description['elements']
-        for ip_address, cha in chassis.items():
-            cha.login()
-            for edfa_uid, amp in cha.amplifiers.items():
-
-                filtered_elem = list(filter(lambda elem: elem['uid'] == edfa_uid, elements))
-
-                # Check if EDFA is missing or multiple in `ip_port_edfa`
-                if len(filtered_elem) == 0:
-                    logging.exception(f'{edfa_uid} is not present in the network description')
-                elif len(filtered_elem) > 1:
-                    logging.exception(f'{edfa_uid} defined multiple times in the network description')
-
-                amp.login()
-                gain_target = amp.get_gain()
-                tilt_target = amp.get_tilt()
-
-                el = filtered_elem[0]
-                el['operational'] = {'gain_target': gain_target,
-                                     'tilt_target': tilt_target}
 
-                amp.close()
-            cha.close()
+        def read_configuration(edfa_uid, amp):
+            el = self._find_element(elements, edfa_uid)
+            gain_target = amp.get_gain()
+            tilt_target = amp.get_tilt()
+            return el, {'gain_target': gain_target, 'tilt_target': tilt_target}
+
+        # the description is updated once all the threads are over
+        for report in self._run_on_amplifiers(read_configuration).values():
+            if report.ok:
+                el, operational = report.result
+                el['operational'] = operational
 
         return network_description
 
@@ -0,0 +1,281 @@
+import asyncio
+import logging
+from weakref import WeakKeyDictionary
+import asyncssh
+from drivers.juniper.common import CONFIG_SCOPE, check_set, edfa_direction, edfa_pager, edfa_scope, get_labels, \
+    get_values, set_commands, set_values
+from drivers.juniper.utils import ShellOutput, parse_edfa, BUF_SIZE, PAGER_KEY, PAGER_REACHED, PROMPT, \
+    PROMPT_REACHED, READ_TIMEOUT
+import drivers.juniper.constants as CONST
+from core.snapshot import SnapshotTimer, value_of
+from core.constants import CONFIG_MODE, STATE_GAIN, STATE_INPUT_POWER, STATE_OUTPUT_POWER, STATE_TILT
+
+SSH_PORT = 22
+
+# event loop -> (hostname, port, username) -> session, the asyncssh connections being bound to the loop they were
+# opened in
+_SESSIONS = WeakKeyDictionary()
+
+
+class AsyncJuniperSession:
+    """ Asyncio counterpart of `JuniperSession`: SSH session to a Juniper ILA logged in to the EDFA shell once and
+        shared by both directions.
+
+        The commands are serialized on the shell channel with an asyncio lock. Sessions are obtained through
+        `open_session` and given back with `release`.
+
+        Args:
+            hostname: (str) hostname or IP address of the ILA
+            port: (int) SSH port
+            username: (str) SSH username
+            password: (str) SSH password
+            edfa_username: (str) username of the EDFA shell
+            edfa_password: (str) password of the EDFA shell
+            known_hosts: known hosts checked by asyncssh, None to accept any host key as `JuniperSession` does
+
+        Properties:
+            hostname: returns the hostname
+            prompt: returns the prompt of the EDFA shell learned at login, without the trailing space
+            connected: returns True once the EDFA login has been completed
+
+        Methods:
+            connect;
+            command;
+            commands;
+            release;
+            close.
+    """
+
+    def __init__(self, hostname, port, username, password, edfa_username, edfa_password, known_hosts=None):
+        self._hostname = hostname
+        self._port = port
+        self._username = username
+        self._password = password
+        self._edfa_username = edfa_username
+        self._edfa_password = edfa_password
+        self._known_hosts = known_hosts
+        self._connection = None
+        self._process = None
+        self._prompt = None
+        self._lock = asyncio.Lock()
+        self._users = 0
+        self._loop = None
+
+    @property
+    def hostname(self):
+        return self._hostname
+
+    @property
+    def prompt(self):
+        return self._prompt
+
+    @property
+    def connected(self):
+        return self._process is not None
+
+    async def _read(self, process, timeout=READ_TIMEOUT, prompt=PROMPT, on_pager=None, count=1):
+        """ Same as `read_buf`, on the asyncssh process of the shell."""
+        output = ShellOutput(prompt, count=count)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                logging.warning(f'Prompt not received within {timeout} s, returning the partial output')
+                break
+            try:
+                data = await asyncio.wait_for(process.stdout.read(BUF_SIZE), remaining)
+            except asyncio.TimeoutError:
+                continue
+            if not data:
+                logging.warning('Shell closed while reading the output')
+                break
+            event = output.feed(data)
+            if event == PAGER_REACHED:
+                process.stdin.write(on_pager(output.text) if on_pager is not None else PAGER_KEY)
+            elif event == PROMPT_REACHED:
+                break
+        return output.text
+
+    async def connect(self):
+        """ It opens the SSH session and logs in to the EDFA shell, unless it has been done already."""
+        async with self._lock:
+            if self.connected:
+                return
+            connection = await asyncssh.connect(self._hostname, port=self._port, username=self._username,
+                                                password=self._password, known_hosts=self._known_hosts)
+            try:
+                process = await connection.create_process(term_type="vt100", encoding="ascii", errors="replace")
+                await self._read(process)
+
+                process.stdin.write("login" + "\n" + self._edfa_username + "\n" + self._edfa_password + "\n")
+                out = await self._read(process)
+                if "Completed!" not in out:
+                    raise ConnectionError(f"EDFA shell not active on {self._hostname}")
+            except BaseException:
+                connection.close()
+                raise
+
+            print("EDFA login completed:", self._hostname)
+            self._connection, self._process = connection, process
+            self._prompt = out.rpartition('\n')[2].strip() or None
+
+    async def command(self, command: str, **kwargs) -> str:
+        """ It sends `command` and returns its output.
+
+        :param kwargs: passed to the reader, as for `read_buf`
+        """
+        async with self._lock:
+            if not self.connected:
+                raise ConnectionError(f"Session to {self._hostname} is closed")
+            if self._prompt is not None:
+                kwargs.setdefault("prompt", self._prompt)
+            self._process.stdin.write(command + "\n")
+            return await self._read(self._process, **kwargs)
+
+    async def commands(self, commands: list, **kwargs) -> str:
+        """ It sends all the `commands` at once and returns their output, collected together."""
+        if self._prompt is None or len(commands) < 2:
+            return "".join([await self.command(command, **kwargs) for command in commands])
+        async with self._lock:
+            if not self.connected:
+                raise ConnectionError(f"Session to {self._hostname} is closed")
+            self._process.stdin.write("".join(command + "\n" for command in commands))
+            return await self._read(self._process, prompt=self._prompt, count=len(commands), **kwargs)
+
+    async def release(self):
+        """ It gives the session back, closing it if no one else is using it."""
+        self._users -= 1
+        if self._users > 0:
+            return
+        sessions = _SESSIONS.get(self._loop, {})
+        key = self._hostname, self._port, self._username
+        if sessions.get(key) is self:
+            del sessions[key]
+        await self.close()
+
+    async def close(self):
+        async with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                await self._connection.wait_closed()
+            self._connection, self._process = None, None
+
+
+async def open_session(hostname, port, username, password, edfa_username, edfa_password,
+                       known_hosts=None) -> AsyncJuniperSession:
+    """ It returns the session shared by all the users of (`hostname`, `port`, `username`) in the running event loop,
+    logging in if needed. Each call must be paired with a `release` of the returned session.
+    """
+    loop = asyncio.get_running_loop()
+    sessions = _SESSIONS.setdefault(loop, {})
+    key = hostname, port, username
+    session = sessions.get(key)
+    if session is None:
+        session = AsyncJuniperSession(hostname, port, username, password, edfa_username, edfa_password, known_hosts)
+        session._loop = loop
+        sessions[key] = session
+    session._users += 1
+
+    try:
+        await session.connect()
+    except BaseException:
+        logging.error(f'Login to {hostname} failed')
+        await session.release()
+        raise
+    return session
+
+
+class AsyncJuniperIla:
+    """ Asyncio variant of `JuniperIla` with the same `get`/`set`/`close` contract, the methods being coroutines.
+
+        Nothing is sent in the constructor: the login is done by `connect`, or by the first `get` or `set`, so that
+        many ILAs can be brought up concurrently on one event loop.
+
+        Args:
+            same as `JuniperIla`, plus
+            known_hosts: known hosts checked by asyncssh, None (default) to accept any host key
+
+        Properties:
+            constants: returns the module of the Juniper constants
+            session: returns the `AsyncJuniperSession`, None before the login
+
+        Methods:
+            connect;
+            get_edfa_info;
+            get;
+            set;
+            close.
+    """
+
+    def __init__(self, **kwargs):
+        self._direction = edfa_direction(kwargs["direction"])
+        self._hostname = kwargs["hostname"]
+        self._port = kwargs.get("port", SSH_PORT)
+        self._username = kwargs["username"]
+        self._password = kwargs["password"]
+        self._edfa_username = kwargs["edfa_username"]
+        self._edfa_password = kwargs["edfa_password"]
+        self._known_hosts = kwargs.get("known_hosts")
+        self._session = None
+        self._constants = CONST
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    @property
+    def constants(self):
+        return self._constants
+
+    @property
+    def session(self):
+        return self._session
+
+    async def connect(self):
+        if self._session is None:
+            self._session = await open_session(self._hostname, self._port, self._username, self._password,
+                                               self._edfa_username, self._edfa_password, self._known_hosts)
+
+    async def close(self):
+        if self._session is not None:
+            session, self._session = self._session, None
+            await session.release()
+
+    async def get_edfa_info(self, labels=None, scope=None):
+        await self.connect()
+        out = await self._session.command("show edfa " + str(self._direction), on_pager=edfa_pager(labels, scope))
+        return edfa_scope(*parse_edfa(out), scope)
+
+    async def get(self, *args, scope=None):
+        labels, scope = get_labels(args, scope)
+        state, config = await self.get_edfa_info(labels, scope)
+        return get_values(args, state, config)
+
+    async def get_snapshot(self, uid: str = ""):
+        """ It returns the `core.snapshot.Snapshot` of the EDFA, read with a single `show edfa`."""
+        with SnapshotTimer() as timer:
+            data = await self.get(STATE_GAIN, STATE_TILT, STATE_INPUT_POWER, STATE_OUTPUT_POWER, CONFIG_MODE)
+        mode = data.get(CONFIG_MODE)
+        return timer.snapshot(uid, gain=value_of(data.get(STATE_GAIN)), tilt=value_of(data.get(STATE_TILT)),
+                              input_power=value_of(data.get(STATE_INPUT_POWER)),
+                              output_power=value_of(data.get(STATE_OUTPUT_POWER)),
+                              mode=None if mode is None else str(mode))
+
+    async def set(self, verify=False, **kwargs):
+        values = set_values(kwargs)
+        if not values:
+            return {} if verify else None
+
+        await self.connect()
+        name = f"{self._hostname} direction {self._direction}"
+        out = await self._session.commands(set_commands(self._direction, values))
+        if not verify:
+            check_set(name, values, out)
+            return None
+        read_back = await self.get(*values, scope=CONFIG_SCOPE)
+        check_set(name, values, out, read_back)
+        return read_back
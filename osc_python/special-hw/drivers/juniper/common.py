@@ -0,0 +1,148 @@
+"""
+Conversions and parsing of the Juniper ILA EDFA shell shared by the paramiko (`driver`) and asyncssh (`async_driver`)
+drivers, without any dependency on the SSH transport.
+"""
+import logging
+from drivers.juniper.utils import parse_edfa, PAGER_KEY, PAGER_QUIT
+from core.constants import *
+
+
+GET_CONV = {
+    STATE_GAIN: "GainValue",
+    STATE_TILT: "TiltValue",
+    STATE_INPUT_POWER: "InputTotalPower",
+    STATE_OUTPUT_POWER: "OutputTotalPower",
+    STATE_SERVICE: "State",
+    CONFIG_GAIN: "GainSetPoint",
+    CONFIG_TILT: "TiltSetPoint",
+    CONFIG_OUTPUT_ENABLED: "OutputEnable",
+    CONFIG_RANGE: "GainRange",
+    CONFIG_MODE: "Mode"
+}
+
+# the state section of `show edfa` is printed before the config one
+STATE_SCOPE = "state"
+CONFIG_SCOPE = "config"
+STATE_LABELS = frozenset(GET_CONV[key] for key in GET_CONV if key.startswith("STATE_"))
+
+# maximum difference between a numeric value set and the one read back
+SET_TOLERANCE = 0.05
+# words in the output of the set commands denoting a failure
+SET_ERRORS = ("error", "invalid", "fail")
+
+SET_CONV = {
+    CONFIG_GAIN: "gain",
+    CONFIG_RANGE: "gainrange",
+    CONFIG_OUTPUT_ENABLED: "output",
+    CONFIG_TILT: "tilt"
+}
+
+
+def edfa_direction(direction):
+    """ It returns the EDFA number, 1 or 2, of the direction "ab" or "ba" (or 1 or 2)."""
+    if isinstance(direction, str) and direction not in ["ab", "ba"]:
+        raise IOError("Direction must be ab or ba.")
+    elif isinstance(direction, str) and direction in ["ab", "ba"]:
+        if direction == "ab":
+            return 1
+        else:
+            return 2
+    elif isinstance(direction, int) and direction not in [1, 2]:
+        raise IOError("Direction must be 1 or 2.")
+    else:
+        return direction
+
+
+def edfa_pager(labels=None, scope=None):
+    """ It returns the pager callback quitting `show edfa` as soon as the requested `labels` (or the whole state
+    section when `scope` is "state") have been received, so that the remaining pages are not transferred."""
+    def on_pager(text):
+        states, configs = parse_edfa(text)
+        if labels:
+            received = all(label in states or label in configs for label in labels)
+        else:
+            # the config section has started, hence the state one is complete
+            received = scope == STATE_SCOPE and len(configs) > 0
+        return PAGER_QUIT if received else PAGER_KEY
+
+    return on_pager
+
+
+def edfa_scope(states, configs, scope=None):
+    """ It drops the section of the records not in `scope`."""
+    if scope == STATE_SCOPE:
+        configs = {}
+    elif scope == CONFIG_SCOPE:
+        states = {}
+    return states, configs
+
+
+def get_labels(args, scope=None):
+    """ It returns the `show edfa` labels of the `GET_CONV` keys in `args`, and the scope of the read."""
+    labels = [GET_CONV[arg] for arg in args]
+    if labels and scope is None and STATE_LABELS.issuperset(labels):
+        scope = STATE_SCOPE
+    return labels, scope
+
+
+def get_values(args, state, config):
+    """ It returns the values of the `GET_CONV` keys in `args` (all of them when `args` is empty)."""
+    if len(args) == 0:
+        inv_map = {v: k for k, v in GET_CONV.items()}
+        return {inv_map.get(key, key): value for key, value in (state | config).items()}
+    data = {}
+    for arg in args:
+        label = GET_CONV[arg]
+        if label in state.keys():
+            data[arg] = state[label]
+        if label in config.keys():
+            data[arg] = config[label]
+    return data
+
+
+def set_value(arg_key, value):
+    """ It returns the value as written on the CLI, e.g. `enable` for CONFIG_OUTPUT_ENABLED=True."""
+    if isinstance(value, bool):
+        if arg_key == CONFIG_OUTPUT_ENABLED:
+            return "enable" if value else "disable"
+        return str(value).lower()
+    return str(value)
+
+
+def set_values(kwargs):
+    """ It returns the values to write, skipping the None ones and the keys not in `SET_CONV`."""
+    values = {}
+    for arg_key, value in kwargs.items():
+        if value is None:
+            continue
+        command = SET_CONV.get(arg_key)
+        if command is None:
+            logging.warning(f"{arg_key} is not applicable")
+            continue
+        logging.info(f"Setting {arg_key} to {value}")
+        values[arg_key] = set_value(arg_key, value)
+    return values
+
+
+def set_commands(direction, values):
+    return ["edfa " + str(direction) + " " + SET_CONV[arg_key] + " " + value for arg_key, value in values.items()]
+
+
+def is_applied(requested: str, read) -> bool:
+    if isinstance(read, tuple):
+        try:
+            return abs(float(requested) - read[0]) < SET_TOLERANCE
+        except ValueError:
+            return False
+    return requested.lower() == str(read).lower()
+
+
+def check_set(name, values, out, read_back=None):
+    """ It logs the settings rejected by the CLI and, if read back, those not applied."""
+    if any(error in out.lower() for error in SET_ERRORS):
+        logging.warning(f"{name} rejected some settings: {out!r}")
+    if read_back is None:
+        return
+    for arg_key, value in values.items():
+        if arg_key not in read_back or not is_applied(value, read_back[arg_key]):
+            logging.warning(f"{name}: {arg_key} is {read_back.get(arg_key)} instead of {value}")
@@ -1,47 +1,18 @@
-from paramiko import SSHClient, AutoAddPolicy
-from drivers.juniper.utils import read_buf, split_string
+import logging
+from drivers.juniper.common import CONFIG_SCOPE, check_set, edfa_direction, edfa_pager, edfa_scope, get_labels, \
+    get_values, set_commands, set_values
+from drivers.juniper.session import open_session
+from drivers.juniper.utils import parse_edfa, parse_fields
 from core.constants import *
 import drivers.juniper.constants as CONST
-
-
-GET_CONV = {
-    STATE_GAIN: "GainValue",
-    STATE_TILT: "TiltValue",
-    STATE_INPUT_POWER: "InputTotalPower",
-    STATE_OUTPUT_POWER: "OutputTotalPower",
-    STATE_SERVICE: "State",
-    CONFIG_GAIN: "GainSetPoint",
-    CONFIG_TILT: "TiltSetPoint",
-    CONFIG_OUTPUT_ENABLED: "OutputEnable",
-    CONFIG_RANGE: "GainRange",
-    CONFIG_MODE: "Mode"
-}
-
-SET_CONV = {
-    CONFIG_GAIN: "gain",
-    CONFIG_RANGE: "gainrange",
-    CONFIG_OUTPUT_ENABLED: "output",
-    CONFIG_TILT: "tilt"
-}
+from core.snapshot import SnapshotTimer, value_of
 
 
 class JuniperIla:
     def __init__(self, **kwargs):
 
         self._constants = {}
-        direction = kwargs["direction"]
-
-        if isinstance(direction, str) and direction not in ["ab", "ba"]:
-            raise IOError("Direction must be ab or ba.")
-        elif isinstance(direction, str) and direction in ["ab", "ba"]:
-            if direction == "ab":
-                self._direction = 1
-            else:
-                self._direction = 2
-        elif isinstance(direction, int) and direction not in [1, 2]:
-            raise IOError("Direction must be 1 or 2.")
-        else:
-            self._direction = direction
+        self._direction = edfa_direction(kwargs["direction"])
 
         self._hostname = kwargs["hostname"]
         self._port = kwargs["port"]
@@ -50,9 +21,9 @@ class JuniperIla:
         self._edfa_username = kwargs["edfa_username"]
         self._edfa_password = kwargs["edfa_password"]
 
-        # LOGIN
-        self._ssh, self._shell = JuniperIla.ssh_connect(self._hostname, self._port, self._username, self._password)
-        self.edfa_login(self._shell, self._edfa_username, self._edfa_password)
+        # LOGIN, the session is shared with the other direction and the EVOA of the same ILA
+        self._session = open_session(self._hostname, self._port, self._username, self._password,
+                                     self._edfa_username, self._edfa_password)
 
         self._constants = CONST
 
@@ -60,94 +31,62 @@ class JuniperIla:
     def constants(self):
         return self._constants
 
-    @staticmethod
-    def ssh_connect(hostname, port, username, password):
-        # Create an SSH client
-        ssh = SSHClient()
-
-        # Automatically add the server's host key
-        ssh.set_missing_host_key_policy(AutoAddPolicy())
-
-        # Connect to the SSH server
-        ssh.connect(hostname=hostname, port=port, username=username, password=password)
-
-        shell = ssh.invoke_shell()
-
-        read_buf(shell, sleep_time=1)
-
-        return ssh, shell
+    @property
+    def session(self):
+        return self._session
 
     def ssh_close(self):
-        self._ssh.close()
-
-    def edfa_login(self, shell, edfa_user, edfa_password):
-        shell.send("login" + "\n")
-        shell.send(edfa_user + "\n")
-        shell.send(edfa_password + "\n")
-        out = read_buf(shell)
-
-        if "Completed!" not in out:
-            print("EDFA shell not active")
-            return -1
-
-        print("EDFA login completed:", self._hostname, "on direction:", self._direction)
-        return 0
-
-    def get_edfa_info(self):
-        self._shell.send("show edfa " + str(self._direction) + "\n")
-        out: str = read_buf(self._shell)[:-60] + "\n"
-        self._shell.send(" ")
-        out += read_buf(self._shell)[6:]
-        state = out.split("Edfa")[1]
-        config = out.split("Edfa")[2]
-
-        state = state.split('\n')
-        state = [el.split(':') for el in state]
-        state = [[e.replace("\r", "").replace(" ", "") for e in el] for el in state][1:-2]
-        states = {}
-        for el in state:
-            states[el[0]] = split_string(el[1])
-
-        config = config.split('\n')
-        config = [el.split(':') for el in config]
-        config = [[e.replace("\r", "").replace(" ", "") for e in el] for el in config][1:-4]
-        configs = {}
-        for el in config:
-            configs[el[0]] = split_string(el[1])
-        return states, configs
+        if self._session is not None:
+            self._session.release()
+            self._session = None
+
+    @staticmethod
+    def _sections(out: str, title: str):
+        """ It splits the output of a `show` command into the sections starting with `title`, dropping the command
+        echo, the title lines and the final prompt."""
+        out = out.rpartition('\n')[0]
+        return [section.partition('\n')[2] for section in out.split(title)[1:]]
+
+    def get_edfa_info(self, labels=None, scope=None):
+        """ It returns the state and config records of the EDFA.
+
+        :param labels: labels of `GET_CONV` needed by the caller, the output is not paged any further once they have
+        been received
+        :param scope: "state" to read the state section only, "config" or None for both
+        :return: tuple (states, configs)
+        """
+        out = self._session.command("show edfa " + str(self._direction), on_pager=edfa_pager(labels, scope))
+        return edfa_scope(*parse_edfa(out), scope)
 
     def close(self):
         self.ssh_close()
 
-    def get(self, *args):
-        state, config = self.get_edfa_info()
-        data = {}
-        if len(args) == 0:
-            inv_map = {v: k for k, v in GET_CONV.items()}
-            return {inv_map.get(key, key): value for key, value in (state | config).items()}
-        for arg in args:
-            label = GET_CONV[arg]
-            if label in state.keys():
-                data[arg] = state[label]
-            if label in config.keys():
-                data[arg] = config[label]
-        return data
+    def get(self, *args, scope=None):
+        """ It returns the values of the `GET_CONV` keys in `args`, fetched with a single `show edfa` that is not
+        paged further than needed. Without `args`, all the values of `scope` ("state", "config" or None for both).
+        """
+        labels, scope = get_labels(args, scope)
+        state, config = self.get_edfa_info(labels, scope)
+        return get_values(args, state, config)
+
+    def get_snapshot(self, uid: str = ""):
+        """ It returns the `core.snapshot.Snapshot` of the EDFA, read with a single `show edfa`."""
+        with SnapshotTimer() as timer:
+            data = self.get(STATE_GAIN, STATE_TILT, STATE_INPUT_POWER, STATE_OUTPUT_POWER, CONFIG_MODE)
+        mode = data.get(CONFIG_MODE)
+        return timer.snapshot(uid, gain=value_of(data.get(STATE_GAIN)), tilt=value_of(data.get(STATE_TILT)),
+                              input_power=value_of(data.get(STATE_INPUT_POWER)),
+                              output_power=value_of(data.get(STATE_OUTPUT_POWER)),
+                              mode=None if mode is None else str(mode))
 
     def get_voa_info(self):
         if self._direction == 1:
             direction = 2
         else:
             direction = 1
-        self._shell.send("show evoa " + str(direction) + "\n")
-        out: str = read_buf(self._shell)
-        state = out.split("Info")[1]
-        state = state.split('\n')
-        state = [el.split(':') for el in state]
-        state = [[e.replace("\r", "").replace(" ", "") for e in el] for el in state][1:-4]
-        states = {}
-        for el in state:
-            states[el[0]] = el[1]
-        print(states)
+        out = self._session.command("show evoa " + str(direction))
+        states = parse_fields(self._sections(out, "Info")[0])
+        logging.info(f"EVOA {direction} of {self._hostname}: {states}")
 
         return states
 
@@ -156,44 +95,48 @@ class JuniperIla:
             direction = 2
         else:
             direction = 1
-        self._shell.send("evoa " + str(direction) + " " + str(att) + "\n")
-        read_buf(self._shell)
+        self._session.command("evoa " + str(direction) + " " + str(att))
         self._status.att = att
 
     def set_gain(self, gain):
-        self._shell.send("edfa " + str(self._direction) + " gain " + str(gain) + "\n")
-        read_buf(self._shell)
+        self.set(CONFIG_GAIN=gain)
 
     def set_tilt(self, tilt):
-        self._shell.send("edfa " + str(self._direction) + " tilt " + str(tilt) + "\n")
-        read_buf(self._shell)
+        self.set(CONFIG_TILT=tilt)
 
     def set_gainrange(self, gainrange):
         if gainrange not in ["high", "low"]:
             print("Value must be high or low")
             raise IOError
-        self._shell.send("edfa " + str(self._direction) + " gainrange " + gainrange + "\n")
-        read_buf(self._shell)
+        self.set(CONFIG_RANGE=gainrange)
 
     def set_output_enable(self, is_output_enabled):
         if is_output_enabled not in ["disable", "enable"]:
             print("Value must be disable or enable")
             raise IOError
-        self._shell.send("edfa " + str(self._direction) + " gainrange " + is_output_enabled + "\n")
-        read_buf(self._shell)
-
-    def set(self, **kwargs):
-        for arg_key, value in kwargs.items():
-            print(f"Setting {arg_key} to {value}")
-
-            command = SET_CONV.get(arg_key)
-            if command is None:
-                print(f"Warning: {arg_key} is not applicable")
-                continue
-            value = str(value)
-            self._shell.send("edfa " + str(self._direction) + " " + command + " " + value + "\n")
-            read_buf(self._shell)
-
+        self.set(CONFIG_OUTPUT_ENABLED=is_output_enabled)
+
+    def set(self, verify=False, **kwargs):
+        """ It applies all the values in a single write, e.g. the `params` of a `line_config.json` element.
+
+        The keys with a None value are left unchanged. All the commands are sent at once and their output is collected
+        together, then the applied values are optionally read back with a single `show edfa`.
+
+        :param verify: (bool) read back the configuration and check the new values
+        :return: (dict) key -> value read back when `verify` is True, otherwise None
+        """
+        values = set_values(kwargs)
+        if not values:
+            return {} if verify else None
+
+        name = f"{self._hostname} direction {self._direction}"
+        out = self._session.commands(set_commands(self._direction, values))
+        if not verify:
+            check_set(name, values, out)
+            return None
+        read_back = self.get(*values, scope=CONFIG_SCOPE)
+        check_set(name, values, out, read_back)
+        return read_back
 
 if __name__ == "__main__":
     ila = \
@@ -210,7 +153,7 @@ if __name__ == "__main__":
     # print(ila.get_edfa_info())
     print(ila.get("STATE_GAIN"))
     # print(ila.get())
-    ila.set(["CONFIG_GAIN", "13"])
+    ila.set(CONFIG_GAIN=13, verify=True)
     print(ila.get("STATE_GAIN"))
     print(ila.get("CONFIG_GAIN"))
 
@@ -0,0 +1,172 @@
+import logging
+from threading import Lock, RLock
+from paramiko import SSHClient, AutoAddPolicy
+from drivers.juniper.utils import read_buf
+
+_SESSIONS = {}
+_SESSIONS_LOCK = Lock()
+
+
+class JuniperSession:
+    """ SSH session to a Juniper ILA, logged in to the EDFA shell once and shared by both directions and the EVOA.
+
+        The commands are serialized on the single shell channel, so that several `JuniperIla` objects of the same
+        hostname can use it from different threads. Sessions are obtained through `open_session` and given back with
+        `release`: the connection is closed when the last user releases it.
+
+        Args:
+            hostname: (str) hostname or IP address of the ILA
+            port: (int) SSH port
+            username: (str) SSH username
+            password: (str) SSH password
+            edfa_username: (str) username of the EDFA shell
+            edfa_password: (str) password of the EDFA shell
+
+        Properties:
+            hostname: returns the hostname
+            prompt: returns the prompt of the EDFA shell learned at login, without the trailing space
+            connected: returns True once the EDFA login has been completed
+
+        Methods:
+            connect;
+            command;
+            commands;
+            release;
+            close.
+    """
+
+    def __init__(self, hostname, port, username, password, edfa_username, edfa_password):
+        self._hostname = hostname
+        self._port = port
+        self._username = username
+        self._password = password
+        self._edfa_username = edfa_username
+        self._edfa_password = edfa_password
+        self._ssh = None
+        self._shell = None
+        self._prompt = None
+        self._lock = RLock()
+        self._users = 0
+
+    @property
+    def hostname(self):
+        return self._hostname
+
+    @property
+    def prompt(self):
+        return self._prompt
+
+    @property
+    def connected(self):
+        return self._shell is not None
+
+    @staticmethod
+    def ssh_connect(hostname, port, username, password):
+        # Create an SSH client
+        ssh = SSHClient()
+
+        # Automatically add the server's host key
+        ssh.set_missing_host_key_policy(AutoAddPolicy())
+
+        # Connect to the SSH server
+        ssh.connect(hostname=hostname, port=port, username=username, password=password)
+
+        shell = ssh.invoke_shell()
+
+        read_buf(shell)
+
+        return ssh, shell
+
+    def connect(self):
+        """ It opens the SSH session and logs in to the EDFA shell, unless it has been done already."""
+        with self._lock:
+            if self.connected:
+                return
+            ssh, shell = JuniperSession.ssh_connect(self._hostname, self._port, self._username, self._password)
+            shell.send("login" + "\n")
+            shell.send(self._edfa_username + "\n")
+            shell.send(self._edfa_password + "\n")
+            out = read_buf(shell)
+
+            if "Completed!" not in out:
+                ssh.close()
+                raise ConnectionError(f"EDFA shell not active on {self._hostname}")
+
+            print("EDFA login completed:", self._hostname)
+            self._ssh, self._shell = ssh, shell
+            self._prompt = out.rpartition('\n')[2].strip() or None
+
+    def command(self, command: str, **kwargs) -> str:
+        """ It sends `command` and returns its output, waiting for the commands of the other users to complete.
+
+        The output is read up to the prompt learned at login, so that a line of the output looking like a prompt,
+        e.g. `Usage : 45%`, does not end it.
+
+        :param kwargs: passed to `read_buf`
+        """
+        with self._lock:
+            if not self.connected:
+                raise ConnectionError(f"Session to {self._hostname} is closed")
+            if self._prompt is not None:
+                kwargs.setdefault("prompt", self._prompt)
+            self._shell.send(command + "\n")
+            return read_buf(self._shell, **kwargs)
+
+    def commands(self, commands: list, **kwargs) -> str:
+        """ It sends all the `commands` at once and returns their output, collected together.
+
+        The end of the output is detected by counting the prompts, hence the commands are sent one by one when the
+        prompt is not known.
+
+        :param kwargs: passed to `read_buf`
+        """
+        with self._lock:
+            if not self.connected:
+                raise ConnectionError(f"Session to {self._hostname} is closed")
+            if self._prompt is None or len(commands) < 2:
+                return "".join(self.command(command, **kwargs) for command in commands)
+            self._shell.send("".join(command + "\n" for command in commands))
+            return read_buf(self._shell, prompt=self._prompt, count=len(commands), **kwargs)
+
+    def release(self):
+        """ It gives the session back, closing it if no one else is using it."""
+        with _SESSIONS_LOCK:
+            self._users -= 1
+            if self._users > 0:
+                return
+            key = _session_key(self._hostname, self._port, self._username)
+            if _SESSIONS.get(key) is self:
+                del _SESSIONS[key]
+        self.close()
+
+    def close(self):
+        with self._lock:
+            if self._ssh is not None:
+                self._ssh.close()
+            self._ssh, self._shell = None, None
+
+
+def _session_key(hostname, port, username):
+    return hostname, port, username
+
+
+def open_session(hostname, port, username, password, edfa_username, edfa_password) -> JuniperSession:
+    """ It returns the session shared by all the users of (`hostname`, `port`, `username`), logging in if needed.
+    Each call must be paired with a `release` of the returned session.
+    """
+    key = _session_key(hostname, port, username)
+    with _SESSIONS_LOCK:
+        session = _SESSIONS.get(key)
+        if session is None:
+            session = JuniperSession(hostname, port, username, password, edfa_username, edfa_password)
+            _SESSIONS[key] = session
+        session._users += 1
+
+    # the login of a host does not hold up the sessions to the other hosts
+    try:
+        session.connect()
+    except Exception:
+        logging.error(f'Login to {hostname} failed')
+        session.release()
+        raise
+    return session
@@ -1,24 +1,216 @@
-from time import sleep
+import logging
+import re
+from select import select
+from time import monotonic
 
+READ_TIMEOUT = 10  # s
+BUF_SIZE = 9999
 
-def read_buf(shell, buf_size=9999, sleep_time=0.2):
-    while not shell.recv_ready():
-        sleep(sleep_time)
-    out = shell.recv(buf_size).decode('ascii')
-    return out
+# last line of the output ending with the usual prompt characters, e.g. `admin@ila> ` or `edfa# `, only used until
+# the actual prompt has been learned at login; the `key : value` lines of the outputs, e.g. `Usage : 45%`, are skipped
+PROMPT = re.compile(r'(?:^|\n)(?![^\r\n]*: )[^\r\n]*[>#$%] ?$')
+# pager marker printed when the output does not fit the terminal, e.g. `--More--` or `---(more 45%)---`
+PAGER = re.compile(r'-+ ?\(?more[^\r\n]*?\)? ?-+\s*$', re.IGNORECASE)
+PAGER_KEY = " "
+PAGER_QUIT = "q"
+ANSI_ESCAPE = re.compile(r'\x1b\[[0-9;?]*[A-Za-z]')
+BACKSPACE = re.compile(r'[^\x08\n]\x08')
+# the prompt and the pager are only searched for at the end of the output
+TAIL = 256
+# value of a `show edfa` field made of a number and a unit, e.g. `15.2dB` or `-3.1 dBm`
+VALUE_UNIT = re.compile(r'(-?\d+\.?\d*) *([a-zA-Z]+)$')
+NUMBER_UNIT = re.compile(r'(-?\d+\.?\d*)([a-zA-Z]+)')
+
+PROMPT_REACHED = "prompt"
+PAGER_REACHED = "pager"
+
+
+def literal_prompt(prompt: str):
+    """ It returns the regular expression matching the literal `prompt` at the start of the last line."""
+    return re.compile(r'(?:^|\n)\r*' + re.escape(prompt.strip()) + r'\s*$')
+
+
+def clean_output(text: str) -> str:
+    """ It removes the ANSI escape sequences and applies the backspaces used by the CLI to erase the pager."""
+    text = ANSI_ESCAPE.sub('', text)
+    if '\x08' in text:
+        erased = BACKSPACE.sub('', text)
+        while erased != text:
+            text = erased
+            erased = BACKSPACE.sub('', text)
+        text = text.replace('\x08', '')
+    return text
+
+
+class ShellOutput:
+    """ Accumulator of the output of a CLI command.
+
+        The received data is fed as it arrives; `feed` tells when the prompt closing the output or a pager marker
+        has been reached. The pager marker is removed from the accumulated text, so that the pages join seamlessly.
+        When the prompt is known literally, i.e. as learned at login, only a last line made of that prompt closes
+        the output, and the output of `count` commands sent at once can be collected together: it is complete once
+        the prompt has been printed `count` times.
+
+        Args:
+            prompt: (Pattern) regular expression matching the end of the output, or (str) the literal prompt
+            pager: (Pattern) regular expression matching the pager marker
+            count: (int) number of prompts closing the output, for a literal `prompt` only
+
+        Properties:
+            text: returns the output accumulated so far
+
+        Methods:
+            feed.
+    """
+
+    def __init__(self, prompt=PROMPT, pager=PAGER, count=1):
+        self._literal = None
+        if isinstance(prompt, str):
+            self._literal = prompt.strip()
+            prompt = literal_prompt(prompt)
+        self._prompt = prompt
+        self._pager = pager
+        self._count = count
+        self._text = ''
+
+    @property
+    def text(self):
+        return self._text
+
+    def feed(self, data: str):
+        """ It appends `data` to the output.
+
+        :return: PAGER_REACHED, PROMPT_REACHED, or None if more data is expected
+        """
+        self._text = clean_output(self._text + data)
+        offset = max(0, len(self._text) - TAIL)
+        match = self._pager.search(self._text, offset)
+        if match is not None:
+            self._text = self._text[:match.start()]
+            return PAGER_REACHED
+        if self._prompt.search(self._text, offset) is None:
+            return None
+        if self._literal is not None and self._text.count(self._literal) < self._count:
+            return None
+        return PROMPT_REACHED
+
+
+def read_buf(shell, timeout=READ_TIMEOUT, buf_size=BUF_SIZE, prompt=PROMPT, on_pager=None, count=1):
+    """ It reads the output of a command up to the CLI prompt, turning the pages automatically.
+
+    The reader waits on the channel with `select`, so that it returns as soon as the prompt is received.
+
+    :param shell: paramiko Channel returned by `invoke_shell`
+    :param timeout: (float) maximum time to wait for the prompt (s)
+    :param buf_size: (int) maximum number of bytes read at once
+    :param prompt: (Pattern) regular expression matching the end of the output, or (str) the literal prompt
+    :param on_pager: callable receiving the output so far and returning the key to send to the pager, by default
+    the space bar to get the next page
+    :param count: (int) number of commands whose output is read, for a literal `prompt` only
+    :return: (str) the output, the prompt included
+    """
+    output = ShellOutput(prompt, count=count)
+    deadline = monotonic() + timeout
+    while True:
+        if not shell.recv_ready():
+            if shell.closed or shell.eof_received:
+                logging.warning('Shell closed while reading the output')
+                break
+            remaining = deadline - monotonic()
+            if remaining <= 0:
+                logging.warning(f'Prompt not received within {timeout} s, returning the partial output')
+                break
+            select([shell], [], [], remaining)
+            continue
+        event = output.feed(shell.recv(buf_size).decode('ascii', errors='replace'))
+        if event == PAGER_REACHED:
+            shell.send(on_pager(output.text) if on_pager is not None else PAGER_KEY)
+        elif event == PROMPT_REACHED:
+            break
+    return output.text
+
+
+def parse_fields(section: str) -> dict:
+    """ It returns the `key: value` lines of a section of the output, without the spaces."""
+    fields = {}
+    for line in section.splitlines():
+        key, separator, value = line.partition(':')
+        key = key.replace(' ', '')
+        if separator and key:
+            fields[key] = value.replace(' ', '')
+    return fields
 
 
 def split_string(string):
     """
     Split a string of a number and a unit of measurement into a tuple of the number and the unit.
     """
-    import re
-    # split the string using regular expressions to match the number and the unit separately
-    num_unit_tuple = re.findall(r'(-?\d+\.?\d*)([a-zA-Z]+)', string)
-    if len(num_unit_tuple) == 0:
+    # match the number and the unit separately
+    match = NUMBER_UNIT.search(string)
+    if match is None:
         return string
-    # convert the first element of the tuple (the number) to a float if it contains a decimal, an integer otherwise
-    num = float(num_unit_tuple[0][0]) if '.' in num_unit_tuple[0][0] else int(num_unit_tuple[0][0])
-    unit = num_unit_tuple[0][1]
+    # convert the number to a float if it contains a decimal, an integer otherwise
+    number, unit = match.groups()
+    num = float(number) if '.' in number else int(number)
     return num, unit
 
+
+def parse_edfa(out: str):
+    """ It parses the output of `show edfa <direction>` in a single pass.
+
+    :param out: (str) output of the command, the command echo and the final prompt included
+    :return: tuple (states, configs) of dict label -> (number, unit), or the string for the values without a unit
+    """
+    sections = []
+    # the last line is the prompt
+    for line in out[:out.rfind('\n')].splitlines():
+        key, separator, value = line.partition(':')
+        value = value.strip()
+        # the title of each section, `Edfa <direction> ...`, starts a new record
+        if not value and key.lstrip().startswith('Edfa'):
+            sections.append({})
+            continue
+        if not separator or not sections:
+            continue
+        match = VALUE_UNIT.match(value)
+        if match is not None:
+            number, unit = match.groups()
+            value = (float(number) if '.' in number else int(number)), unit
+        else:
+            value = split_string(value.replace(' ', ''))
+        sections[-1][key.replace(' ', '')] = value
+    sections += [{}] * (2 - len(sections))
+    return sections[0], sections[1]
+
+
+if __name__ == "__main__":
+    from timeit import timeit
+
+    # micro-benchmark of the parser against the former split/replace parsing of `JuniperIla.get_edfa_info`
+    sample = ("show edfa 1\r\nEdfa 1 State\r\n"
+              "  GainValue        : 15.2dB\r\n  TiltValue        : -0.5dB\r\n"
+              "  InputTotalPower  : -3.1dBm\r\n  OutputTotalPower : 12.0dBm\r\n  State            : inService\r\n\r\n"
+              "Edfa 1 Config\r\n"
+              "  GainSetPoint     : 15.0dB\r\n  TiltSetPoint     : 0.0dB\r\n  OutputEnable     : enable\r\n"
+              "  GainRange        : low\r\n  Mode             : gain\r\n\r\n\r\n\r\nedfa> ")
+
+    def legacy_split_string(string):
+        num_unit_tuple = re.findall(r'(-?\d+\.?\d*)([a-zA-Z]+)', string)
+        if len(num_unit_tuple) == 0:
+            return string
+        num = float(num_unit_tuple[0][0]) if '.' in num_unit_tuple[0][0] else int(num_unit_tuple[0][0])
+        return num, num_unit_tuple[0][1]
+
+    def legacy_parse_edfa(out):
+        tables = []
+        for section, last in ((out.split("Edfa")[1], -2), (out.split("Edfa")[2], -4)):
+            section = [el.split(':') for el in section.split('\n')]
+            section = [[e.replace("\r", "").replace(" ", "") for e in el] for el in section][1:last]
+            tables.append({el[0]: legacy_split_string(el[1]) for el in section})
+        return tuple(tables)
+
+    assert parse_edfa(sample) == legacy_parse_edfa(sample)
+    n = 20000
+    legacy = timeit(lambda: legacy_parse_edfa(sample), number=n) / n
+    single_pass = timeit(lambda: parse_edfa(sample), number=n) / n
+    print(f"legacy: {legacy * 1e6:.1f} us, single pass: {single_pass * 1e6:.1f} us, speed-up: {legacy / single_pass:.1f}x")
@@ -0,0 +1,120 @@
+"""
+Simulated EDFA, answering `get`/`set` like the vendor drivers with a configurable latency and failure rate, so that
+the control loops and the poller can be run without any hardware.
+"""
+from random import Random
+from threading import Lock
+from time import sleep
+import core.constants as CONST
+from core.constants import CONFIG_GAIN, CONFIG_MODE, CONFIG_OUTPUT_ENABLED, CONFIG_POWER, CONFIG_RANGE, CONFIG_TILT, \
+    STATE_GAIN, STATE_INPUT_POWER, STATE_OUTPUT_POWER, STATE_SERVICE, STATE_TILT
+from core.snapshot import SnapshotTimer
+
+LATENCY = 0.05  # s, mean duration of a read
+JITTER = 0.02  # s, maximum deviation of the duration from LATENCY
+NOISE = 0.05  # dB, standard deviation of the measured values
+INPUT_POWER = -3.0  # dBm, mean total input power
+INPUT_DRIFT = 0.02  # dB, standard deviation of the input power random walk at each read
+
+
+class SimulatedEdfa:
+    """ Simulated EDFA: the input power drifts randomly and the output follows the gain or power set point.
+
+        Args (as keyword arguments, all optional):
+            hostname: (str) name of the simulated chassis
+            direction: (int) direction of the EDFA in the chassis
+            latency: (float) mean duration of each `get` or `set` (s)
+            jitter: (float) maximum deviation of the duration from `latency` (s)
+            failure_rate: (float) probability of a `get` raising TimeoutError
+            seed: seed of the random generator, for reproducible runs
+
+        Properties:
+            constants: returns the module of the constants
+            reads: returns the number of `get` served
+
+        Methods:
+            get;
+            get_snapshot;
+            set;
+            close.
+    """
+
+    def __init__(self, **kwargs):
+        self._hostname = kwargs.get("hostname", "simulated")
+        self._direction = kwargs.get("direction", 1)
+        self._latency = kwargs.get("latency", LATENCY)
+        self._jitter = kwargs.get("jitter", JITTER)
+        self._failure_rate = kwargs.get("failure_rate", 0.0)
+        self._random = Random(kwargs.get("seed", f"{self._hostname}/{self._direction}"))
+        self._lock = Lock()
+        self._reads = 0
+        self._input_power = INPUT_POWER
+        self._config = {
+            CONFIG_GAIN: 18.0,
+            CONFIG_TILT: 0.0,
+            CONFIG_OUTPUT_ENABLED: True,
+            CONFIG_RANGE: "low",
+            CONFIG_MODE: "gain",
+            CONFIG_POWER: 15.0
+        }
+        self._constants = CONST
+
+    @property
+    def constants(self):
+        return self._constants
+
+    @property
+    def reads(self):
+        return self._reads
+
+    def _wait(self):
+        sleep(max(0.0, self._latency + self._random.uniform(-self._jitter, self._jitter)))
+
+    def _state(self):
+        """ It returns the measured values, the input power having drifted since the last read."""
+        self._input_power += self._random.gauss(0.0, INPUT_DRIFT)
+        config = self._config
+        if not config[CONFIG_OUTPUT_ENABLED]:
+            gain = 0.0
+        elif config[CONFIG_MODE] == "power":
+            gain = config[CONFIG_POWER] - self._input_power
+        else:
+            gain = config[CONFIG_GAIN]
+        input_power = self._input_power + self._random.gauss(0.0, NOISE)
+        return {
+            STATE_GAIN: gain + self._random.gauss(0.0, NOISE),
+            STATE_TILT: config[CONFIG_TILT] + self._random.gauss(0.0, NOISE),
+            STATE_INPUT_POWER: input_power,
+            STATE_OUTPUT_POWER: input_power + gain,
+            STATE_SERVICE: "inService" if config[CONFIG_OUTPUT_ENABLED] else "outOfService"
+        }
+
+    def get(self, *args):
+        """ It returns the values of the `args` labels, e.g. STATE_GAIN, CONFIG_MODE.
+
+        :raise TimeoutError: the simulated read failed, with probability `failure_rate`
+        """
+        self._wait()
+        with self._lock:
+            self._reads += 1
+            if self._random.random() < self._failure_rate:
+                raise TimeoutError(f"Simulated timeout of {self._hostname} direction {self._direction}")
+            state = self._state()
+            return {arg: state[arg] if arg in state else self._config.get(arg) for arg in args}
+
+    def get_snapshot(self, uid: str = ""):
+        with SnapshotTimer() as timer:
+            data = self.get(STATE_GAIN, STATE_TILT, STATE_INPUT_POWER, STATE_OUTPUT_POWER, CONFIG_MODE)
+        return timer.snapshot(uid, gain=data[STATE_GAIN], tilt=data[STATE_TILT], input_power=data[STATE_INPUT_POWER],
+                              output_power=data[STATE_OUTPUT_POWER], mode=data[CONFIG_MODE])
+
+    def set(self, **kwargs):
+        unknown = set(kwargs) - set(self._config)
+        if unknown:
+            raise KeyError(f'Unknown configuration {sorted(unknown)}')
+        self._wait()
+        with self._lock:
+            self._config.update(kwargs)
+
+    def close(self):
+        pass
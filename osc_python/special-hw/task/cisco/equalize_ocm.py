@@ -0,0 +1,133 @@
+import json
+import logging
+from time import monotonic
+import numpy as np
+from drivers.cisco.driver import CiscoWSS
+from drivers.cisco.ocm import ChannelGrid
+
+MAX_ATTENUATION = 15.0  # dB
+ATTENUATION_STEP = 0.1  # dB, resolution of the WXC attenuators
+
+
+class NoSignalError(ValueError):
+    pass
+
+
+class SpectrumEqualizer:
+    """ Closed loop flattening the spectrum measured by the WSS OCM through the per-channel WXC attenuations.
+
+        At each iteration the OCM is read, the error of every measured channel with respect to the target profile
+        is computed, and only the attenuations whose quantized value changed are written.
+
+        Args:
+            wss: (CiscoWSS) the WSS whose OCM is read and whose attenuations are driven
+            grid: (ChannelGrid) channel plan
+            attenuations: current attenuation of each channel of `grid` (dB), e.g. `attenuation` of wxc.json
+            target: target power of each channel, or a single value for a flat profile (dBm)
+            relative: (bool) only the shape of the spectrum is equalized, i.e. the average error is not corrected
+            switch: (str) "MUX" or "DMX"
+            port: OCM port, "COM" by default
+            loop_gain: (float) fraction of the error corrected at each iteration
+            tolerance: (float) maximum error for the spectrum to be considered equalized (dB)
+            max_iterations: (int) iterations after which the loop gives up
+
+        Properties:
+            attenuations: returns the attenuations currently applied (dB)
+
+        Methods:
+            iterate;
+            run.
+    """
+
+    def __init__(self, wss: CiscoWSS, grid: ChannelGrid, attenuations, target=0.0, relative=True, switch="MUX",
+                 port="COM", loop_gain=0.8, tolerance=0.3, max_iterations=10):
+        self._wss = wss
+        self._grid = grid
+        self._attenuations = np.asarray(attenuations, dtype=float).copy()
+        self._target = np.full(grid.n_ch, target, dtype=float) if np.ndim(target) == 0 else np.asarray(target, float)
+        self._relative = relative
+        self._switch = switch
+        self._port = port
+        self._loop_gain = loop_gain
+        self._tolerance = tolerance
+        self._max_iterations = max_iterations
+
+    @property
+    def attenuations(self):
+        return self._attenuations
+
+    def error(self, powers):
+        """ It returns the error (dB) of each channel, NaN for the channels without signal.
+
+        :raise NoSignalError: no channel has a finite power, hence there is nothing to equalize
+        """
+        measured = np.isfinite(powers)
+        if not measured.any():
+            raise NoSignalError(f'No signal on the {self._switch} {self._port} OCM, the spectrum cannot be equalized')
+        error = np.where(measured, powers - self._target, np.nan)
+        if self._relative:
+            error = error - error[measured].mean()
+        return error
+
+    def iterate(self):
+        """ It runs a single iteration of the loop.
+
+        :return: (dict) maximum error before the correction (dB), number of changed attenuations and duration (s)
+        :raise NoSignalError: see `error`
+        """
+        start = monotonic()
+        _, powers = self._wss.get_channel_powers(self._grid, self._port, self._switch)
+        error = self.error(powers)
+        max_error = float(np.nanmax(np.abs(error)))
+
+        changed = {}
+        if max_error > self._tolerance:
+            correction = np.where(np.isfinite(error), self._loop_gain * error, 0.0)
+            steps = np.round((self._attenuations + correction) / ATTENUATION_STEP)
+            new_attenuations = np.clip(steps * ATTENUATION_STEP, 0.0, MAX_ATTENUATION)
+            for i in (new_attenuations != self._attenuations).nonzero()[0]:
+                # channels are numbered from 1 on the WXC
+                changed[int(i) + 1] = float(new_attenuations[i])
+            if changed:
+                self._wss.set_attenuations(changed, self._switch)
+            self._attenuations = new_attenuations
+
+        return {"max_error": max_error, "changed": len(changed), "elapsed": monotonic() - start}
+
+    def run(self):
+        """ It iterates until the spectrum is within `tolerance` of the target, nothing is left to change or
+        `max_iterations` is reached.
+
+        :return: (list of dict) the report of each iteration, with the time elapsed since the start in `converge_time`
+        :raise NoSignalError: see `error`, the attenuations being left as they are
+        """
+        start = monotonic()
+        reports = []
+        for iteration in range(self._max_iterations):
+            report = self.iterate()
+            report["iteration"] = iteration
+            report["converge_time"] = monotonic() - start
+            reports.append(report)
+            logging.info(f'Iteration {iteration}: max error {report["max_error"]:.2f} dB, '
+                         f'{report["changed"]} attenuations changed in {report["elapsed"]:.2f} s')
+            if report["max_error"] <= self._tolerance or report["changed"] == 0:
+                break
+        else:
+            logging.warning(f'Spectrum not equalized within {self._tolerance} dB after {self._max_iterations} iterations')
+        return reports
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+
+    with open("../../resources/configuration/default/wxc.json", "r") as channel_info_file:
+        channel_info = json.load(channel_info_file)
+
+    with open("../../resources/ML/wxc.json", "r") as wxc_file:
+        wxc_info = json.load(wxc_file)
+
+    wss = CiscoWSS(**wxc_info["mux"])
+    equalizer = SpectrumEqualizer(wss, ChannelGrid.from_config(channel_info), channel_info["attenuation"])
+    for iteration_report in equalizer.run():
+        print(iteration_report)
+    print(list(equalizer.attenuations))
@@ -3,12 +3,12 @@ import asyncio
 
 import json
 from drivers.cisco.driver import CiscoEDFA35, CiscoWSS
+from drivers.cisco.ocm import ChannelGrid
 from pandas import read_csv
 from numpy import array, reshape, sum
 from time import time, sleep
 import numpy as np
 from task.osa.osa_switch import OsaSwitch
-from osi.tool.conversions import dBm2lin, lin2dBm
 
 with open("../../resources/ML/amplifiers.json", "r") as amp_file:
     amps = json.load(amp_file)
@@ -22,6 +22,7 @@ with open("../../resources/ML/wxc.json", "r") as wxc_file:
 with open("../../resources/ML/ML_variable_spectrum_configurations.csv") as conf_file:
     confs = read_csv(conf_file)
 
+grid = ChannelGrid.from_config(channel_info)
 channel_info["freq_step"] = channel_info["freq_step"] / 1e3
 
 wss = CiscoWSS(**wxc_info["mux"])
@@ -44,8 +45,8 @@ print(len(ocm_dmx), len(ocm_mux))
 # boh
 
 
-ocm_mux = lin2dBm(sum(reshape(dBm2lin(ocm_mux), [96, 8]), 1))
-ocm_dmx = lin2dBm(sum(reshape(dBm2lin(ocm_dmx), [96, 8]), 1))
+ocm_mux = grid.channel_powers(ocm_mux)
+ocm_dmx = grid.channel_powers(ocm_dmx)
 
 plt.plot(ocm_mux, label='MUX')
 print(ocm_mux)
@@ -0,0 +1,7 @@
+import sys
+from pathlib import Path
+
+# the packages of the project (core, drivers, tools, ...) are imported from its root
+ROOT = Path(__file__).parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
@@ -0,0 +1,139 @@
+import asyncio
+import re
+import socketserver
+import threading
+import time
+from json import load
+import pytest
+from core.constants import CONFIGURATION
+from core.snapshot import MODE_GAIN
+import drivers.cisco.driver as cisco
+from drivers.cisco.driver import CiscoEDFA17, CiscoEDFA35, CiscoWSS, channel_plan
+from drivers.cisco.omi_interfaces import AsyncAmplifierOmiInterface
+from drivers.cisco.params import AmplifierInterfaceParams
+from drivers.cisco.utils import parse_i32
+
+# register -> I32 value of the fake EDFA17 and EDFA35 (direction 1) cards
+REGISTERS = {(30, 1, 0): 153, (33, 1, 0): -12, (41, 1, 0): -50, (42, 1, 0): 103, (27, 1, 0): 201, (28, 1, 0): 5,
+             (29, 1, 0): 30, (24, 1, 0): 2500, (24, 2, 0): 3000, (21, 1, 1, 1, 0): 2}
+OMI_READ = re.compile(r'omi_read\((.*)\)')
+OMI_WRITE = re.compile(r'omi_write\((\d+),(\d+),\d+,\d+,(-?\d+)\)')
+
+
+class FakeCard(socketserver.StreamRequestHandler):
+    """ OMI card: the login, then the `omi_read` replies, each command being terminated by `\\r`. The `omi_write`s
+    are stored, as (register, channel, 0), and read back.
+    """
+
+    def commands(self):
+        buffer = b''
+        while True:
+            data = self.request.recv(4096)
+            if not data:
+                return
+            buffer += data
+            *lines, buffer = buffer.split(b'\r')
+            yield from (line.decode().strip() for line in lines)
+
+    def handle(self):
+        self.request.sendall(b'Login:')
+        commands = self.commands()
+        next(commands), next(commands)
+        self.request.sendall(b'welcome\n\r->')
+        self.server.reads = []
+        self.server.writes = []
+        registers = dict(REGISTERS)
+        for command in commands:
+            match = OMI_READ.match(command)
+            if match is None:
+                write = OMI_WRITE.match(command)
+                if write is not None:
+                    register, channel, value = (int(field) for field in write.groups())
+                    self.server.writes.append((register, channel, value))
+                    registers[register, channel, 0] = value
+                self.request.sendall(f'{command}\n\rCompleted\n\r->'.encode())
+                continue
+            register = tuple(int(field) for field in match.group(1).split(','))
+            self.server.reads.append(register)
+            self.request.sendall(f'{command}\n\rI32-Value is:{registers.get(register, 0)}\n\rCompleted\n\r->'.encode())
+            self.trailer()
+
+    def trailer(self):
+        pass
+
+
+class LateTrailerCard(FakeCard):
+    """ OMI card sending the end of each reply, a second `Completed` included, once the reply has been read."""
+
+    def trailer(self):
+        time.sleep(0.02)
+        self.request.sendall(b'\n\rCompleted\n\r->')
+
+
+def serve(handler):
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+@pytest.fixture
+def card():
+    server = serve(FakeCard)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def credentials(card):
+    return {"ip_address": "127.0.0.1", "port": card.server_address[1], "username": "user", "password": "pass",
+            "protocol": "omi", "timeout": 2}
+
+
+def test_edfa17_snapshot(card):
+    edfa = CiscoEDFA17(**credentials(card))
+    snapshot = edfa.get_snapshot("edfa17")
+    assert (snapshot.uid, snapshot.gain, snapshot.tilt) == ("edfa17", 15.3, -1.2)
+    assert (snapshot.input_power, snapshot.output_power, snapshot.mode) == (-5.0, 10.3, MODE_GAIN)
+    assert card.reads == [(30, 1, 0), (33, 1, 0), (41, 1, 0), (42, 1, 0), (21, 1, 1, 1, 0)]
+
+
+def test_edfa35_snapshot_mode(card):
+    edfa = CiscoEDFA35(direction=1, **credentials(card))
+    snapshot = edfa.get_snapshot("edfa35")
+    assert (snapshot.gain, snapshot.mode) == (20.1, MODE_GAIN)
+    edfa.close()
+
+
+def test_provision_the_shipped_channel_plan(card, monkeypatch):
+    monkeypatch.setattr(cisco, "WXC_SETTLE_TIME", 0.0)
+    with open(CONFIGURATION / "wxc.json") as file:
+        plan = channel_plan(load(file))
+    # the 96th channel, at 196.15 THz, is beyond the WXC range
+    assert len(plan) == 95
+    assert plan[-1]["freq"] == pytest.approx(196.1)
+    wss = CiscoWSS(switch="MUX", **credentials(card))
+    assert wss.provision_channels(plan) == {}
+    assert card.writes[:95] == [(82, channel, 0) for channel in range(1, 96)]
+    assert card.writes[-95:] == [(82, channel, 1) for channel in range(1, 96)]
+    assert (34, 95, 31376) in card.writes
+
+
+def test_async_replies_stay_in_sync_after_a_late_trailer():
+    server = serve(LateTrailerCard)
+
+    async def read_twice():
+        params = AmplifierInterfaceParams("127.0.0.1", server.server_address[1], "user", "pass", "omi")
+        async with AsyncAmplifierOmiInterface(params, timeout=2) as card:
+            gain = await card._omi_read(4096, 30, 1, 0)
+            await asyncio.sleep(0.1)
+            tilt = await card._omi_read(4096, 33, 1, 0)
+            return parse_i32(gain), parse_i32(tilt), card.discarded_bytes
+
+    try:
+        gain, tilt, discarded = asyncio.run(read_twice())
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert (gain, tilt) == (153, -12)
+    assert discarded >= len(b'\n\rCompleted\n\r->')
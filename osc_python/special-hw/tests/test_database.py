@@ -0,0 +1,123 @@
+from threading import Event, Thread
+import numpy as np
+import pytest
+from tools.database import BufferedWriter, Database
+
+mongomock = pytest.importorskip("mongomock")
+
+
+@pytest.fixture
+def db():
+    return mongomock.MongoClient().db
+
+
+def test_numpy_values_are_written(db):
+    with BufferedWriter(db, flush_interval=60.0) as writer:
+        _id = writer.insert("amplifier", {"gain": np.float32(15.5), "spectrum": np.arange(3.0)})
+        writer.flush()
+        assert writer.written == 1
+    document = db.amplifier.find_one({"_id": _id})
+    assert document["gain"] == 15.5
+    assert document["spectrum"] == [0.0, 1.0, 2.0]
+
+
+def test_invalid_batch_is_counted_as_failed(db):
+    writer = BufferedWriter(db, flush_interval=60.0)
+    writer.insert("amplifier", {"value": object()})
+    writer.flush()
+    assert (writer.failed, writer.written, writer.pending) == (1, 0, 0)
+    writer.insert("amplifier", {"value": 1})
+    writer.flush()
+    assert writer.written == 1
+    writer.insert("amplifier", {"value": 2})
+    writer.close()
+    assert writer.written == 2
+    assert sorted(document["value"] for document in db.amplifier.find()) == [1, 2]
+    with pytest.raises(RuntimeError):
+        writer.insert("amplifier", {"value": 3})
+
+
+def test_background_failure_does_not_stop_the_writer(db):
+    # every insert triggers a write by the background thread, and the third one waits for it
+    writer = BufferedWriter(db, batch_size=1, flush_interval=60.0, max_pending=2)
+    writer.insert("amplifier", {"value": object()})
+
+    def insert():
+        for value in range(10):
+            writer.insert("amplifier", {"value": value})
+        writer.flush()
+
+    thread = Thread(target=insert, daemon=True)
+    thread.start()
+    thread.join(5.0)
+    assert not thread.is_alive()
+    writer.close()
+    assert (writer.failed, writer.written) == (1, 10)
+    assert db.amplifier.count_documents({}) == 10
+
+
+def legacy_logger(client):
+    # documents saved before the path index, without the normalized fields
+    client.test.logger.insert_many([{"path": "/OLC/line1/amp2"}, {"path": "/olc/line2/amp1"}])
+    database = Database(client=client, db_name="test")
+    database.save_path({"path": "/olc/line1/ocm"})
+    return database
+
+
+def wait_backfill(database):
+    thread = database._path_index_thread
+    if thread is not None:
+        thread.join(5.0)
+
+
+def found(database, sub_path, **kwargs):
+    return sorted(document["path"] for document in database.find_path(sub_path, **kwargs))
+
+
+def test_find_path_builds_the_index():
+    database = legacy_logger(mongomock.MongoClient())
+    assert found(database, "LINE1") == ["/OLC/line1/amp2", "/olc/line1/ocm"]
+    wait_backfill(database)
+    assert database.start_path_index().is_set()
+    assert "path_tokens_1" in database._db.logger.index_information()
+    assert database._db.logger.count_documents({"path_lower": {"$exists": False}}) == 0
+    assert found(database, "LINE1") == ["/OLC/line1/amp2", "/olc/line1/ocm"]
+    assert found(database, "line2/amp") == ["/olc/line2/amp1"]
+    assert found(database, "olc", skip=1, limit=1) == ["/olc/line2/amp1"]
+
+
+@pytest.mark.parametrize("sub_path, paths", [
+    ("ine1", ["/OLC/line1/amp2", "/olc/line1/ocm"]),
+    ("ine1/AMP", ["/OLC/line1/amp2"]),
+    ("/line1/", ["/OLC/line1/amp2", "/olc/line1/ocm"]),
+    ("c/line", ["/OLC/line1/amp2", "/olc/line1/ocm", "/olc/line2/amp1"]),
+    ("line1/amp2/x", []),
+    ("/", ["/OLC/line1/amp2", "/olc/line1/ocm", "/olc/line2/amp1"]),
+])
+def test_find_path_does_not_depend_on_the_index(monkeypatch, sub_path, paths):
+    release = Event()
+    backfill = Database.backfill_path_index
+
+    def slow_backfill(self, *args, **kwargs):
+        release.wait(5.0)
+        return backfill(self, *args, **kwargs)
+
+    monkeypatch.setattr(Database, "backfill_path_index", slow_backfill)
+    database = legacy_logger(mongomock.MongoClient())
+    # substrings of the path, as the former regex scan, before and after the backfill
+    assert found(database, sub_path) == paths
+    release.set()
+    wait_backfill(database)
+    assert database._db.logger.count_documents({"path_lower": {"$exists": False}}) == 0
+    assert found(database, sub_path) == paths
+
+
+def test_documents_written_later_are_found_and_backfilled():
+    database = legacy_logger(mongomock.MongoClient())
+    found(database, "line1")
+    wait_backfill(database)
+    # written by another program, without the path fields
+    database._db.logger.insert_one({"path": "/olc/LINE3/amp1"})
+    assert found(database, "line3/amp") == ["/olc/LINE3/amp1"]
+    wait_backfill(database)
+    assert database._db.logger.find_one({"path": "/olc/LINE3/amp1"})["path_tokens"] == ["olc", "line3", "amp1"]
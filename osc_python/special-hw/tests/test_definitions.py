@@ -0,0 +1,49 @@
+import pytest
+from core.definitions import DRIVER_DICT, DriverDict, DriverRegistry
+
+
+def registry(monkeypatch, scans):
+    registry = DriverRegistry({"amplifier": {"edfa": {"test": "core.snapshot:Snapshot"}}})
+
+    def load_entry_points():
+        scans.append(True)
+        raise RuntimeError("broken plugin")
+
+    monkeypatch.setattr(registry, "_load_entry_points", load_entry_points)
+    return registry
+
+
+def test_built_in_drivers_do_not_scan_entry_points(monkeypatch):
+    scans = []
+    drivers = registry(monkeypatch, scans)
+    assert ("amplifier", "edfa", "test") in drivers
+    assert drivers.resolve("amplifier", "edfa", "test").__name__ == "Snapshot"
+    assert not scans
+
+
+def test_unknown_drivers_scan_entry_points(monkeypatch):
+    scans = []
+    drivers = registry(monkeypatch, scans)
+    with pytest.raises(RuntimeError):
+        drivers.resolve("amplifier", "edfa", "plugin")
+    assert scans
+
+
+def test_unknown_driver():
+    drivers = DriverRegistry({}, entry_point_group=None)
+    assert ("amplifier", "edfa", "missing") not in drivers
+    with pytest.raises(KeyError):
+        drivers.resolve("amplifier", "edfa", "missing")
+
+
+def test_driver_dict(monkeypatch):
+    scans = []
+    drivers = DriverDict(registry(monkeypatch, scans))
+    assert drivers["amplifier"]["edfa"]["test"].__name__ == "Snapshot"
+    assert "test" in drivers["amplifier"]["edfa"]
+    assert not scans
+    assert list(DRIVER_DICT["amplifier"]["edfa"]) == ["juniper", "cisco35", "cisco17", "simulated"]
+    assert DRIVER_DICT["amplifier"]["edfa"]["simulated"].__name__ == "SimulatedEdfa"
+    assert "missing" not in DRIVER_DICT
+    with pytest.raises(KeyError):
+        DRIVER_DICT["amplifier"]["edfa"]["missing"]
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+from drivers.cisco.ocm import ChannelGrid
+from task.cisco.equalize_ocm import ATTENUATION_STEP, NoSignalError, SpectrumEqualizer
+
+N_CH = 8
+GRID = ChannelGrid(191.4 + 0.05 * np.arange(N_CH), 50)
+
+
+class FakeWss:
+    """ WSS whose channel powers are the launch powers minus the attenuations applied."""
+
+    def __init__(self, launch, attenuations):
+        self.launch = np.asarray(launch, dtype=float)
+        self.attenuations = np.asarray(attenuations, dtype=float).copy()
+        self.writes = []
+
+    def get_channel_powers(self, grid, port="COM", switch="MUX"):
+        return grid.frequencies, self.launch - self.attenuations
+
+    def set_attenuations(self, attenuations: dict, switch="MUX"):
+        self.writes.append(dict(attenuations))
+        for channel, value in attenuations.items():
+            self.attenuations[channel - 1] = value
+
+
+def test_synthetic_spectrum_converges():
+    launch = np.array([0.0, 1.5, -1.0, 2.0, 0.5, -0.5, 1.0, 3.0])
+    wss = FakeWss(launch, np.full(N_CH, 5.0))
+    equalizer = SpectrumEqualizer(wss, GRID, wss.attenuations, tolerance=0.2)
+    reports = equalizer.run()
+    assert reports[-1]["max_error"] <= 0.2
+    assert len(reports) < 10
+    assert [report["iteration"] for report in reports] == list(range(len(reports)))
+    powers = launch - wss.attenuations
+    assert np.ptp(powers) <= 2 * 0.2 + ATTENUATION_STEP
+    assert np.allclose(equalizer.attenuations, wss.attenuations)
+    # only the changed attenuations are written
+    assert all(0 < len(write) <= N_CH for write in wss.writes)
+
+
+def test_no_signal_is_not_taken_for_convergence():
+    wss = FakeWss(np.full(N_CH, np.nan), np.full(N_CH, 5.0))
+    equalizer = SpectrumEqualizer(wss, GRID, wss.attenuations)
+    with pytest.raises(NoSignalError):
+        equalizer.run()
+    wss.launch = np.full(N_CH, -np.inf)
+    with pytest.raises(NoSignalError):
+        equalizer.iterate()
+    assert not wss.writes
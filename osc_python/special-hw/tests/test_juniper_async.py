@@ -0,0 +1,139 @@
+import asyncio
+import subprocess
+import sys
+import pytest
+
+asyncssh = pytest.importorskip("asyncssh")
+
+from conftest import ROOT
+from core.constants import CONFIG_GAIN, CONFIG_TILT, STATE_GAIN, STATE_SERVICE
+from drivers.juniper.async_driver import AsyncJuniperIla
+
+PROMPT = "edfa> "
+CREDENTIALS = {"hostname": "127.0.0.1", "username": "admin", "password": "secret", "edfa_username": "edfa",
+               "edfa_password": "edfa123"}
+
+
+class FakeIlaServer(asyncssh.SSHServer):
+    def begin_auth(self, username):
+        return True
+
+    def password_auth_supported(self):
+        return True
+
+    def validate_password(self, username, password):
+        return (username, password) == (CREDENTIALS["username"], CREDENTIALS["password"])
+
+
+async def ila_shell(process):
+    """ EDFA shell of the fake ILA: `login`, `show edfa` on two pages, `show evoa` and the `edfa` set commands."""
+    config = {"gain": "15.0dB", "tilt": "0.0dB", "output": "enable", "gainrange": "low"}
+
+    def config_page():
+        return (f"Edfa 1 Config\r\n  GainSetPoint     : {config['gain']}\r\n  TiltSetPoint     : {config['tilt']}\r\n"
+                f"  OutputEnable     : {config['output']}\r\n  GainRange        : {config['gainrange']}\r\n"
+                f"  Mode             : gain\r\n\r\n{PROMPT}")
+
+    process.stdout.write("Welcome\r\n" + PROMPT)
+    buffer = ""
+    login = []
+    while True:
+        data = await process.stdin.read(1000)
+        if not data:
+            break
+        buffer += data.replace("\r", "\n")
+        while buffer:
+            if buffer[0] in " q":
+                key, buffer = buffer[0], buffer[1:]
+                process.stdout.write(config_page() if key == " " else "\r\n" + PROMPT)
+                continue
+            if "\n" not in buffer:
+                break
+            line, buffer = buffer.split("\n", 1)
+            if not line:
+                continue
+            if line == "login" or login:
+                login.append(line)
+                if len(login) == 3:
+                    ok = login[1:] == [CREDENTIALS["edfa_username"], CREDENTIALS["edfa_password"]]
+                    process.stdout.write(("Completed!\r\n" if ok else "Denied\r\n") + PROMPT)
+                    login = []
+            elif line.startswith("show edfa"):
+                # the state page is cut by the pager
+                process.stdout.write(line + "\r\nEdfa 1 State\r\n  GainValue        : 15.2dB\r\n"
+                                     "  State            : inService\r\n\r\n--More--")
+            elif line.startswith("show evoa"):
+                # the first chunk ends with a line looking like a prompt
+                process.stdout.write(line + "\r\nEvoa 1 Info\r\n  Usage            : 45%")
+                await asyncio.sleep(0.05)
+                process.stdout.write("\r\n  Attenuation      : 3.0dB\r\n\r\n" + PROMPT)
+            elif line.startswith("edfa"):
+                _, _, key, value = line.split()
+                config[key] = value + ("dB" if key in ("gain", "tilt") else "")
+                process.stdout.write(line + "\r\nOK\r\n" + PROMPT)
+
+
+async def start_server():
+    server = await asyncssh.create_server(FakeIlaServer, "127.0.0.1", 0, process_factory=ila_shell,
+                                          server_host_keys=[asyncssh.generate_private_key("ssh-ed25519")],
+                                          line_editor=False)
+    return server, server.sockets[0].getsockname()[1]
+
+
+def test_async_driver_does_not_need_paramiko():
+    # paramiko made unimportable in a fresh interpreter
+    code = "import sys; sys.modules['paramiko'] = None; import drivers.juniper.async_driver"
+    subprocess.run([sys.executable, "-c", code], cwd=ROOT, check=True)
+
+
+def test_get_and_set():
+    async def scenario():
+        server, port = await start_server()
+        try:
+            async with AsyncJuniperIla(port=port, direction="ab", **CREDENTIALS) as ila:
+                assert await ila.get(STATE_GAIN, STATE_SERVICE) == {STATE_GAIN: (15.2, "dB"),
+                                                                    STATE_SERVICE: "inService"}
+                assert await ila.get(CONFIG_GAIN) == {CONFIG_GAIN: (15.0, "dB")}
+                read_back = await ila.set(verify=True, CONFIG_GAIN=13.5, CONFIG_TILT=-1.0)
+                assert read_back == {CONFIG_GAIN: (13.5, "dB"), CONFIG_TILT: (-1.0, "dB")}
+                out = await ila.session.command("show evoa 1")
+                assert out.endswith("Attenuation      : 3.0dB\r\n\r\n" + PROMPT)
+        finally:
+            server.close()
+
+    asyncio.run(scenario())
+
+
+def test_directions_share_a_session():
+    async def scenario():
+        server, port = await start_server()
+        try:
+            ab = AsyncJuniperIla(port=port, direction="ab", **CREDENTIALS)
+            ba = AsyncJuniperIla(port=port, direction="ba", **CREDENTIALS)
+            await asyncio.gather(ab.connect(), ba.connect())
+            assert ab.session is ba.session
+            await ab.close()
+            assert ba.session.connected
+            await ba.close()
+        finally:
+            server.close()
+
+    asyncio.run(scenario())
+
+
+def test_sessions_are_not_shared_across_event_loops():
+    sessions = []
+
+    async def scenario():
+        server, port = await start_server()
+        try:
+            # the ILA is not closed: its session stays cached with the loop
+            ila = AsyncJuniperIla(port=port, direction="ab", **CREDENTIALS)
+            assert await ila.get(STATE_GAIN) == {STATE_GAIN: (15.2, "dB")}
+            sessions.append(ila.session)
+        finally:
+            server.close()
+
+    asyncio.run(scenario())
+    asyncio.run(scenario())
+    assert sessions[0] is not sessions[1]
@@ -0,0 +1,55 @@
+from drivers.juniper.utils import PAGER_REACHED, PROMPT, PROMPT_REACHED, ShellOutput, parse_edfa, read_buf
+
+EVOA = ("show evoa 1\r\nEvoa 1 Info\r\n  Usage            : 45%",
+        "\r\n  Attenuation      : 3.0dB\r\n\r\nedfa> ")
+
+
+class FakeChannel:
+    """ paramiko Channel sending the chunks of a reply, one per `recv`."""
+
+    def __init__(self, chunks):
+        self.chunks = [chunk.encode('ascii') for chunk in chunks]
+        self.sent = []
+        self.closed = False
+        self.eof_received = False
+
+    def recv_ready(self):
+        return bool(self.chunks)
+
+    def recv(self, size):
+        return self.chunks.pop(0)
+
+    def send(self, data):
+        self.sent.append(data)
+
+
+def test_generic_prompt_skips_value_lines():
+    assert PROMPT.search("show evoa 1\r\n  Usage            : 45%") is None
+    assert PROMPT.search("show evoa 1\r\n  Usage : 45%\r\nedfa> ") is not None
+
+
+def test_literal_prompt_is_not_ended_by_a_percent_line():
+    output = ShellOutput("edfa> ")
+    assert output.feed(EVOA[0]) is None
+    assert output.feed(EVOA[1]) == PROMPT_REACHED
+
+
+def test_read_buf_reads_up_to_the_learned_prompt():
+    channel = FakeChannel(EVOA)
+    out = read_buf(channel, timeout=1, prompt="edfa>")
+    assert out.endswith("Attenuation      : 3.0dB\r\n\r\nedfa> ")
+    assert not channel.chunks
+
+
+def test_batched_commands_wait_for_every_prompt():
+    output = ShellOutput("edfa>", count=2)
+    assert output.feed("edfa 1 gain 15\r\nedfa> ") is None
+    assert output.feed("edfa 1 tilt 0\r\nedfa> ") == PROMPT_REACHED
+
+
+def test_pager_is_removed():
+    output = ShellOutput("edfa>")
+    assert output.feed("Edfa 1 State\r\n  GainValue : 15.2dB\r\n--More--") == PAGER_REACHED
+    assert output.feed("\r\n  TiltValue : -0.5dB\r\nedfa> ") == PROMPT_REACHED
+    states, _ = parse_edfa("show edfa 1\r\n" + output.text)
+    assert states == {"GainValue": (15.2, "dB"), "TiltValue": (-0.5, "dB")}
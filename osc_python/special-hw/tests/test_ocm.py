@@ -0,0 +1,35 @@
+from numpy import full, isneginf, log10, nonzero
+from numpy.testing import assert_allclose
+from core.constants import CONFIGURATION
+from drivers.cisco.ocm import OCM_SLICES, ChannelGrid, _slice_weights
+
+
+def default_grid():
+    return ChannelGrid.from_file(CONFIGURATION / "wxc.json")
+
+
+def test_default_grid_slice_mapping():
+    grid = default_grid()
+    weights = _slice_weights(*grid._key())
+    assert weights.shape == (96, OCM_SLICES)
+    for channel in range(95):
+        assert list(nonzero(weights[channel])[0]) == list(range(8 * channel + 4, 8 * channel + 12))
+    # the band of the last channel ends beyond the last slice
+    assert list(nonzero(weights[95])[0]) == [764, 765, 766, 767]
+    # the first slices are below the first channel, and no slice is counted twice
+    assert list(nonzero(weights.sum(axis=0) == 0)[0]) == [0, 1, 2, 3]
+    assert weights.sum(axis=0).max() == 1.0
+
+
+def test_flat_spectrum_channel_powers():
+    powers = default_grid().channel_powers(full(OCM_SLICES, 0.0))
+    assert_allclose(powers[:95], 10 * log10(8))
+    assert_allclose(powers[95], 10 * log10(4))
+
+
+def test_missing_slices():
+    powers = full(OCM_SLICES, float('nan'))
+    powers[4:12] = -10.0
+    channel_powers = default_grid().channel_powers(powers)
+    assert_allclose(channel_powers[0], -10.0 + 10 * log10(8))
+    assert isneginf(channel_powers[1:]).all()
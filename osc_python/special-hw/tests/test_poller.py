@@ -0,0 +1,77 @@
+from time import sleep
+import pytest
+from core.amplifier import Amplifier
+from tools.database import Database
+from tools.poller import FAST, SLOW, PollTask, Poller, spread_offsets
+from tools.telemetry import AMPLIFIER, rollup_name
+
+mongomock = pytest.importorskip("mongomock")
+
+SIMULATED = {"device": "amplifier", "type": "edfa", "variety": "simulated"}
+FAST_INTERVAL = 0.1
+SLOW_INTERVAL = 0.4
+
+
+def amplifiers(chassis=2, per_chassis=3):
+    return [Amplifier(f"chassis{c}-amp{a}", SIMULATED, {"hostname": f"chassis{c}", "direction": a,
+                                                        "latency": 0.005, "jitter": 0.0})
+            for c in range(chassis) for a in range(per_chassis)]
+
+
+def test_spread_offsets_interleave_the_chassis():
+    tasks = [PollTask(device, device.driver_kwargs["hostname"], FAST, None, 1.0) for device in amplifiers()]
+    spread = spread_offsets(tasks, 0.6)
+    assert [offset for offset, _ in spread] == pytest.approx([0.0, 0.1, 0.2, 0.3, 0.4, 0.5])
+    assert [task.chassis for _, task in spread] == ["chassis0", "chassis1"] * 3
+
+
+def test_poller_stores_the_samples():
+    devices = amplifiers()
+    with Database(client=mongomock.MongoClient(), db_name="test", buffered=True, flush_interval=0.2) as db:
+        with Poller(devices, db, fast_interval=FAST_INTERVAL, slow_interval=SLOW_INTERVAL) as poller:
+            sleep(1.0)
+        summary = poller.metrics.summary()
+        raw = list(db.telemetry._db[AMPLIFIER].find())
+        rollups = list(db.telemetry._db[rollup_name(AMPLIFIER, "1m")].find())
+
+    # about 10 fast and 3 slow polls of each amplifier, loose bounds as the machine may be loaded
+    assert summary[FAST]["errors"] == summary[SLOW]["errors"] == 0
+    assert 3 * len(devices) <= summary[FAST]["polls"] <= 11 * len(devices)
+    assert 1 * len(devices) <= summary[SLOW]["polls"] <= 3 * len(devices)
+    fast = [document for document in raw if document["kind"] == FAST]
+    slow = [document for document in raw if document["kind"] == SLOW]
+    assert (len(fast), len(slow)) == (summary[FAST]["polls"], summary[SLOW]["polls"])
+    # the first polls are due at the offsets of `spread_offsets`, whatever their lag
+    first = {}
+    for document in sorted(fast, key=lambda document: document["timestamp"]):
+        first.setdefault(document["uid"], document["timestamp"].timestamp() - document["lag"])
+    assert set(first) == {device.uid for device in devices}
+    due = sorted(first.values())
+    assert [b - a for a, b in zip(due, due[1:])] == pytest.approx([FAST_INTERVAL / len(devices)] * 5, abs=0.005)
+
+    # the powers on the fast schedule, the whole snapshot on the slow one
+    assert all(set(document) >= {"input_power", "output_power", "latency", "lag"} and "gain" not in document
+               for document in fast)
+    for document in slow:
+        assert document["mode"] == "gain"
+        assert document["gain"] == pytest.approx(18.0, abs=1.0)
+        assert document["output_power"] - document["input_power"] == pytest.approx(18.0, abs=1.0)
+
+    # every sample is counted in the rollups
+    counts = {}
+    for document in rollups:
+        counts[document["uid"]] = counts.get(document["uid"], 0) + document["count"]
+    assert counts == {uid: sum(document["uid"] == uid for document in raw) for uid in first}
+
+
+def test_slow_chassis_does_not_starve_the_others():
+    slow = [Amplifier(f"a{a}", SIMULATED, {"hostname": "A", "direction": a, "latency": 0.1, "jitter": 0.0})
+            for a in range(8)]
+    fast = [Amplifier(f"b{a}", SIMULATED, {"hostname": "B", "direction": a, "latency": 0.001, "jitter": 0.0})
+            for a in range(2)]
+    with Poller(slow + fast, fast_interval=0.2, slow_interval=60.0, max_workers=4) as poller:
+        sleep(1.0)
+    # chassis A serves at most one read at a time, chassis B all of its polls
+    assert all(device.driver.reads >= 4 for device in fast)
+    assert sum(device.driver.reads for device in slow) <= 12
+    assert poller.metrics.summary()[FAST]["dropped"] > 0
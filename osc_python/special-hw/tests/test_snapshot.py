@@ -0,0 +1,37 @@
+import pytest
+from core.snapshot import MODE_CURRENT, MODE_GAIN, MODE_POWER, Snapshot, SnapshotTimer, normalize_mode, \
+    snapshot_frame, value_of
+
+
+@pytest.mark.parametrize("mode, expected", [
+    ("constant_gain", MODE_GAIN),
+    ("gain", MODE_GAIN),
+    ("Gain", MODE_GAIN),
+    ("constant_power", MODE_POWER),
+    ("power", MODE_POWER),
+    ("constant_current", MODE_CURRENT),
+    (None, None),
+    ("bogus", None),
+])
+def test_normalize_mode(mode, expected):
+    assert normalize_mode(mode) == expected
+
+
+def test_vendor_modes_share_the_vocabulary():
+    with SnapshotTimer() as timer:
+        pass
+    cisco = timer.snapshot("cisco", gain=20.0, mode="constant_gain")
+    juniper = timer.snapshot("juniper", gain=18.0, mode="gain")
+    assert cisco.mode == juniper.mode == MODE_GAIN
+
+
+def test_value_of():
+    assert value_of((15.2, "dB")) == 15.2
+    assert value_of("-3.1") == -3.1
+    assert value_of(None) != value_of(None)
+
+
+def test_snapshot_frame_schema():
+    frame = snapshot_frame([Snapshot("a", 1.0, 0.1, 20.0, 0.5, -3.0, 17.0, MODE_GAIN), Snapshot("b", 1.0, 0.2)])
+    assert list(frame.columns) == list(Snapshot._fields)
+    assert frame["mode"][0] == MODE_GAIN and frame["mode"].isna().tolist() == [False, True]
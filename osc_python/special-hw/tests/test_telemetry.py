@@ -0,0 +1,64 @@
+from datetime import datetime, timezone
+import pytest
+from tools.database import Database
+from tools.telemetry import AMPLIFIER, OCM, TelemetryStore, rollup_name
+
+mongomock = pytest.importorskip("mongomock")
+
+T0 = datetime(2024, 1, 1, 12, 0, tzinfo=timezone.utc).timestamp()
+
+
+@pytest.fixture
+def bulk_writes(monkeypatch):
+    writes = []
+    bulk_write = mongomock.collection.Collection.bulk_write
+
+    def counting_bulk_write(collection, requests, *args, **kwargs):
+        writes.append((collection.name, len(requests)))
+        return bulk_write(collection, requests, *args, **kwargs)
+
+    monkeypatch.setattr(mongomock.collection.Collection, "bulk_write", counting_bulk_write)
+    return writes
+
+
+def test_rollups_are_written_once_per_flush(bulk_writes):
+    with Database(client=mongomock.MongoClient(), db_name="test", buffered=True, flush_interval=60.0) as db:
+        telemetry = db.telemetry
+        assert telemetry is db.telemetry
+        for second, gain in enumerate((15.0, 17.0, 16.0)):
+            telemetry.save_amplifier("amp1", {"gain": gain, "mode": "gain"}, T0 + second)
+        telemetry.save_amplifier("amp2", {"gain": 20.0}, T0)
+        assert not bulk_writes
+        db.flush()
+        # one bulk_write per rollup collection, one request per bucket
+        assert sorted(bulk_writes) == [(rollup_name(AMPLIFIER, "1h"), 2), (rollup_name(AMPLIFIER, "1m"), 2)]
+        assert db.writer.written == 4
+
+        rows = telemetry.amplifier_range("amp1", T0, T0 + 60, resolution="1m")
+        assert rows["count"].tolist() == [3]
+        assert rows["gain"].tolist() == [16.0]
+        assert (rows["gain_min"].tolist(), rows["gain_max"].tolist()) == ([15.0], [17.0])
+        assert len(telemetry.amplifier_range("amp1", T0, T0 + 60)) == 3
+
+        # the next flush adds to the same buckets
+        telemetry.save_amplifier("amp1", {"gain": 18.0}, T0 + 3)
+    rows = telemetry.amplifier_range("amp1", T0, T0 + 60, resolution="1m")
+    assert rows["count"].tolist() == [4]
+    assert rows["gain_max"].tolist() == [18.0]
+
+
+def test_unbuffered_save_writes_its_rollups(bulk_writes):
+    telemetry = TelemetryStore(mongomock.MongoClient().db)
+    telemetry.save_amplifiers([("amp1", {"gain": 15.0}, T0), ("amp1", {"gain": 16.0}, T0 + 1)])
+    assert sorted(bulk_writes) == [(rollup_name(AMPLIFIER, "1h"), 1), (rollup_name(AMPLIFIER, "1m"), 1)]
+
+
+def test_ocm_rollups_keep_the_first_spectrum(bulk_writes):
+    db = Database(client=mongomock.MongoClient(), db_name="test", buffered=True, flush_interval=60.0)
+    db.telemetry.save_ocm("ocm1", [-10.0, -11.0], T0)
+    db.telemetry.save_ocm("ocm1", [-20.0, -21.0], T0 + 1)
+    db.close()
+    assert sorted(bulk_writes) == [(rollup_name(OCM, "1h"), 1), (rollup_name(OCM, "1m"), 1)]
+    timestamps, spectra = db.telemetry.ocm_range("ocm1", T0, T0 + 60, resolution="1m")
+    assert spectra.tolist() == [[-10.0, -11.0]]
+    assert len(db.telemetry.ocm_range("ocm1", T0, T0 + 60)[0]) == 2
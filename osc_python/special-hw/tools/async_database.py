@@ -0,0 +1,191 @@
+"""
+Asyncio facade of `tools.database.Database` on motor, with the same save/get methods as coroutines.
+"""
+import asyncio
+import logging
+from bson.objectid import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument, UpdateOne
+from tools.database import BACKFILL_BATCH, SPECTRAL_INFO, SPECTRAL_INFO_ID, SpectralInfoCache, client_options, \
+    encode_numpy, load_database_config, load_spectral_info, mongo_uri, path_fields, path_match, \
+    path_query
+
+# event loop -> motor client, a motor client being bound to the loop it was first used in
+_shared_clients = {}
+
+
+def shared_async_client(config: dict = None) -> AsyncIOMotorClient:
+    """ It returns the motor client shared by the whole process in the running event loop, created on first use
+    from `config` (by default `load_database_config()`).
+    """
+    loop = asyncio.get_running_loop()
+    client = _shared_clients.get(loop)
+    if client is None:
+        for closed_loop in [other for other in _shared_clients if other.is_closed()]:
+            _shared_clients.pop(closed_loop).close()
+        config = load_database_config() if config is None else config
+        client = AsyncIOMotorClient(mongo_uri(config), io_loop=loop, **client_options(config))
+        _shared_clients[loop] = client
+    return client
+
+
+def close_shared_async_clients():
+    while _shared_clients:
+        _shared_clients.popitem()[1].close()
+
+
+class AsyncDatabase:
+    """ Asyncio variant of `Database`, the methods being coroutines.
+
+        Args:
+            database: authentication database, by default the `database` of `load_database_config()`
+            db_name: name of the database, by default the `db_name` of `load_database_config()`
+            client: AsyncIOMotorClient (or mongomock_motor client) to use instead of `shared_async_client()`
+
+        Methods:
+            save_line;
+            save_ber;
+            get_ber;
+            save_amp_telemetry;
+            save_ocm_telemetry;
+            save_osa_telemetry;
+            save_time;
+            ensure_path_indexes;
+            save_path;
+            backfill_path_index;
+            start_path_index;
+            find_path;
+            delete_path_from_id;
+            save_spectral_info;
+            get_spectral_info.
+    """
+
+    def __init__(self, database=None, db_name=None, client=None):
+        config = load_database_config()
+        if client is None:
+            if database is not None and database != config["database"]:
+                config["database"] = database
+                client = AsyncIOMotorClient(mongo_uri(config), **client_options(config))
+            else:
+                client = shared_async_client(config)
+        self._db = client[db_name or config["db_name"]]
+        self._spectral_info = SpectralInfoCache()
+        self._path_index_task = None
+
+    async def _insert(self, collection: str, document: dict):
+        return (await self._db[collection].insert_one(document)).inserted_id
+
+    async def save_line(self, line):
+        return await self._insert("olc", line)
+
+    async def save_ber(self, cassini_telemetry):
+        return await self._insert("ber", cassini_telemetry)
+
+    async def get_ber(self, idx):
+        return await self._db.ber.find_one({"_id": idx})
+
+    async def save_amp_telemetry(self, amp_telemetry):
+        return await self._insert("amplifier", amp_telemetry)
+
+    async def save_ocm_telemetry(self, ocm_telemetry):
+        return await self._insert("ocm", ocm_telemetry)
+
+    async def save_osa_telemetry(self, osa_telemetry):
+        return await self._insert("osa", osa_telemetry)
+
+    async def save_time(self, time_telemetry):
+        return await self._insert("time", time_telemetry)
+
+    async def ensure_path_indexes(self):
+        await self._db.logger.create_index("path_tokens")
+
+    async def save_path(self, document: dict):
+        document.update(path_fields(document["path"]))
+        return await self._insert("logger", document)
+
+    async def backfill_path_index(self, batch_size=BACKFILL_BATCH):
+        """ Same as `Database.backfill_path_index`."""
+        logger = self._db.logger
+        updated = 0
+        while True:
+            documents = await logger.find({"path": {"$exists": True}, "path_lower": {"$exists": False}},
+                                          {"path": 1}).limit(batch_size).to_list(None)
+            if not documents:
+                return updated
+            requests = [UpdateOne({"_id": document["_id"]}, {"$set": path_fields(document["path"])})
+                        for document in documents]
+            updated += (await logger.bulk_write(requests, ordered=False)).modified_count
+
+    async def _build_path_index(self):
+        await self.ensure_path_indexes()
+        updated = await self.backfill_path_index()
+        if updated:
+            logging.info(f'Path fields added to {updated} logger documents')
+
+    def start_path_index(self):
+        """ Same as `Database.start_path_index`, as a task of the running event loop.
+
+        :return: (asyncio.Task) done once the index has been created and the documents backfilled
+        """
+        task = self._path_index_task
+        if task is not None and task.done():
+            if not task.cancelled() and task.exception() is not None:
+                logging.error(f'Path index of the logger not built: {task.exception()!r}')
+            task = None
+        if task is None:
+            task = self._path_index_task = asyncio.ensure_future(self._build_path_index())
+        return task
+
+    async def find_path(self, sub_path, skip=0, limit=0):
+        """ Same as `Database.find_path`, as an asynchronous generator."""
+        logger = self._db.logger
+        if not sub_path:
+            cursor = logger.find({}).skip(skip)
+            async for document in (cursor.limit(limit) if limit else cursor):
+                yield document
+            return
+        if self._path_index_task is None:
+            self.start_path_index()
+        lower = sub_path.lower()
+        found = 0
+        async for document in logger.find(path_query(sub_path)):
+            if "path_tokens" not in document and "path" in document:
+                self.start_path_index()
+            if not path_match(document, lower):
+                continue
+            found += 1
+            if found <= skip:
+                continue
+            yield document
+            if limit and found >= skip + limit:
+                return
+
+    async def delete_path_from_id(self, _id):
+        await self._db.logger.delete_one({'_id': ObjectId(_id)})
+        return _id
+
+    async def save_spectral_info(self, spectral_info: dict = None, file_name=SPECTRAL_INFO):
+        print("Saving spectral info to db")
+        if spectral_info is None:
+            spectral_info = load_spectral_info(file_name)
+        spectral_info = encode_numpy(spectral_info)
+        spectral_info.pop("_id", None)
+        spectral_info.pop("version", None)
+        document = await self._db.spectral_info.find_one_and_update(
+            {'_id': SPECTRAL_INFO_ID}, {"$set": spectral_info, "$inc": {"version": 1}}, projection={"version": 1},
+            upsert=True, return_document=ReturnDocument.AFTER)
+        self._spectral_info.invalidate()
+        return document["version"]
+
+    async def get_spectral_info(self):
+        """ Same as `Database.get_spectral_info`."""
+        cache = self._spectral_info
+        if cache.fresh:
+            return cache.value
+        head = await self._db.spectral_info.find_one({"_id": SPECTRAL_INFO_ID}, {"version": 1})
+        if head is None:
+            cache.invalidate()
+            return None
+        if cache.validate(head.get("version")):
+            return cache.value
+        return cache.update(await self._db.spectral_info.find_one({"_id": SPECTRAL_INFO_ID}))
@@ -1,9 +1,19 @@
 from json import load
-from pymongo import MongoClient
+from os import environ, getpid
+from numpy import asarray
+from pymongo import MongoClient, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
 from pathlib import Path
+from collections import defaultdict
+from threading import Condition, Event, Lock, Thread
+from time import monotonic
 import datetime
-from re import IGNORECASE, compile
+import logging
+from itertools import islice
+from re import compile, escape
 from bson.objectid import ObjectId
+from core.constants import CONFIGURATION, RESOURCES
+from tools.telemetry import TelemetryStore
 
 # MONGO_HOST = "192.168.51.45"
 MONGO_HOST = "localhost"
@@ -12,17 +22,480 @@ MONGO_DB = "olc"
 MONGO_USER = "root"
 MONGO_PASS = "example"
 
+# connection settings, overridden by DATABASE_CONFIG (or the file in $OSC_DATABASE_CONFIG) and by the MONGO_* variables
+DATABASE_CONFIG = CONFIGURATION / "database.json"
+DATABASE_DEFAULTS = {
+    "host": MONGO_HOST,
+    "port": int(MONGO_PORT),
+    "auth_source": "admin",
+    "username": MONGO_USER,
+    "password": MONGO_PASS,
+    "database": MONGO_DB,
+    "db_name": "test",
+    "max_pool_size": 50,
+    "min_pool_size": 0,
+    "max_idle_time_ms": 300000,
+    "connect_timeout_ms": 5000,
+    "server_selection_timeout_ms": 5000,
+    "socket_timeout_ms": 20000
+}
+ENVIRONMENT_OVERRIDES = {
+    "MONGO_URI": "uri",
+    "MONGO_HOST": "host",
+    "MONGO_PORT": "port",
+    "MONGO_USER": "username",
+    "MONGO_PASS": "password",
+    "MONGO_DB": "database",
+    "MONGO_DB_NAME": "db_name",
+    "MONGO_MAX_POOL_SIZE": "max_pool_size",
+}
+
+# buffered writes
+BATCH_SIZE = 500  # documents of a collection flushed at once
+FLUSH_INTERVAL = 1.0  # s, maximum time a document waits in the buffer
+MAX_PENDING = 20000  # documents buffered or being written, beyond which the writers wait
+
+# path lookup in the logger collection
+PATH_SEPARATORS = compile(r'[/\\.\s]+')
+BACKFILL_BATCH = 1000
+
+# launch spectrum, a single document of the spectral_info collection
+SPECTRAL_INFO = RESOURCES / "triangular_network_launch_spectrum.json"
+SPECTRAL_INFO_ID = 0
+SPECTRAL_INFO_MAX_AGE = 1.0  # s, time the cached spectrum is reused without checking its version
+
+
+def path_tokens(path: str) -> list:
+    """ It returns the lowercase components of a monitoring path, e.g. ['olc', 'line1', 'amp2'] for /OLC/line1/amp2."""
+    return [token for token in PATH_SEPARATORS.split(path.lower()) if token]
+
+
+def path_fields(path: str) -> dict:
+    """ It returns the normalized fields indexed for the lookup of `path`."""
+    return {"path_lower": path.lower(), "path_tokens": path_tokens(path)}
+
+
+def path_query(sub_path: str) -> dict:
+    """ It returns the query of the logger documents whose path may contain `sub_path`, see `path_match`.
+
+    The components of `sub_path` between two separators are whole components of the path, looked up with `$all` in
+    the index of `path_tokens`. Otherwise a component after a separator starts a component of the path, an anchored
+    regex being a range scan of the index. Without separators, `sub_path` may be anywhere in the path, which is then
+    scanned. The documents without `path_tokens` (null in the index) are always candidates.
+    """
+    parts = PATH_SEPARATORS.split(sub_path.lower())
+    # the first and last parts are empty when `sub_path` starts or ends with a separator
+    whole = [part for part in parts[1:-1] if part]
+    if whole:
+        query = {"path_tokens": {"$all": whole}}
+    elif len(parts) > 1 and parts[-1]:
+        query = {"path_tokens": {"$regex": "^" + escape(parts[-1])}}
+    else:
+        query = {"path_lower": {"$regex": escape(sub_path.lower())}}
+    return {"$or": [query, {"path_tokens": None}]}
+
+
+def path_match(document: dict, lower: str) -> bool:
+    """ It returns True if the path of a logger document contains `lower`, the lowercase sub-path looked up."""
+    path_lower = document.get("path_lower")
+    if path_lower is None:
+        path = document.get("path")
+        path_lower = path.lower() if isinstance(path, str) else ""
+    return lower in path_lower
+
+
+def load_database_config(file_name=None) -> dict:
+    """ It returns the connection settings: the defaults, updated by the configuration file and then by the
+    environment variables of `ENVIRONMENT_OVERRIDES`.
+
+    :param file_name: configuration file, by default $OSC_DATABASE_CONFIG or `DATABASE_CONFIG`
+    """
+    config = dict(DATABASE_DEFAULTS)
+    file_name = Path(file_name or environ.get("OSC_DATABASE_CONFIG", DATABASE_CONFIG))
+    if file_name.exists():
+        with open(file_name, "r") as config_file:
+            config.update(load(config_file))
+    for variable, key in ENVIRONMENT_OVERRIDES.items():
+        if variable in environ:
+            value = environ[variable]
+            config[key] = int(value) if isinstance(config.get(key), int) else value
+    return config
+
+
+def mongo_uri(config: dict) -> str:
+    if config.get("uri"):
+        return config["uri"]
+    return "mongodb://{}:{}@{}:{}/{}?authSource={}".format(config["username"], config["password"], config["host"],
+                                                          config["port"], config["database"], config["auth_source"])
+
+
+def client_options(config: dict) -> dict:
+    """ It returns the pool and timeout options of MongoClient (and of motor's client)."""
+    return {
+        "maxPoolSize": config["max_pool_size"],
+        "minPoolSize": config["min_pool_size"],
+        "maxIdleTimeMS": config["max_idle_time_ms"],
+        "connectTimeoutMS": config["connect_timeout_ms"],
+        "serverSelectionTimeoutMS": config["server_selection_timeout_ms"],
+        "socketTimeoutMS": config["socket_timeout_ms"],
+    }
+
+
+_shared_client = None
+_shared_client_pid = None
+_shared_client_lock = Lock()
+
+
+def shared_client(config: dict = None) -> MongoClient:
+    """ It returns the MongoClient shared by the whole process, created on first use from `config` (by default
+    `load_database_config()`). A new client is created in a forked child, MongoClient not being fork-safe.
+    """
+    global _shared_client, _shared_client_pid
+    with _shared_client_lock:
+        if _shared_client is None or _shared_client_pid != getpid():
+            config = load_database_config() if config is None else config
+            _shared_client = MongoClient(mongo_uri(config), **client_options(config))
+            _shared_client_pid = getpid()
+        return _shared_client
+
+
+def close_shared_client():
+    global _shared_client
+    with _shared_client_lock:
+        if _shared_client is not None:
+            _shared_client.close()
+            _shared_client = None
+
+
+_spectral_info_files = {}
+
+
+def load_spectral_info(file_name=SPECTRAL_INFO) -> dict:
+    """ It returns the content of a launch spectrum file, parsed again only when the file has been modified."""
+    file_name = Path(file_name)
+    modified = file_name.stat().st_mtime_ns
+    cached = _spectral_info_files.get(file_name)
+    if cached is None or cached[0] != modified:
+        with open(file_name, "r") as read_file:
+            cached = modified, load(read_file)
+        _spectral_info_files[file_name] = cached
+    return cached[1]
+
+
+def decode_spectral_info(value):
+    """ It returns `value` with the lists of numbers turned into read-only NumPy arrays, in the nested dicts too."""
+    if isinstance(value, dict):
+        return {key: decode_spectral_info(item) for key, item in value.items()}
+    if isinstance(value, list):
+        if value and all(isinstance(item, (int, float)) and not isinstance(item, bool) for item in value):
+            array = asarray(value, dtype=float)
+            array.setflags(write=False)
+            return array
+        return [decode_spectral_info(item) for item in value]
+    return value
+
+
+def encode_numpy(value):
+    """ It returns `value` with the NumPy arrays and scalars turned into lists and numbers, as stored in MongoDB."""
+    if isinstance(value, dict):
+        return {key: encode_numpy(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [encode_numpy(item) for item in value]
+    return value.tolist() if hasattr(value, "tolist") else value
+
+
+class SpectralInfoCache:
+    """ Decoded launch spectrum with the version of the document it was decoded from.
+
+        Every write of the spectrum increments the `version` field of the document. The cached spectrum is reused
+        for `max_age` seconds, then only the version is read back, and the whole document only when it changed.
+
+        Args:
+            max_age: (float) time the cached spectrum is trusted without reading its version (s)
+
+        Properties:
+            value: returns the decoded spectrum, None if not cached
+            version: returns the version of the cached spectrum
+            fresh: returns True if the spectrum can be reused without reading its version
+
+        Methods:
+            validate;
+            update;
+            invalidate.
+    """
+
+    def __init__(self, max_age: float = SPECTRAL_INFO_MAX_AGE):
+        self._max_age = max_age
+        self._value = None
+        self._version = None
+        self._checked = None
+
+    @property
+    def value(self):
+        return self._value
+
+    @property
+    def version(self):
+        return self._version
+
+    @property
+    def fresh(self):
+        return self._checked is not None and monotonic() - self._checked < self._max_age
+
+    def validate(self, version) -> bool:
+        """ It tells whether the cached spectrum is the one of `version`, read from the database."""
+        if self._checked is None or version != self._version:
+            return False
+        self._checked = monotonic()
+        return True
+
+    def update(self, document: dict):
+        """ It caches the spectrum of `document`, decoded, and returns it."""
+        document = dict(document)
+        document.pop("_id", None)
+        self._version = document.pop("version", None)
+        self._value = decode_spectral_info(document)
+        self._checked = monotonic()
+        return self._value
+
+    def invalidate(self):
+        self._value, self._version, self._checked = None, None, None
+
+
 root = Path(__file__).parent
 
 
+class BufferedWriter:
+    """ Batches the documents inserted in the collections of a database.
+
+        The documents are buffered per collection and written with `insert_many(ordered=False)` when a collection
+        reaches `batch_size` documents or, at the latest, `flush_interval` seconds after they have been buffered.
+        The `_id` is assigned on `insert`, so that the caller gets it back immediately, and the NumPy values are
+        turned into lists and numbers. When `max_pending` documents are waiting to be written, `insert` blocks until
+        the database has caught up. A batch that cannot be written, whatever the error, is counted as failed and the
+        writer goes on with the next ones. The callbacks added with `add_flush_callback` are run after every flush,
+        e.g. to write aggregates of the inserted documents at the same pace.
+
+        Args:
+            db: pymongo (or mongomock) Database
+            batch_size: (int) number of documents of a collection triggering a flush
+            flush_interval: (float) maximum time between two flushes (s)
+            max_pending: (int) number of documents not yet written beyond which `insert` blocks
+
+        Properties:
+            pending: returns the number of documents not yet written
+            written: returns the number of documents written
+            failed: returns the number of documents the database refused or that could not be sent
+
+        Methods:
+            insert;
+            add_flush_callback;
+            flush;
+            close.
+    """
+
+    def __init__(self, db, batch_size: int = BATCH_SIZE, flush_interval: float = FLUSH_INTERVAL,
+                 max_pending: int = MAX_PENDING):
+        self._db = db
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._max_pending = max_pending
+        self._buffers = defaultdict(list)
+        self._pending = 0
+        self._in_flight = 0
+        self._written = 0
+        self._failed = 0
+        self._closed = False
+        self._flush_requested = False
+        self._callbacks = []
+        self._condition = Condition()
+        self._thread = Thread(target=self._run, name="database-writer", daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @property
+    def pending(self):
+        return self._pending
+
+    @property
+    def written(self):
+        return self._written
+
+    @property
+    def failed(self):
+        return self._failed
+
+    def insert(self, collection: str, document: dict):
+        """ It buffers `document` for `collection`, waiting if too many documents are pending.
+
+        :return: (ObjectId) the `_id` of the document
+        """
+        document.setdefault("_id", ObjectId())
+        document = encode_numpy(document)
+        with self._condition:
+            while self._pending >= self._max_pending and not self._closed:
+                self._condition.wait()
+            if self._closed:
+                raise RuntimeError("The writer is closed")
+            buffer = self._buffers[collection]
+            buffer.append(document)
+            self._pending += 1
+            if len(buffer) >= self._batch_size:
+                self._flush_requested = True
+                self._condition.notify_all()
+        return document["_id"]
+
+    def add_flush_callback(self, callback):
+        """ It adds a callable, without arguments, run by the flushing thread once the buffered documents have been
+        written.
+        """
+        with self._condition:
+            self._callbacks.append(callback)
+
+    def _run_callbacks(self):
+        with self._condition:
+            callbacks = list(self._callbacks)
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logging.exception(f'Flush callback {callback!r} failed: {e!r}')
+
+    def _write(self, collection: str, documents: list):
+        failed = len(documents)
+        try:
+            self._db[collection].insert_many(documents, ordered=False)
+            failed = 0
+        except BulkWriteError as e:
+            failed = len(e.details.get("writeErrors", []))
+            logging.error(f'{failed} documents refused by {collection}: {e.details.get("writeErrors", [])[:1]}')
+        except PyMongoError as e:
+            logging.error(f'{failed} documents lost writing {collection}: {e!r}')
+        except Exception as e:
+            # e.g. bson.errors.InvalidDocument, which must not stop the background thread
+            logging.exception(f'{failed} documents of {collection} not written: {e!r}')
+        finally:
+            # also on failure, otherwise `flush` and the blocked `insert` would wait forever
+            with self._condition:
+                self._pending -= len(documents)
+                self._in_flight -= len(documents)
+                self._written += len(documents) - failed
+                self._failed += failed
+                self._condition.notify_all()
+
+    def _take(self):
+        """ It takes all the buffered documents, to be written outside of the lock."""
+        buffers, self._buffers = self._buffers, defaultdict(list)
+        self._flush_requested = False
+        self._in_flight += sum(len(documents) for documents in buffers.values())
+        return buffers
+
+    def _run(self):
+        while True:
+            with self._condition:
+                deadline = monotonic() + self._flush_interval
+                while not (self._flush_requested or self._closed):
+                    remaining = deadline - monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                closed = self._closed
+                buffers = self._take()
+            for collection, documents in buffers.items():
+                for start in range(0, len(documents), self._batch_size):
+                    self._write(collection, documents[start:start + self._batch_size])
+            self._run_callbacks()
+            if closed:
+                return
+
+    def flush(self):
+        """ It writes all the buffered documents and returns once they have been written."""
+        with self._condition:
+            buffers = self._take()
+        for collection, documents in buffers.items():
+            self._write(collection, documents)
+        with self._condition:
+            # the documents being written by the background thread
+            while self._in_flight > 0:
+                self._condition.wait()
+        self._run_callbacks()
+
+    def close(self):
+        """ It writes the buffered documents and stops the background thread."""
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join()
+
+
 class Database:
-    def __init__(self, database=MONGO_DB, db_name="test"):
+    def __init__(self, database=None, db_name=None, client=None, buffered=False, batch_size=BATCH_SIZE,
+                 flush_interval=FLUSH_INTERVAL, max_pending=MAX_PENDING):
+        """
+        :param database: authentication database, by default the `database` of `load_database_config()`
+        :param db_name: name of the database, by default the `db_name` of `load_database_config()`
+        :param client: MongoClient (or mongomock.MongoClient) to use instead of the process-wide `shared_client()`
+        :param buffered: (bool) the telemetry is written in batches by a `BufferedWriter`, see `flush` and `close`,
+        the rollups of `telemetry` being written at each flush
+        """
+        config = load_database_config()
+        if client is None:
+            if database is not None and database != config["database"]:
+                # a different authentication database needs its own client
+                config["database"] = database
+                client = MongoClient(mongo_uri(config), **client_options(config))
+            else:
+                client = shared_client(config)
+        self._db = client[db_name or config["db_name"]]
+        self._writer = BufferedWriter(self._db, batch_size, flush_interval, max_pending) if buffered else None
+        self._spectral_info = SpectralInfoCache()
+        self._telemetry = None
+        self._telemetry_lock = Lock()
+        self._path_index_lock = Lock()
+        self._path_index_thread = None
+        self._path_index_ready = Event()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
 
-        uri = "mongodb://{}:{}@{}:{}/{}?authSource=admin".format(MONGO_USER, MONGO_PASS, MONGO_HOST, MONGO_PORT,
-                                                                 database)
-        client = MongoClient(uri)
-        self._db = client[db_name]
+    @property
+    def writer(self):
+        return self._writer
 
+    @property
+    def telemetry(self):
+        """ It returns the `tools.telemetry.TelemetryStore` of the database, created (with its collections) on first
+        use and writing through the `writer`, if buffered.
+        """
+        with self._telemetry_lock:
+            if self._telemetry is None:
+                self._telemetry = TelemetryStore(self._db, self._writer)
+            return self._telemetry
+
+    def _insert(self, collection: str, document: dict):
+        if self._writer is not None:
+            return self._writer.insert(collection, document)
+        return self._db[collection].insert_one(document).inserted_id
+
+    def flush(self):
+        if self._writer is not None:
+            self._writer.flush()
+        elif self._telemetry is not None:
+            self._telemetry.flush()
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
 
     def save_line(self, line):
         olc = self._db.olc
@@ -30,59 +503,141 @@ class Database:
         return post_id
 
     def save_ber(self, cassini_telemetry):
-        ber = self._db.ber
-        post_id = ber.insert_one(cassini_telemetry).inserted_id
-        return post_id
+        return self._insert("ber", cassini_telemetry)
 
     def get_ber(self, idx):
         ber = self._db.ber
         return ber.find_one({"_id": idx})
 
     def save_amp_telemetry(self, amp_telemetry):
-        amplifier = self._db.amplifier
-        post_id = amplifier.insert_one(amp_telemetry).inserted_id
-        return post_id
+        return self._insert("amplifier", amp_telemetry)
 
     def save_ocm_telemetry(self, ocm_telemetry):
-        ocm = self._db.ocm
-        post_id = ocm.insert_one(ocm_telemetry).inserted_id
-        return post_id
+        return self._insert("ocm", ocm_telemetry)
 
     def save_osa_telemetry(self, osa_telemetry):
-        osa = self._db.osa
-        post_id = osa.insert_one(osa_telemetry).inserted_id
-        return post_id
+        return self._insert("osa", osa_telemetry)
 
     def save_time(self, time_telemetry):
-        time = self._db.time
-        post_id = time.insert_one(time_telemetry).inserted_id
-        return post_id
+        return self._insert("time", time_telemetry)
+
+    def ensure_path_indexes(self):
+        """ It creates the (multikey) index of the path components of the logger collection."""
+        self._db.logger.create_index("path_tokens")
+
+    def save_path(self, document: dict):
+        """ It saves a document of the logger collection with the normalized fields of its `path`."""
+        document.update(path_fields(document["path"]))
+        return self._db.logger.insert_one(document).inserted_id
+
+    def backfill_path_index(self, batch_size=BACKFILL_BATCH):
+        """ It adds the normalized path fields to the logger documents saved without them.
 
-    def find_path(self, sub_path):
+        :return: (int) number of updated documents
+        """
         logger = self._db.logger
-        regx = compile("^.*" + sub_path + ".*", IGNORECASE)
-        mon_paths = logger.find({"path": regx})
-        paths = []
-        for path in mon_paths:
-            paths.append(path)
-        return paths
+        updated = 0
+        while True:
+            documents = list(logger.find({"path": {"$exists": True}, "path_lower": {"$exists": False}},
+                                         {"path": 1}).limit(batch_size))
+            if not documents:
+                return updated
+            requests = [UpdateOne({"_id": document["_id"]}, {"$set": path_fields(document["path"])})
+                        for document in documents]
+            updated += logger.bulk_write(requests, ordered=False).modified_count
+
+    def _build_path_index(self):
+        try:
+            self.ensure_path_indexes()
+            updated = self.backfill_path_index()
+            if updated:
+                logging.info(f'Path fields added to {updated} logger documents')
+            self._path_index_ready.set()
+        except PyMongoError as e:
+            logging.error(f'Path index of the logger not built: {e!r}')
+        finally:
+            with self._path_index_lock:
+                # run again by the next lookup meeting a document without the path fields
+                self._path_index_thread = None
+
+    def start_path_index(self):
+        """ It creates the index of the path components and backfills the logger documents saved without the path
+        fields, in a background thread, unless it is already running. `find_path` starts it on its first call and
+        whenever it meets a document without the path fields, e.g. written by another program.
+
+        :return: (threading.Event) set once the index has been created
+        """
+        with self._path_index_lock:
+            if self._path_index_thread is None:
+                self._path_index_thread = Thread(target=self._build_path_index, name="path-index", daemon=True)
+                self._path_index_thread.start()
+        return self._path_index_ready
+
+    def _path_match(self, document: dict, lower: str) -> bool:
+        if "path_tokens" not in document and "path" in document:
+            self.start_path_index()
+        return path_match(document, lower)
+
+    def find_path(self, sub_path, skip=0, limit=0):
+        """ It returns the logger documents whose path contains `sub_path`, case-insensitively, lazily.
+
+        The index of `path_tokens` only narrows the candidates (see `path_query`), which are all checked against the
+        lowercase path, so that the documents found do not depend on the index, nor on the backfill of the documents
+        saved without the path fields (see `start_path_index`).
+
+        :param skip: (int) number of matching documents skipped, for the pagination
+        :param limit: (int) maximum number of documents returned, 0 for all of them
+        :return: generator of documents
+        """
+        logger = self._db.logger
+        if not sub_path:
+            cursor = logger.find({}).skip(skip)
+            return iter(cursor.limit(limit) if limit else cursor)
+        if not self._path_index_ready.is_set():
+            self.start_path_index()
+        lower = sub_path.lower()
+        matches = (document for document in logger.find(path_query(sub_path)) if self._path_match(document, lower))
+        return islice(matches, skip, skip + limit if limit else None)
 
     def delete_path_from_id(self, _id):
         logger = self._db.logger
         logger.delete_one({'_id': ObjectId(_id)})
         return _id
 
-    def save_spectral_info(self):
+    def save_spectral_info(self, spectral_info: dict = None, file_name=SPECTRAL_INFO):
+        """ It saves the launch spectrum and increments its version, so that the cached copies are refreshed.
+
+        :param spectral_info: (dict) the spectrum, NumPy arrays allowed, by default the content of `file_name`
+        :return: (int) the new version of the spectrum
+        """
         print("Saving spectral info to db")
-        spectral_info_db = self._db.spectral_info
-        with open("resources/triangular_network_launch_spectrum.json", "r") as read_file:
-            spectral_info_json = load(read_file)
-        spectral_info_db.update_one({'_id': 0}, {"$set": spectral_info_json}, upsert=True)
-        return
+        if spectral_info is None:
+            spectral_info = load_spectral_info(file_name)
+        spectral_info = encode_numpy(spectral_info)
+        spectral_info.pop("_id", None)
+        spectral_info.pop("version", None)
+        document = self._db.spectral_info.find_one_and_update(
+            {'_id': SPECTRAL_INFO_ID}, {"$set": spectral_info, "$inc": {"version": 1}}, projection={"version": 1},
+            upsert=True, return_document=ReturnDocument.AFTER)
+        self._spectral_info.invalidate()
+        return document["version"]
 
     def get_spectral_info(self):
+        """ It returns the launch spectrum, the lists of numbers as read-only NumPy arrays, None if not saved.
+
+        The decoded spectrum is cached and read again only when its version has changed, see `SpectralInfoCache`.
+        """
+        cache = self._spectral_info
+        if cache.fresh:
+            return cache.value
         spectral_info_db = self._db.spectral_info
-        return spectral_info_db.find_one({"_id": 0})
+        head = spectral_info_db.find_one({"_id": SPECTRAL_INFO_ID}, {"version": 1})
+        if head is None:
+            cache.invalidate()
+            return None
+        if cache.validate(head.get("version")):
+            return cache.value
+        return cache.update(spectral_info_db.find_one({"_id": SPECTRAL_INFO_ID}))
 
 
 if __name__ == "__main__":
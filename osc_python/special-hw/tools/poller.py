@@ -0,0 +1,352 @@
+"""
+Long-running telemetry poller of a fleet of amplifiers.
+
+Every amplifier is polled on two schedules: the powers on a fast one and the whole `core.snapshot.Snapshot` (gain,
+tilt, powers and mode, which every driver provides) on a slow one. The polls of each schedule are spread over its
+interval, interleaving the chassis, so that a chassis is never hit by all its amplifiers at once, and at most
+`max_per_chassis` polls of a chassis are in progress at the same time: the polls due on a busy chassis wait in its own
+queue, without holding a worker, so that a slow or dead chassis does not delay the others. The samples are saved in the
+`tools.telemetry.TelemetryStore` of a buffered `tools.database.Database`, hence the raw samples and their rollups are
+written in batches.
+"""
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from heapq import heappop, heappush
+from itertools import count, zip_longest
+from threading import Condition, Lock, Thread
+from time import monotonic, time
+from core.constants import CONFIG_MODE, STATE_GAIN, STATE_INPUT_POWER, STATE_OUTPUT_POWER, STATE_TILT
+from core.snapshot import normalize_mode, value_of
+
+FAST = "fast"
+SLOW = "slow"
+FAST_INTERVAL = 1.0  # s
+SLOW_INTERVAL = 60.0  # s
+FAST_LABELS = (STATE_INPUT_POWER, STATE_OUTPUT_POWER)
+# field of the saved samples of each label, as named in `core.snapshot.Snapshot`
+FIELD_NAMES = {
+    STATE_GAIN: "gain",
+    STATE_TILT: "tilt",
+    STATE_INPUT_POWER: "input_power",
+    STATE_OUTPUT_POWER: "output_power",
+    CONFIG_MODE: "mode"
+}
+SNAPSHOT_METADATA = ("uid", "timestamp", "latency")
+POLL_WORKERS = 16
+MAX_PER_CHASSIS = 1
+LAG_WINDOW = 1000  # polls over which the lag statistics are computed
+
+
+class PollTask:
+    """ Periodic poll of some labels of an amplifier.
+
+        Args:
+            device: `core.device.Device` whose `get` is called, e.g. `core.amplifier.Amplifier`
+            chassis: key of the chassis of the device
+            kind: (str) FAST or SLOW
+            labels: labels read at each poll, None to read the snapshot of the device
+            interval: (float) poll period (s)
+
+        Attributes:
+            due: (float) monotonic time of the next poll
+            running: (bool) a poll is in progress or waiting for its chassis
+
+        Methods:
+            read.
+    """
+
+    def __init__(self, device, chassis, kind: str, labels, interval: float):
+        self.device = device
+        self.chassis = chassis
+        self.kind = kind
+        self.labels = None if labels is None else tuple(labels)
+        self.interval = interval
+        self.due = 0.0
+        self.running = False
+
+    def read(self):
+        """ It returns the `core.snapshot.Snapshot` of the device if `labels` is None, else the dict of its `get`."""
+        if self.labels is None:
+            return self.device.get_snapshot()
+        return self.device.get(*self.labels)
+
+
+class PollMetrics:
+    """ Counters and lag statistics of the polls, per kind.
+
+        The lag of a poll is the time between its due time and the start of the read, the wait for the chassis
+        included. A poll is dropped when it is due while the previous poll of the same task is still in progress or
+        waiting for its chassis, or when the poller is so late that the whole period has been skipped.
+
+        Args:
+            window: (int) number of most recent polls over which the lag statistics are computed
+
+        Methods:
+            polled;
+            dropped;
+            summary.
+    """
+
+    def __init__(self, window: int = LAG_WINDOW):
+        self._window = window
+        self._lock = Lock()
+        self._polls = {}
+        self._errors = {}
+        self._dropped = {}
+        self._lags = {}
+        self._max_lag = {}
+
+    def polled(self, kind: str, lag: float, ok: bool):
+        with self._lock:
+            self._polls[kind] = self._polls.get(kind, 0) + 1
+            if not ok:
+                self._errors[kind] = self._errors.get(kind, 0) + 1
+            self._lags.setdefault(kind, deque(maxlen=self._window)).append(lag)
+            self._max_lag[kind] = max(self._max_lag.get(kind, 0.0), lag)
+
+    def dropped(self, kind: str, polls: int = 1):
+        with self._lock:
+            self._dropped[kind] = self._dropped.get(kind, 0) + polls
+
+    def summary(self) -> dict:
+        """ It returns, for each kind, the number of polls, errors and dropped polls, and the lag (s): mean, 95th
+        percentile and last over the window, maximum since the start.
+        """
+        with self._lock:
+            summary = {}
+            for kind in set(self._polls) | set(self._dropped):
+                lags = sorted(self._lags.get(kind, ()))
+                summary[kind] = {
+                    "polls": self._polls.get(kind, 0),
+                    "errors": self._errors.get(kind, 0),
+                    "dropped": self._dropped.get(kind, 0),
+                    "lag_mean": sum(lags) / len(lags) if lags else 0.0,
+                    "lag_p95": lags[int(0.95 * (len(lags) - 1))] if lags else 0.0,
+                    "lag_last": self._lags[kind][-1] if lags else 0.0,
+                    "lag_max": self._max_lag.get(kind, 0.0)
+                }
+            return summary
+
+
+def spread_offsets(tasks, interval: float) -> list:
+    """ It returns the tasks with their offset in [0, `interval`), evenly spaced, the chassis being interleaved so
+    that consecutive slots go to different chassis.
+
+    :param tasks: list of PollTask of the same interval
+    :return: list of (offset, PollTask)
+    """
+    by_chassis = {}
+    for task in tasks:
+        by_chassis.setdefault(task.chassis, []).append(task)
+    ordered = [task for round_robin in zip_longest(*by_chassis.values()) for task in round_robin if task is not None]
+    return [(interval * i / len(ordered), task) for i, task in enumerate(ordered)]
+
+
+class Poller:
+    """ Telemetry poller of a fleet of amplifiers, running in background threads.
+
+        Args:
+            devices: iterable of `core.amplifier.Amplifier`, or of devices with the same `get(*labels)` and
+            `get_snapshot()`
+            database: `tools.database.Database`, created with `buffered=True` so that the samples are written in
+            batches, saved in its `telemetry` store, None to only collect the metrics
+            fast_interval: (float) period of the polls of `fast_labels` (s)
+            slow_interval: (float) period of the polls of `slow_labels` (s)
+            fast_labels: labels read at each fast poll, by default the input and output powers
+            slow_labels: labels read at each slow poll, by default None to read the snapshot of the amplifier
+            max_workers: (int) polls in progress at the same time over the whole fleet
+            max_per_chassis: (int) polls in progress at the same time on the same chassis
+            chassis_of: callable returning the chassis of a device, by default the `hostname` (or `ip_address`) of
+            its driver arguments
+
+        Properties:
+            metrics: returns the `PollMetrics`
+            running: returns True between `start` and `stop`
+
+        Methods:
+            start;
+            stop.
+    """
+
+    def __init__(self, devices, database=None, fast_interval: float = FAST_INTERVAL,
+                 slow_interval: float = SLOW_INTERVAL, fast_labels=FAST_LABELS, slow_labels=None,
+                 max_workers: int = POLL_WORKERS, max_per_chassis: int = MAX_PER_CHASSIS, chassis_of=None):
+        if chassis_of is None:
+            chassis_of = default_chassis
+        self._devices = list(devices)
+        self._database = database
+        if database is not None and database.writer is None:
+            logging.warning('The database is not buffered, each sample is written on its own')
+        # created here, with its collections, rather than by the first poll
+        self._telemetry = None if database is None else database.telemetry
+        self._tasks = {FAST: [], SLOW: []}
+        for device in self._devices:
+            chassis = chassis_of(device)
+            self._tasks[FAST].append(PollTask(device, chassis, FAST, fast_labels, fast_interval))
+            self._tasks[SLOW].append(PollTask(device, chassis, SLOW, slow_labels, slow_interval))
+        self._max_per_chassis = max_per_chassis
+        # chassis -> number of polls submitted, and polls (task, due) waiting for a free slot
+        self._busy = {task.chassis: 0 for task in self._tasks[FAST]}
+        self._waiting = {chassis: deque() for chassis in self._busy}
+        self._max_workers = max_workers
+        self._metrics = PollMetrics()
+        self._condition = Condition()
+        self._queue = []
+        self._sequence = count()
+        self._executor = None
+        self._thread = None
+        self._running = False
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    @property
+    def metrics(self):
+        return self._metrics
+
+    @property
+    def running(self):
+        return self._running
+
+    def start(self):
+        """ It schedules the first poll of every task, spread over its interval, and starts polling."""
+        if self._running:
+            return
+        now = monotonic()
+        self._queue = []
+        for tasks in self._tasks.values():
+            if not tasks:
+                continue
+            for offset, task in spread_offsets(tasks, tasks[0].interval):
+                task.due = now + offset
+                heappush(self._queue, (task.due, next(self._sequence), task))
+        self._executor = ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix="poller")
+        self._running = True
+        self._thread = Thread(target=self._run, name="poller", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """ It stops scheduling, waits for the polls in progress and flushes the database."""
+        with self._condition:
+            if not self._running:
+                return
+            self._running = False
+            for waiting in self._waiting.values():
+                for task, _ in waiting:
+                    task.running = False
+                waiting.clear()
+            self._condition.notify_all()
+        self._thread.join()
+        self._executor.shutdown(wait=True)
+        if self._database is not None:
+            self._database.flush()
+
+    def _run(self):
+        with self._condition:
+            while self._running:
+                if not self._queue:
+                    self._condition.wait()
+                    continue
+                due, _, task = self._queue[0]
+                delay = due - monotonic()
+                if delay > 0:
+                    self._condition.wait(delay)
+                    continue
+                heappop(self._queue)
+                if task.running:
+                    self._metrics.dropped(task.kind)
+                else:
+                    task.running = True
+                    self._submit(task, due)
+                # fixed rate: the periods entirely elapsed while late are skipped
+                task.due = due + task.interval
+                now = monotonic()
+                if task.due <= now:
+                    skipped = int((now - task.due) // task.interval) + 1
+                    self._metrics.dropped(task.kind, skipped)
+                    task.due += skipped * task.interval
+                heappush(self._queue, (task.due, next(self._sequence), task))
+
+    def _submit(self, task: PollTask, due: float):
+        """ It submits the poll if its chassis has a free slot, otherwise it queues it for the chassis. To be called
+        holding the condition.
+        """
+        if self._busy[task.chassis] < self._max_per_chassis:
+            self._busy[task.chassis] += 1
+            self._executor.submit(self._poll, task, due)
+        else:
+            self._waiting[task.chassis].append((task, due))
+
+    def _release(self, task: PollTask):
+        """ It frees the slot of the chassis of `task`, submitting the next poll waiting for it."""
+        with self._condition:
+            self._busy[task.chassis] -= 1
+            task.running = False
+            waiting = self._waiting[task.chassis]
+            if waiting and self._running:
+                self._submit(*waiting.popleft())
+
+    def _poll(self, task: PollTask, due: float):
+        try:
+            lag = monotonic() - due
+            timestamp = time()
+            start = monotonic()
+            try:
+                data = task.read()
+            except Exception as e:
+                logging.error(f'{task.kind.capitalize()} poll of {task.device.uid} failed: {e!r}')
+                self._metrics.polled(task.kind, lag, False)
+                return
+            finally:
+                # the chassis is free as soon as the read is over
+                self._release(task)
+            latency = monotonic() - start
+            self._metrics.polled(task.kind, lag, True)
+            if self._telemetry is not None:
+                self._telemetry.save_amplifier(task.device.uid, sample(task, data, latency, lag), timestamp)
+        except Exception as e:
+            logging.exception(f'Sample of {task.device.uid} not saved: {e!r}')
+
+
+def default_chassis(device):
+    driver_kwargs = device.driver_kwargs
+    return driver_kwargs.get("hostname", driver_kwargs.get("ip_address", device.uid))
+
+
+def sample(task: PollTask, data, latency: float, lag: float) -> dict:
+    """ It returns the values saved for a poll, named as the fields of `core.snapshot.Snapshot`, the numbers without
+    their unit.
+
+    :param data: `core.snapshot.Snapshot` or dict of the labels read by the poll
+    """
+    if hasattr(data, "_asdict"):
+        data = {field: value for field, value in data._asdict().items() if field not in SNAPSHOT_METADATA}
+    else:
+        data = {FIELD_NAMES.get(label, label.lower()): value for label, value in data.items()}
+    values = {"kind": task.kind, "latency": latency, "lag": lag}
+    for field, value in data.items():
+        values[field] = normalize_mode(value) if field == "mode" else value_of(value)
+    return values
+
+
+if __name__ == "__main__":
+    from time import sleep
+    from core.amplifier import Amplifier
+    from tools.database import Database
+
+    logging.basicConfig(level=logging.INFO)
+
+    # 8 chassis of 12 simulated amplifiers each
+    simulated = {"device": "amplifier", "type": "edfa", "variety": "simulated"}
+    amplifiers = [Amplifier(f"chassis{c}-amp{a}", simulated, {"hostname": f"chassis{c}", "direction": a,
+                                                               "failure_rate": 0.01})
+                  for c in range(8) for a in range(12)]
+    with Database(buffered=True) as db, Poller(amplifiers, db, fast_interval=2.0, slow_interval=10.0) as poller:
+        for _ in range(6):
+            sleep(5.0)
+            print(poller.metrics.summary())
@@ -0,0 +1,274 @@
+"""
+Time-series store of the amplifier, OCM and OSA telemetry.
+
+The raw samples are kept in MongoDB time-series collections (`timeField` "timestamp", `metaField` "uid"), or in
+plain collections indexed on (uid, timestamp) when the server does not support them. The OCM and OSA traces are
+stored as packed float32 arrays, and 1-minute/1-hour rollups are maintained as the samples are saved, so that
+dashboards and long range queries read a few documents per bucket instead of every sample. The rollup updates of the
+samples are merged per bucket and written with one `bulk_write` per rollup collection, at each flush of the writer.
+"""
+import logging
+from collections import defaultdict
+from threading import Lock
+from datetime import datetime, timezone
+from math import isnan
+from bson.binary import Binary
+from numpy import asarray, float32, frombuffer
+from pymongo import ASCENDING, UpdateOne
+from pymongo.errors import CollectionInvalid, OperationFailure, PyMongoError
+
+AMPLIFIER = "amplifier_ts"
+OCM = "ocm_ts"
+OSA = "osa_ts"
+
+# rollup name -> bucket width (s)
+ROLLUPS = {"1m": 60, "1h": 3600}
+
+
+def pack_array(values) -> Binary:
+    """ It packs a vector as little-endian float32."""
+    return Binary(asarray(values, dtype='<f4').tobytes())
+
+
+def unpack_array(packed: bytes):
+    return frombuffer(packed, dtype='<f4').astype(float32)
+
+
+def to_datetime(timestamp=None) -> datetime:
+    """ It returns the UTC datetime of a POSIX `timestamp` (s), of a datetime, or of now if None."""
+    if timestamp is None:
+        return datetime.now(timezone.utc)
+    if isinstance(timestamp, datetime):
+        return timestamp if timestamp.tzinfo is not None else timestamp.replace(tzinfo=timezone.utc)
+    return datetime.fromtimestamp(timestamp, timezone.utc)
+
+
+def bucket_of(timestamp: datetime, width: int) -> datetime:
+    """ It returns the start of the `width` seconds bucket containing `timestamp`."""
+    seconds = to_datetime(timestamp).timestamp()
+    return datetime.fromtimestamp(seconds - seconds % width, timezone.utc)
+
+
+def rollup_name(collection: str, rollup: str) -> str:
+    return f"{collection}_{rollup}"
+
+
+def merge_update(update: dict, other: dict):
+    """ It merges the `$inc`, `$min`, `$max` and `$setOnInsert` operators of `other` into `update`, so that applying
+    `update` is the same as applying both in turn.
+    """
+    for operator, fields in other.items():
+        target = update.setdefault(operator, {})
+        for field, value in fields.items():
+            if field not in target:
+                target[field] = value
+            elif operator == "$inc":
+                target[field] += value
+            elif operator == "$min":
+                target[field] = min(target[field], value)
+            elif operator == "$max":
+                target[field] = max(target[field], value)
+            # $setOnInsert: the first value is kept
+
+
+def rollup_update(document: dict) -> dict:
+    """ It returns the update of the amplifier rollups by a sample: its count and the sum, number, minimum and
+    maximum of its numeric fields.
+    """
+    update = {"$inc": {"count": 1}, "$min": {}, "$max": {}}
+    for field, value in document.items():
+        if field in ("uid", "timestamp", "_id") or not isinstance(value, (int, float)) or isinstance(value, bool) \
+                or isnan(value):
+            continue
+        update["$inc"][f"sum.{field}"] = value
+        update["$inc"][f"n.{field}"] = 1
+        update["$min"][f"min.{field}"] = value
+        update["$max"][f"max.{field}"] = value
+    return {operator: fields for operator, fields in update.items() if fields}
+
+
+class TelemetryStore:
+    """ Time-series telemetry store on a MongoDB database.
+
+        Args:
+            db: pymongo (or mongomock) Database, e.g. `Database(...)._db`
+            writer: optional `tools.database.BufferedWriter` batching the raw samples, the rollups being written at
+            each of its flushes; without writer, they are written at the end of each save
+            time_series: (bool) try to create MongoDB time-series collections for the raw samples
+
+        Methods:
+            ensure_collections;
+            flush;
+            save_amplifier;
+            save_amplifiers;
+            save_ocm;
+            save_osa;
+            amplifier_range;
+            ocm_range.
+    """
+
+    def __init__(self, db, writer=None, time_series: bool = True):
+        self._db = db
+        self._writer = writer
+        self._time_series = time_series
+        # rollup collection -> (uid, bucket) -> merged update
+        self._rollups = defaultdict(dict)
+        self._lock = Lock()
+        self._flush_lock = Lock()
+        self.ensure_collections()
+        if writer is not None:
+            writer.add_flush_callback(self.flush)
+
+    def _create_raw(self, name: str, existing):
+        if name in existing:
+            return
+        if self._time_series:
+            try:
+                self._db.create_collection(name, timeseries={"timeField": "timestamp", "metaField": "uid",
+                                                             "granularity": "seconds"})
+                return
+            except (CollectionInvalid, OperationFailure, NotImplementedError, TypeError) as e:
+                logging.info(f'Time-series collection {name} not available, using an indexed collection: {e!r}')
+        self._db[name].create_index([("uid", ASCENDING), ("timestamp", ASCENDING)])
+
+    def ensure_collections(self):
+        """ It creates the raw collections and the indexes of the rollups, if missing."""
+        existing = set(self._db.list_collection_names())
+        for collection in (AMPLIFIER, OCM, OSA):
+            self._create_raw(collection, existing)
+        for collection in (AMPLIFIER, OCM):
+            for rollup in ROLLUPS:
+                self._db[rollup_name(collection, rollup)].create_index(
+                    [("uid", ASCENDING), ("bucket", ASCENDING)], unique=True)
+
+    def _update_rollup(self, collection: str, uid: str, timestamp: datetime, update: dict):
+        with self._lock:
+            for rollup, width in ROLLUPS.items():
+                pending = self._rollups[rollup_name(collection, rollup)]
+                key = uid, bucket_of(timestamp, width)
+                if key in pending:
+                    merge_update(pending[key], update)
+                else:
+                    pending[key] = {operator: dict(fields) for operator, fields in update.items()}
+
+    def flush(self):
+        """ It writes the pending rollup updates, with one `bulk_write` per rollup collection."""
+        # serialized, so that a flush returns once the updates taken by a concurrent one are also written
+        with self._flush_lock:
+            with self._lock:
+                rollups, self._rollups = self._rollups, defaultdict(dict)
+            for name, updates in rollups.items():
+                requests = [UpdateOne({"uid": uid, "bucket": bucket}, update, upsert=True)
+                            for (uid, bucket), update in updates.items()]
+                try:
+                    self._db[name].bulk_write(requests, ordered=False)
+                except PyMongoError as e:
+                    logging.error(f'{len(requests)} buckets of {name} not updated: {e!r}')
+
+    def _saved(self):
+        if self._writer is None:
+            self.flush()
+
+    def _insert(self, collection: str, documents: list):
+        if self._writer is not None:
+            for document in documents:
+                self._writer.insert(collection, document)
+        elif len(documents) == 1:
+            self._db[collection].insert_one(documents[0])
+        elif documents:
+            self._db[collection].insert_many(documents, ordered=False)
+
+    def save_amplifier(self, uid: str, values: dict, timestamp=None):
+        """ It saves a sample of the amplifier telemetry, e.g. the fields of a `core.snapshot.Snapshot`.
+
+        :param values: (dict) gain, tilt, input_power, output_power and any other scalar
+        :param timestamp: POSIX time (s) or datetime of the sample, now by default
+        """
+        self.save_amplifiers([(uid, values, timestamp)])
+
+    def save_amplifiers(self, samples):
+        """ It saves many amplifier samples with one write per collection.
+
+        :param samples: iterable of (uid, values, timestamp), or of `core.snapshot.Snapshot`
+        """
+        documents = []
+        for sample in samples:
+            if hasattr(sample, "_asdict"):
+                values = sample._asdict()
+                uid, timestamp = values.pop("uid"), values.pop("timestamp")
+            else:
+                uid, values, timestamp = sample
+            documents.append({"uid": uid, "timestamp": to_datetime(timestamp), **values})
+        self._insert(AMPLIFIER, documents)
+        for document in documents:
+            self._update_rollup(AMPLIFIER, document["uid"], document["timestamp"], rollup_update(document))
+        self._saved()
+
+    def save_ocm(self, uid: str, powers, timestamp=None, frequencies=None):
+        """ It saves an OCM spectrum as a packed float32 vector.
+
+        The rollups keep the first spectrum of each bucket.
+
+        :param powers: slice powers (dBm)
+        :param frequencies: slice frequencies (THz), only stored when given
+        """
+        timestamp = to_datetime(timestamp)
+        document = {"uid": uid, "timestamp": timestamp, "powers": pack_array(powers)}
+        if frequencies is not None:
+            document["frequencies"] = pack_array(frequencies)
+        self._insert(OCM, [dict(document)])
+        self._update_rollup(OCM, uid, timestamp, {"$setOnInsert": {k: v for k, v in document.items() if k != "uid"}})
+        self._saved()
+
+    def save_osa(self, uid: str, wavelengths, powers, timestamp=None):
+        """ It saves an OSA trace, both vectors being packed as float32."""
+        self._insert(OSA, [{"uid": uid, "timestamp": to_datetime(timestamp), "wavelengths": pack_array(wavelengths),
+                            "powers": pack_array(powers)}])
+
+    def amplifier_range(self, uid: str, start, end, resolution: str = "raw"):
+        """ It returns the amplifier telemetry of `uid` between `start` (included) and `end` (excluded).
+
+        :param resolution: "raw", or a rollup of `ROLLUPS` ("1m", "1h") whose mean values are returned
+        :return: (DataFrame) one row per sample or bucket, indexed by timestamp
+        """
+        from pandas import DataFrame
+
+        start, end = to_datetime(start), to_datetime(end)
+        if resolution == "raw":
+            cursor = self._db[AMPLIFIER].find({"uid": uid, "timestamp": {"$gte": start, "$lt": end}},
+                                              {"_id": 0, "uid": 0}).sort("timestamp", ASCENDING)
+            rows = list(cursor)
+            return DataFrame(rows).set_index("timestamp", drop=True) if rows else DataFrame()
+
+        cursor = self._db[rollup_name(AMPLIFIER, resolution)].find(
+            {"uid": uid, "bucket": {"$gte": bucket_of(start, ROLLUPS[resolution]), "$lt": end}}
+        ).sort("bucket", ASCENDING)
+        rows = []
+        for document in cursor:
+            row = {"timestamp": document["bucket"], "count": document.get("count", 0)}
+            for field, total in document.get("sum", {}).items():
+                row[field] = total / document["n"][field]
+                row[f"{field}_min"] = document["min"][field]
+                row[f"{field}_max"] = document["max"][field]
+            rows.append(row)
+        return DataFrame(rows).set_index("timestamp", drop=True) if rows else DataFrame()
+
+    def ocm_range(self, uid: str, start, end, resolution: str = "raw"):
+        """ It returns the OCM spectra of `uid` between `start` (included) and `end` (excluded).
+
+        :param resolution: "raw", or a rollup of `ROLLUPS` ("1m", "1h") returning the first spectrum of each bucket
+        :return: tuple (timestamps, powers) of a list of datetime and a (n_spectra, n_slices) float32 array
+        """
+        start, end = to_datetime(start), to_datetime(end)
+        if resolution == "raw":
+            cursor = self._db[OCM].find({"uid": uid, "timestamp": {"$gte": start, "$lt": end}},
+                                        {"timestamp": 1, "powers": 1}).sort("timestamp", ASCENDING)
+        else:
+            cursor = self._db[rollup_name(OCM, resolution)].find(
+                {"uid": uid, "bucket": {"$gte": bucket_of(start, ROLLUPS[resolution]), "$lt": end}},
+                {"timestamp": 1, "powers": 1}).sort("bucket", ASCENDING)
+        timestamps, spectra = [], []
+        for document in cursor:
+            timestamps.append(document["timestamp"])
+            spectra.append(unpack_array(document["powers"]))
+        return timestamps, asarray(spectra, dtype=float32) if spectra else asarray([], dtype=float32).reshape(0, 0)